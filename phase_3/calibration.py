@@ -0,0 +1,126 @@
+import json
+
+# table entries per unit of input, so inputs from -1.0 to 1.0 are quantized to 0.001
+RESOLUTION = 1000
+
+CHANNELS = ('steering', 'throttle')
+
+
+class ChannelCalibration(object):
+    def __init__(self, min_duty, idle_duty, max_duty, deadzone=0.0, expo=0.0, invert=False, resolution=RESOLUTION):
+        if not min_duty <= idle_duty <= max_duty:
+            raise ValueError('expected min_duty <= idle_duty <= max_duty but got {}, {}, {}'.format(
+                repr(min_duty), repr(idle_duty), repr(max_duty)
+            ))
+
+        if not 0.0 <= deadzone < 1.0:
+            raise ValueError('expected deadzone to be between 0.0 and 1.0 but it was {}'.format(repr(deadzone)))
+
+        if not 0.0 <= expo <= 1.0:
+            raise ValueError('expected expo to be between 0.0 and 1.0 but it was {}'.format(repr(expo)))
+
+        self.min_duty = min_duty
+        self.idle_duty = idle_duty
+        self.max_duty = max_duty
+        self.deadzone = deadzone
+        self.expo = expo
+        self.invert = invert
+        self.resolution = resolution
+
+        self.last_index = 2 * resolution
+        self.table = None
+
+    def build_table_with_numpy(self, numpy):
+        value = numpy.linspace(-1.0, 1.0, self.last_index + 1)
+
+        if self.invert:
+            value = -value
+
+        magnitude = numpy.abs(value)
+        magnitude = numpy.where(
+            magnitude <= self.deadzone,
+            0.0,
+            (magnitude - self.deadzone) / (1.0 - self.deadzone)
+        )
+        magnitude = ((1.0 - self.expo) * magnitude) + (self.expo * (magnitude ** 3))
+
+        # positive input heads towards min_duty, negative towards max_duty
+        duty = numpy.where(
+            value > 0,
+            self.idle_duty - (magnitude * (self.idle_duty - self.min_duty)),
+            self.idle_duty + (magnitude * (self.max_duty - self.idle_duty)),
+        )
+
+        # plain floats; indexing a list is much cheaper than indexing a numpy array
+        return duty.tolist()
+
+    def build_table(self):
+        table = []
+        for index in range(self.last_index + 1):
+            value = -1.0 + (float(index) / self.resolution)
+
+            if self.invert:
+                value = -value
+
+            magnitude = abs(value)
+            if magnitude <= self.deadzone:
+                magnitude = 0.0
+            else:
+                magnitude = (magnitude - self.deadzone) / (1.0 - self.deadzone)
+
+            magnitude = ((1.0 - self.expo) * magnitude) + (self.expo * (magnitude ** 3))
+
+            if value > 0:
+                table.append(self.idle_duty - (magnitude * (self.idle_duty - self.min_duty)))
+            else:
+                table.append(self.idle_duty + (magnitude * (self.max_duty - self.idle_duty)))
+
+        return table
+
+    def compile(self, use_numpy=True):
+        # numpy is a slow import on a Pi, so only pay for it when a table is actually built (and it's wanted)
+        numpy = None
+        if use_numpy:
+            try:
+                import numpy
+            except ImportError:
+                numpy = None
+
+        if numpy is not None:
+            self.table = self.build_table_with_numpy(numpy)
+        else:
+            self.table = self.build_table()
+
+        return self
+
+    def lookup(self, value):
+        index = int(round((value + 1.0) * self.resolution))
+        if index < 0:
+            index = 0
+        elif index > self.last_index:
+            index = self.last_index
+
+        return self.table[index]
+
+
+def default_calibration(min_duty, idle_duty, max_duty, use_numpy=True):
+    return {
+        'steering': ChannelCalibration(min_duty, idle_duty, max_duty, invert=True).compile(use_numpy),
+        'throttle': ChannelCalibration(min_duty, idle_duty, max_duty).compile(use_numpy),
+    }
+
+
+def load_calibration(path, use_numpy=True):
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    calibration = {}
+    for channel in CHANNELS:
+        if channel not in data:
+            raise ValueError('expected {} to have a calibration for {} but it did not'.format(
+                repr(path), repr(channel)
+            ))
+
+        calibration[channel] = ChannelCalibration(**data[channel]).compile(use_numpy)
+
+    return calibration
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from calibration import ChannelCalibration, default_calibration, load_calibration
+from vehicle import convert_ps4_value_to_duty_cycle_percent, MIN_DUTY, IDLE_DUTY, MAX_DUTY
+
+_TEST_VALUES = [-1.0, -0.73, -0.5, -0.04, 0.0, 0.13, 0.5, 0.999, 1.0]
+
+
+class ChannelCalibrationTest(unittest.TestCase):
+    def setUp(self):
+        self.subject = ChannelCalibration(MIN_DUTY, IDLE_DUTY, MAX_DUTY)
+
+    def test_init_bad_args(self):
+        self.assertRaises(ValueError, ChannelCalibration, 10.0, 7.5, 5.0)
+        self.assertRaises(ValueError, ChannelCalibration, 5.0, 7.5, 10.0, deadzone=1.0)
+        self.assertRaises(ValueError, ChannelCalibration, 5.0, 7.5, 10.0, expo=2.0)
+
+    def test_lookup_matches_conversion(self):
+        self.subject.compile()
+
+        for value in _TEST_VALUES:
+            self.assertAlmostEqual(self.subject.lookup(value), convert_ps4_value_to_duty_cycle_percent(value))
+
+    def test_build_table_matches_numpy(self):
+        self.subject.deadzone = 0.1
+        self.subject.expo = 0.3
+
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy not installed')
+
+        for a, b in zip(self.subject.build_table(), self.subject.build_table_with_numpy(numpy)):
+            self.assertAlmostEqual(a, b)
+
+    def test_lookup_clamps(self):
+        self.subject.compile()
+
+        self.assert_(self.subject.lookup(-1.5) == MAX_DUTY)
+        self.assert_(self.subject.lookup(1.5) == MIN_DUTY)
+
+    def test_lookup_deadzone(self):
+        self.subject.deadzone = 0.2
+        self.subject.compile()
+
+        self.assert_(self.subject.lookup(0.2) == IDLE_DUTY)
+        self.assert_(self.subject.lookup(-0.2) == IDLE_DUTY)
+        self.assertAlmostEqual(self.subject.lookup(0.6), IDLE_DUTY - 1.25)
+        self.assert_(self.subject.lookup(1.0) == MIN_DUTY)
+
+    def test_lookup_expo(self):
+        self.subject.expo = 1.0
+        self.subject.compile()
+
+        self.assertAlmostEqual(self.subject.lookup(0.5), IDLE_DUTY - (0.125 * 2.5))
+        self.assert_(self.subject.lookup(-1.0) == MAX_DUTY)
+
+    def test_lookup_asymmetric_endpoints(self):
+        self.subject = ChannelCalibration(6.0, 7.0, 10.0).compile()
+
+        self.assertAlmostEqual(self.subject.lookup(0.5), 6.5)
+        self.assertAlmostEqual(self.subject.lookup(-0.5), 8.5)
+
+
+class CalibrationFunctionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_default_calibration(self):
+        calibration = default_calibration(MIN_DUTY, IDLE_DUTY, MAX_DUTY)
+
+        # the steering is inverted
+        self.assertAlmostEqual(calibration['steering'].lookup(0.13), 7.825)
+        self.assertAlmostEqual(calibration['throttle'].lookup(0.5), 6.25)
+
+    def test_load_calibration(self):
+        path = os.path.join(self.directory, 'calibration.json')
+        with open(path, 'w') as f:
+            json.dump({
+                'steering': {'min_duty': 5.5, 'idle_duty': 7.5, 'max_duty': 9.5, 'invert': True},
+                'throttle': {'min_duty': 5.0, 'idle_duty': 7.0, 'max_duty': 10.0, 'deadzone': 0.05},
+            }, f)
+
+        calibration = load_calibration(path)
+
+        self.assertAlmostEqual(calibration['steering'].lookup(1.0), 9.5)
+        self.assertAlmostEqual(calibration['throttle'].lookup(0.0), 7.0)
+
+    def test_load_calibration_missing_channel(self):
+        path = os.path.join(self.directory, 'calibration.json')
+        with open(path, 'w') as f:
+            json.dump({'steering': {'min_duty': 5.0, 'idle_duty': 7.5, 'max_duty': 10.0}}, f)
+
+        self.assertRaises(ValueError, load_calibration, path)
+
+    def test_load_calibration_example(self):
+        calibration = load_calibration(os.path.join(os.path.dirname(__file__), 'calibration.example.json'))
+
+        self.assertAlmostEqual(calibration['steering'].lookup(0.13), 7.825)
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+
+# clock_gettime's clock ids aren't the same everywhere
+CLOCK_IDS_BY_PLATFORM = {
+    'linux': (1, 3),
+    'darwin': (6, 16),
+}
+
+CLOCK_MONOTONIC, CLOCK_THREAD_CPUTIME_ID = CLOCK_IDS_BY_PLATFORM.get(
+    'linux' if sys.platform.startswith('linux') else sys.platform,
+    (None, None),
+)
+
+_clock_gettime = None
+
+if CLOCK_MONOTONIC is not None:
+    try:
+        import ctypes
+        import ctypes.util
+
+
+        class _Timespec(ctypes.Structure):
+            _fields_ = [
+                ('tv_sec', ctypes.c_long),
+                ('tv_nsec', ctypes.c_long),
+            ]
+
+
+        # in libc on macOS and any recent glibc, but librt on older ones
+        for _name in ['c', 'rt']:
+            _path = ctypes.util.find_library(_name)
+            if _path is None:
+                continue
+
+            try:
+                _clock_gettime = ctypes.CDLL(_path, use_errno=True).clock_gettime
+            except (OSError, AttributeError):
+                continue
+
+            _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+            break
+    except ImportError:
+        pass
+
+
+def _get_time(clock_id):
+    timespec = _Timespec()
+    if _clock_gettime(clock_id, ctypes.byref(timespec)) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+    return timespec.tv_sec + (timespec.tv_nsec * 1e-9)
+
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    if _clock_gettime is not None:
+        def monotonic():
+            return _get_time(CLOCK_MONOTONIC)
+    else:
+        # everything timed against this would jump with the wall clock, so say so rather than quietly carry on
+        sys.stderr.write('-- no monotonic clock on {}, falling back to the wall clock\n'.format(sys.platform))
+
+        monotonic = time.time
+
+try:
+    thread_time = time.thread_time
+except AttributeError:
+    if _clock_gettime is not None:
+        def thread_time():
+            return _get_time(CLOCK_THREAD_CPUTIME_ID)
+    else:
+        # process-wide rather than per thread, but better than nothing
+        thread_time = time.clock
+
+
+class VirtualClock(object):
+    # a clock that only moves when told to, for running things faster (or slower) than real time
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, duration):
+        if duration < 0:
+            raise ValueError('expected duration not to be negative but it was {}'.format(repr(duration)))
+
+        self.now += duration
+
+    def advance_to(self, now):
+        if now < self.now:
+            raise ValueError('expected {} not to be before {} but it was'.format(repr(now), repr(self.now)))
+
+        self.now = now
+
+
+def process_age():
+    # how long ago this process started, interpreter startup included (Linux only; None elsewhere)
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # field 22 (starttime), counted after the parenthesised command name which may contain spaces
+            started_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+
+        with open('/proc/uptime', 'r') as f:
+            uptime = float(f.read().split()[0])
+
+        return uptime - (started_ticks / float(os.sysconf('SC_CLK_TCK')))
+    except (IOError, OSError, ValueError, IndexError):
+        return None
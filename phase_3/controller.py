@@ -1,24 +1,67 @@
+import os
 import time
 import traceback
 
-import pygame
+try:
+    import pygame
+except ImportError:
+    # a headless controller reading the joystick with evdev_input doesn't need it
+    pygame = None
+
+from clock import monotonic
+from controller_profile import load_profile
+from evdev_input import JOYAXISMOTION, JOYHATMOTION, JOYBUTTONDOWN, JOYBUTTONUP, NOEVENT
+from state import State, FIELDS, TRACE_ID
+from stats import Histogram
+from tracing import TRACER, EVENT_RECEIVED, STATE_BUILT
 
 DEBOUNCE_PERIOD = 1.0 / 50.0
 
+EVENT_WAIT_TIMEOUT = 1.0
+
+PROFILE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+# what a profile can drive, in State order
+PROFILE_OUTPUTS = FIELDS[:TRACE_ID]
+
+
+def load_controller_profile(name_or_path='ps4'):
+    # "ps4", "xbox" or "generic" from profiles/, or the path to a profile of your own
+    return load_profile(name_or_path, PROFILE_OUTPUTS, PROFILE_DIRECTORY)
+
+
+DEFAULT_PROFILE = load_controller_profile()
+
 
 class Controller(object):
-    def __init__(self, state_change_callback=None):
-        pygame.init()
-        pygame.joystick.init()
+    def __init__(self, state_change_callback=None, coalesce_events=False, profile=DEFAULT_PROFILE, joystick=None):
+        # anything with evdev_input.EvdevJoystick's interface reads its own events, and pygame is never started
+        self.joystick = joystick
 
-        self.controller = pygame.joystick.Joystick(0)
-        self.controller.init()
+        if self.joystick is not None:
+            self.controller = self.joystick
+        else:
+            pygame.init()
+            pygame.joystick.init()
+
+            self.controller = pygame.joystick.Joystick(0)
+            self.controller.init()
+
+        # what wait_for_events() waited on, until drain_events() picks it up
+        self.waited_event = None
 
         self.state_change_callback = None
 
         if state_change_callback is not None:
             self.set_state_change_callback(state_change_callback)
 
+        self.coalesce_events = coalesce_events
+
+        self.profile = profile
+
+        self.events_per_frame = Histogram(1, 256)
+        self.drain_duration = Histogram(0.00001, 10000)
+
     def set_state_change_callback(self, state_change_callback):
         if not callable(state_change_callback):
             raise TypeError('expected {} to be callable but it was not'.format(repr(state_change_callback)))
@@ -40,83 +83,142 @@ class Controller(object):
 
     @staticmethod
     def handle_event(event, axis_data, button_data, hat_data):
-        if event.type == pygame.JOYAXISMOTION:
+        if event.type == JOYAXISMOTION:
             axis_data[event.axis] = round(event.value, 2)
-        elif event.type == pygame.JOYBUTTONDOWN:
+        elif event.type == JOYBUTTONDOWN:
             button_data[event.button] = True
-        elif event.type == pygame.JOYBUTTONUP:
+        elif event.type == JOYBUTTONUP:
             button_data[event.button] = False
-        elif event.type == pygame.JOYHATMOTION:
+        elif event.type == JOYHATMOTION:
             hat_data[event.hat] = event.value
 
         return axis_data, button_data, hat_data
 
     @staticmethod
-    def build_state(axis_data, button_data, hat_data):
-        steering = axis_data.get(0)
-        brake = axis_data.get(4)
-        accelerator = axis_data.get(5)
-        stop = button_data.get(0)
-        turbo = button_data.get(1)
-        record = button_data.get(2)
-        play = button_data.get(3)
-
-        # create steering deadzone
-        if steering is not None and -0.04 <= steering <= 0.04:
-            steering = 0.0
-
-        if brake is not None and not turbo:
-            brake_range = 0.5883
-            brake = (brake * (brake_range / 2)) - (1 - (brake_range / 2))
-
-        if accelerator is not None and not turbo:
-            accelerator_range = 0.0393
-            accelerator = (accelerator * (accelerator_range / 2)) - (1 - (accelerator_range / 2))
-
-        state = {
-            'steering': steering,
-            'brake': brake,
-            'accelerator': accelerator,
-            'stop': stop,
-            'record': record,
-            'play': play,
-        }
+    def build_state(axis_data, button_data, hat_data, profile=DEFAULT_PROFILE):
+        # axis indices, deadzones, scaling and turbo all come from the profile's precompiled tables
+        values = profile.build(axis_data, button_data)
+        values.append(0)
+
+        return State(values)
 
-        return state
+    def get_events(self):
+        return self.joystick.read_events() if self.joystick is not None else pygame.event.get()
 
     def iterate(self, axis_data, button_data, hat_data, last_state):
-        for event in pygame.event.get():
+        for event in self.get_events():
+            received_at = TRACER.clock() if TRACER.enabled else None
+
             axis_data, button_data, hat_data = self.handle_event(event, axis_data, button_data, hat_data)
             if None in [axis_data, button_data, hat_data]:
                 time.sleep(DEBOUNCE_PERIOD)
                 continue
 
-            state = self.build_state(axis_data, button_data, hat_data)
-            if None in state:
-                time.sleep(DEBOUNCE_PERIOD)
-                continue
+            state = self.build_state(axis_data, button_data, hat_data, self.profile)
 
             if state == last_state:
                 time.sleep(DEBOUNCE_PERIOD)
                 continue
 
-            if self.state_change_callback is not None:
-                try:
-                    self.state_change_callback(state)
-                except Exception:
-                    traceback.print_exc()
-
             last_state = state
 
+            self.publish_state(state, received_at)
+
         return axis_data, button_data, hat_data, last_state
 
+    def publish_state(self, state, received_at):
+        if TRACER.enabled:
+            # tag a copy so the trace id doesn't defeat the change detection
+            trace_id = TRACER.new_trace_id()
+            state = state.with_trace_id(trace_id)
+            TRACER.mark(trace_id, EVENT_RECEIVED, received_at)
+            TRACER.mark(trace_id, STATE_BUILT)
+
+        if self.state_change_callback is not None:
+            try:
+                self.state_change_callback(state)
+            except Exception:
+                traceback.print_exc()
+
+    @staticmethod
+    def wait_for_event(timeout):
+        try:
+            return pygame.event.wait(int(timeout * 1000))
+        except TypeError:
+            # pygame 1.9 can't time out, so block until there's something to do
+            return pygame.event.wait()
+
+    def wait_for_events(self, timeout):
+        # True once there's something to drain, False on timeout
+        if self.joystick is not None:
+            return self.joystick.wait(timeout)
+
+        event = self.wait_for_event(timeout)
+        if event.type == NOEVENT:
+            return False
+
+        self.waited_event = event
+
+        return True
+
+    def drain_events(self):
+        if self.joystick is not None:
+            return self.joystick.read_events()
+
+        # the event waited on, then everything that piled up behind it
+        events = [self.waited_event] + pygame.event.get()
+        self.waited_event = None
+
+        return events
+
+    def iterate_coalesced(self, axis_data, button_data, hat_data, last_state):
+        if not self.wait_for_events(EVENT_WAIT_TIMEOUT):
+            return axis_data, button_data, hat_data, last_state
+
+        received_at = TRACER.clock() if TRACER.enabled else None
+        drain_started = monotonic()
+
+        # everything that piled up while we waited is folded into one snapshot
+        events = self.drain_events()
+        if not events:
+            # e.g. nothing but SYN_REPORTs from evdev
+            return axis_data, button_data, hat_data, last_state
+
+        for event in events:
+            axis_data, button_data, hat_data = self.handle_event(event, axis_data, button_data, hat_data)
+
+        state = self.build_state(axis_data, button_data, hat_data, self.profile)
+
+        self.drain_duration.record(monotonic() - drain_started)
+        self.events_per_frame.record(len(events))
+
+        if state == last_state:
+            return axis_data, button_data, hat_data, last_state
+
+        self.publish_state(state, received_at)
+
+        return axis_data, button_data, hat_data, state
+
+    def get_stats(self):
+        stats = {
+            'events_per_frame': self.events_per_frame.summary(),
+            'drain_duration': self.drain_duration.summary(),
+        }
+
+        if self.joystick is not None:
+            stats['joystick'] = self.joystick.get_stats()
+
+        return stats
+
     def loop(self, test_mode=False):
         axis_data, button_data, hat_data = self.get_initial_datas()
 
         last_state = None
 
+        iterate = self.iterate_coalesced if self.coalesce_events else self.iterate
+
         while 1:
-            axis_data, button_data, hat_data, last_state = self.iterate(
+            axis_data, button_data, hat_data, last_state = iterate(
                 axis_data, button_data, hat_data, last_state
             )
 
@@ -125,23 +227,73 @@ class Controller(object):
 
 
 if __name__ == '__main__':
-    from publisher import Publisher
-    from scheduler import Scheduler
+    from publisher import Publisher, FanoutPublisher, SharedMemoryPublisher
+    from shared_memory import is_shared_memory_target, get_shared_memory_path
+    from scheduler import MonotonicScheduler, ChangeDrivenScheduler
+    from tracing import enable_from_environment
 
     import sys
 
-    p = Publisher(
-        host=sys.argv[1],
-        port=13337,
-    )
-
-    s = Scheduler(period=DEBOUNCE_PERIOD)
+    enable_from_environment()
+
+    args = sys.argv[1:]
+
+    # a comma separated list of hosts (and / or --multicast group) drives a fleet with the same states
+    hosts = [x for x in args[0].split(',') if x] if args and not args[0].startswith('--') else []
+    multicast_group = args[args.index('--multicast') + 1] if '--multicast' in args else None
+
+    if len(hosts) == 1 and is_shared_memory_target(hosts[0]):
+        # "shm:" or "shm:(path)" for a vehicle on this host (see vehicle.py --shm)
+        p = SharedMemoryPublisher(path=get_shared_memory_path(hosts[0]))
+    elif len(hosts) == 1 and multicast_group is None:
+        p = Publisher(
+            host=hosts[0],
+            port=13337,
+            keyframe_interval=int(args[args.index('--delta') + 1]) if '--delta' in args else None,
+        )
+    else:
+        p = FanoutPublisher(
+            targets=[(host, 13337) for host in hosts],
+            multicast_group=multicast_group,
+            multicast_port=13337,
+        )
+
+    if '--heartbeat' in args:
+        # changes go out as they happen, otherwise the last state is resent every heartbeat
+        s = ChangeDrivenScheduler(heartbeat_period=float(args[args.index('--heartbeat') + 1]))
+    else:
+        s = MonotonicScheduler(period=DEBOUNCE_PERIOD)
     s.start()
     s.set_iteration_callback(p.send)
 
-    c = Controller()
+    joystick = None
+    if '--evdev' in args:
+        from evdev_input import EvdevJoystick, find_joystick
+
+        # "--evdev auto" for the first joystick udev knows about, otherwise e.g. /dev/input/event3
+        path = args[args.index('--evdev') + 1]
+        joystick = EvdevJoystick(path=find_joystick() if path == 'auto' else path)
+
+    c = Controller(
+        coalesce_events=True,
+        profile=load_controller_profile(args[args.index('--profile') + 1]) if '--profile' in args else DEFAULT_PROFILE,
+        joystick=joystick,
+    )
     c.set_state_change_callback(s.set_state)
 
+    session_file = None
+    if '--record-session' in args:
+        import pickle
+
+        # (time, state) pairs, same as a vehicle history spill file; see delta_benchmark.py
+        session_file = open(args[args.index('--record-session') + 1], 'ab')
+
+        def record_and_set_state(state):
+            pickle.dump((monotonic(), state), session_file, pickle.HIGHEST_PROTOCOL)
+            s.set_state(state)
+
+        c.set_state_change_callback(record_and_set_state)
+
     try:
         c.loop()
     except KeyboardInterrupt:
@@ -149,3 +301,13 @@ if __name__ == '__main__':
 
     s.stop()
     s.join()
+
+    if session_file is not None:
+        session_file.close()
+
+    print(repr(s.get_stats()))
+    print(repr(c.get_stats()))
+
+    print(repr(p.get_stats()))
+
+    TRACER.flush()
@@ -0,0 +1,201 @@
+import json
+import os
+
+# axis values are rounded to 2 places as they come in (see Controller.handle_event), so that's all a table needs
+RESOLUTION = 100
+
+
+class AxisMapping(object):
+    def __init__(self, output, axis, scale=1.0, offset=0.0, deadzone=0.0, invert=False, limits=None, turbo=None,
+                 integer=False):
+        if not 0.0 <= deadzone < 1.0:
+            raise ValueError('expected deadzone to be between 0.0 and 1.0 but it was {}'.format(repr(deadzone)))
+
+        if limits is not None and (len(limits) != 2 or limits[0] > limits[1]):
+            raise ValueError('expected limits to be [low, high] but it was {}'.format(repr(limits)))
+
+        self.output = output
+        self.axis = axis
+        self.scale = scale
+        self.offset = offset
+        self.deadzone = deadzone
+        self.invert = invert
+        self.limits = limits
+
+        # {"scale": ..., "offset": ...} used instead while the profile's turbo button is held
+        self.turbo = turbo
+
+        self.integer = integer
+
+    def build_table(self, scale, offset, resolution=RESOLUTION, round_to_integer=False):
+        table = []
+        for index in range(2 * resolution + 1):
+            # exactly what round(value, 2) gives for the same input
+            value = (index - resolution) / float(resolution)
+
+            if self.invert:
+                value = -value
+
+            if -self.deadzone <= value <= self.deadzone:
+                value = 0.0
+
+            value = (value * scale) + offset
+
+            if self.limits is not None:
+                value = min(max(value, self.limits[0]), self.limits[1])
+
+            if round_to_integer:
+                value = int(round(value))
+
+            table.append(value)
+
+        return table
+
+    def build_tables(self, resolution=RESOLUTION, round_to_integer=False):
+        table = self.build_table(self.scale, self.offset, resolution, round_to_integer)
+
+        turbo_table = table
+        if self.turbo is not None:
+            turbo_table = self.build_table(
+                self.turbo.get('scale', 1.0), self.turbo.get('offset', 0.0), resolution, round_to_integer
+            )
+
+        return table, turbo_table
+
+
+SOURCE_AXIS = 0
+SOURCE_BUTTON = 1
+
+BUTTON_TABLE = {True: True, False: False, None: None}
+
+# for outputs the profile doesn't drive: axes are unset, buttons aren't pressed
+UNMAPPED_AXIS_TABLE = {None: None}
+UNMAPPED_BUTTON_TABLE = {None: False}
+
+
+class AxisTable(dict):
+    # keyed by the rounded axis value, so a lookup is a single dict index; anything else is worked out on a miss
+    def __init__(self, values, resolution=RESOLUTION):
+        super(AxisTable, self).__init__(
+            ((index - resolution) / float(resolution), value) for index, value in enumerate(values)
+        )
+
+        self[None] = None
+
+        self.values = values
+        self.resolution = resolution
+        self.last_index = len(values) - 1
+
+    def __missing__(self, value):
+        index = int(round((value + 1.0) * self.resolution))
+        if index < 0:
+            index = 0
+        elif index > self.last_index:
+            index = self.last_index
+
+        return self.values[index]
+
+
+class ControllerProfile(object):
+    def __init__(self, name, axes, buttons=None, turbo_button=None, resolution=RESOLUTION):
+        self.name = name
+        self.axes = axes
+        self.buttons = buttons if buttons is not None else {}
+        self.turbo_button = turbo_button
+        self.resolution = resolution
+
+        self.outputs = None
+
+        # (source, axis or button, table) per output, plus one per term of a summed output past the end
+        self.entries = None
+        self.turbo_entries = None
+
+        # (output slot, term slots, integer) for outputs driven by more than one axis
+        self.sums = None
+
+    def compile(self, outputs):
+        # outputs is the order build() returns values in
+        for output in [x.output for x in self.axes] + list(self.buttons.keys()):
+            if output not in outputs:
+                raise ValueError('expected {} to be one of {} but it was not'.format(repr(output), repr(outputs)))
+
+        mappings_by_output = {}
+        for mapping in self.axes:
+            mappings_by_output.setdefault(mapping.output, []).append(mapping)
+
+        self.outputs = tuple(outputs)
+        self.entries = []
+        self.turbo_entries = []
+        self.sums = []
+
+        terms = []
+
+        for slot, output in enumerate(outputs):
+            mappings = mappings_by_output.get(output, [])
+
+            if len(mappings) == 1:
+                mapping = mappings[0]
+                table, turbo_table = mapping.build_tables(self.resolution, round_to_integer=mapping.integer)
+                self.entries.append((SOURCE_AXIS, mapping.axis, AxisTable(table, self.resolution)))
+                self.turbo_entries.append((SOURCE_AXIS, mapping.axis, AxisTable(turbo_table, self.resolution)))
+            elif mappings:
+                term_slots = range(len(outputs) + len(terms), len(outputs) + len(terms) + len(mappings))
+                terms.extend(mappings)
+                self.sums.append((slot, term_slots, any(mapping.integer for mapping in mappings)))
+
+                # the sum goes here once the terms are in
+                self.entries.append((SOURCE_AXIS, None, UNMAPPED_AXIS_TABLE))
+                self.turbo_entries.append((SOURCE_AXIS, None, UNMAPPED_AXIS_TABLE))
+            elif output in self.buttons:
+                self.entries.append((SOURCE_BUTTON, self.buttons[output], BUTTON_TABLE))
+                self.turbo_entries.append((SOURCE_BUTTON, self.buttons[output], BUTTON_TABLE))
+            else:
+                self.entries.append((SOURCE_BUTTON, None, UNMAPPED_BUTTON_TABLE))
+                self.turbo_entries.append((SOURCE_BUTTON, None, UNMAPPED_BUTTON_TABLE))
+
+        for mapping in terms:
+            table, turbo_table = mapping.build_tables(self.resolution)
+            self.entries.append((SOURCE_AXIS, mapping.axis, AxisTable(table, self.resolution)))
+            self.turbo_entries.append((SOURCE_AXIS, mapping.axis, AxisTable(turbo_table, self.resolution)))
+
+        return self
+
+    def build(self, axis_data, button_data):
+        # a list of values in the order given to compile(); one dict index and one table lookup per output
+        getters = (axis_data.get, button_data.get)
+
+        entries = self.entries
+        if self.turbo_button is not None and button_data.get(self.turbo_button):
+            entries = self.turbo_entries
+
+        values = [table[getters[source](key)] for source, key, table in entries]
+
+        if self.sums:
+            for slot, term_slots, integer in self.sums:
+                terms = [values[term_slot] for term_slot in term_slots]
+                if None not in terms:
+                    values[slot] = int(round(sum(terms))) if integer else sum(terms)
+
+            del values[len(self.outputs):]
+
+        return values
+
+
+def load_profile(name_or_path, outputs, directory=None):
+    # a path, or the name of one of the profiles in directory (e.g. "ps4" for profiles/ps4.json)
+    path = name_or_path
+    if directory is not None and not os.path.exists(path):
+        path = os.path.join(directory, '{}.json'.format(name_or_path))
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    if 'axes' not in data:
+        raise ValueError('expected {} to have axes but it did not'.format(repr(path)))
+
+    return ControllerProfile(
+        name=data.get('name', path),
+        axes=[AxisMapping(**axis) for axis in data['axes']],
+        buttons=data.get('buttons'),
+        turbo_button=data.get('turbo_button'),
+    ).compile(outputs)
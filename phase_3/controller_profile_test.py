@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from controller import load_controller_profile, PROFILE_OUTPUTS
+from controller_profile import ControllerProfile, AxisMapping, load_profile
+
+_VALUES = [round(-1.0 + (i / 100.0), 2) for i in range(201)]
+
+_TELLO_PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tello', 'profiles', 'ps4.json')
+
+
+def _hard_coded_ps4_state(axis_data, button_data):
+    # Controller.build_state before profiles
+    steering = axis_data.get(0)
+    brake = axis_data.get(4)
+    accelerator = axis_data.get(5)
+    turbo = button_data.get(1)
+
+    if steering is not None and -0.04 <= steering <= 0.04:
+        steering = 0.0
+
+    if brake is not None and not turbo:
+        brake_range = 0.5883
+        brake = (brake * (brake_range / 2)) - (1 - (brake_range / 2))
+
+    if accelerator is not None and not turbo:
+        accelerator_range = 0.0393
+        accelerator = (accelerator * (accelerator_range / 2)) - (1 - (accelerator_range / 2))
+
+    return [steering, brake, accelerator, button_data.get(0), button_data.get(2), button_data.get(3)]
+
+
+def _hard_coded_tello_state(axis_data):
+    # tello/controller.py get_state before profiles, less the ints (profiles round rather than truncate)
+    axis_data = dict(axis_data)
+    for i in range(0, 4):
+        if axis_data.get(i) is not None and -0.04 <= axis_data[i] <= 0.04:
+            axis_data[i] = 0
+
+    throttle = ((axis_data[5] - 1) / 2) * 100
+    brake = ((axis_data[4] + 1) / 2) * 100
+
+    return [-(-100 - throttle + brake), axis_data[1] * -100, axis_data[2] * 100, axis_data[0] * 100]
+
+
+class ControllerProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_profile(self, data):
+        path = os.path.join(self.directory, 'profile.json')
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+        return path
+
+    def test_ps4_matches_the_hard_coded_mapping(self):
+        subject = load_controller_profile('ps4')
+
+        for turbo in [False, True]:
+            button_data = {0: True, 1: turbo, 2: False, 3: True}
+
+            for value in _VALUES:
+                axis_data = {0: value, 4: value, 5: value}
+
+                expected = _hard_coded_ps4_state(axis_data, button_data)
+                actual = subject.build(axis_data, button_data)
+
+                self.assert_(actual[3:] == expected[3:])
+                for a, b in zip(actual[:3], expected[:3]):
+                    self.assertAlmostEqual(a, b, places=12)
+
+    def test_unset_axes(self):
+        subject = load_controller_profile('ps4')
+
+        self.assert_(subject.build({}, {0: False, 1: False, 2: False, 3: False}) == [
+            None, None, None, False, False, False
+        ])
+
+    def test_bundled_profiles_load(self):
+        for name in ['ps4', 'xbox', 'generic']:
+            self.assert_(len(load_controller_profile(name).build({}, {})) == len(PROFILE_OUTPUTS))
+
+    def test_generic_splits_one_stick_between_accelerator_and_brake(self):
+        subject = load_controller_profile('generic')
+
+        _, brake, accelerator, _, _, _ = subject.build({3: -1.0}, {})
+        self.assert_(brake == -1.0)
+        self.assertAlmostEqual(accelerator, -0.9607)
+
+        _, brake, accelerator, _, _, _ = subject.build({3: 1.0}, {})
+        self.assertAlmostEqual(brake, -0.4117)
+        self.assert_(accelerator == -1.0)
+
+        _, brake, accelerator, _, _, _ = subject.build({3: 1.0}, {1: True})
+        self.assert_(brake == 1.0)
+
+    def test_tello_matches_the_hard_coded_mapping(self):
+        subject = load_profile(_TELLO_PROFILE_PATH, ('combined_throttle', 'pitch', 'roll', 'yaw'))
+
+        for value in _VALUES:
+            axis_data = {0: value, 1: -value, 2: value, 4: -value, 5: value}
+
+            expected = _hard_coded_tello_state(axis_data)
+            actual = subject.build(axis_data, {})
+
+            for a, b in zip(actual, expected):
+                self.assert_(isinstance(a, int))
+                self.assert_(a == int(round(b)))
+
+    def test_summed_output_waits_for_every_axis(self):
+        subject = load_profile(_TELLO_PROFILE_PATH, ('combined_throttle', 'pitch', 'roll', 'yaw'))
+
+        self.assert_(subject.build({5: 1.0}, {})[0] is None)
+        self.assert_(subject.build({4: -1.0, 5: 1.0}, {})[0] == 100)
+
+    def test_out_of_range_values_are_clamped(self):
+        subject = ControllerProfile('test', [AxisMapping('steering', 0)]).compile(('steering',))
+
+        self.assert_(subject.build({0: 1.5}, {}) == [1.0])
+        self.assert_(subject.build({0: -1.5}, {}) == [-1.0])
+
+    def test_unknown_output(self):
+        path = self.write_profile({'axes': [{'output': 'handbrake', 'axis': 0}]})
+
+        self.assertRaises(ValueError, load_profile, path, PROFILE_OUTPUTS)
+
+    def test_missing_axes(self):
+        path = self.write_profile({'buttons': {'stop': 0}})
+
+        self.assertRaises(ValueError, load_profile, path, PROFILE_OUTPUTS)
+
+    def test_bad_mapping(self):
+        self.assertRaises(ValueError, AxisMapping, 'steering', 0, deadzone=1.0)
+        self.assertRaises(ValueError, AxisMapping, 'steering', 0, limits=[1.0, -1.0])
+
+        path = self.write_profile({'axes': [{'output': 'steering'}]})
+
+        self.assertRaises(TypeError, load_profile, path, PROFILE_OUTPUTS)
@@ -1,7 +1,7 @@
 import unittest
 
 from mock import patch, call, Mock
-from pygame import JOYAXISMOTION, JOYBUTTONDOWN, JOYBUTTONUP, JOYHATMOTION
+from pygame import JOYAXISMOTION, JOYBUTTONDOWN, JOYBUTTONUP, JOYHATMOTION, NOEVENT
 from pygame.event import Event
 
 from controller import Controller
@@ -169,3 +169,86 @@ class ControllerTest(unittest.TestCase):
         self.assert_(self.subject.iterate.mock_calls == [
             call(1, 2, 3, None)
         ])
+
+
+_TEST_NOEVENT = Mock(spec=Event)
+_TEST_NOEVENT.type = NOEVENT
+
+
+class CoalescingControllerTest(unittest.TestCase):
+    @patch('controller.pygame')
+    def setUp(self, pygame):
+        self.subject = Controller(coalesce_events=True)
+
+        self.subject.controller.get_numbuttons.return_value = 2
+        self.subject.controller.get_numhats.return_value = 2
+
+        self.subject.state_change_callback = Mock()
+
+    @patch('controller.pygame.event')
+    def test_iterate_coalesced(self, event):
+        event.wait.return_value = _TEST_EVENTS[0]
+        event.get.return_value = _TEST_EVENTS[1:]
+
+        axis_data, button_data, hat_data = self.subject.get_initial_datas()
+
+        axis_data, button_data, hat_data, last_state = self.subject.iterate_coalesced(
+            axis_data, button_data, hat_data, None
+        )
+
+        # six events, one state
+        self.assert_(self.subject.state_change_callback.mock_calls == [
+            call(self.subject.build_state(_TEST_AXIS_DATA, _TEST_BUTTON_DATA, _TEST_HAT_DATA))
+        ])
+        self.assert_(last_state == self.subject.build_state(_TEST_AXIS_DATA, _TEST_BUTTON_DATA, _TEST_HAT_DATA))
+
+        self.assert_(axis_data == _TEST_AXIS_DATA)
+        self.assert_(button_data == _TEST_BUTTON_DATA)
+        self.assert_(hat_data == _TEST_HAT_DATA)
+
+        self.assert_(self.subject.events_per_frame.count == 1)
+        self.assert_(self.subject.events_per_frame.maximum == 6)
+        self.assert_(self.subject.drain_duration.count == 1)
+
+    @patch('controller.pygame.event')
+    def test_iterate_coalesced_unchanged(self, event):
+        event.wait.return_value = _TEST_EVENTS[0]
+        event.get.return_value = []
+
+        axis_data, button_data, hat_data = self.subject.get_initial_datas()
+        last_state = self.subject.build_state({0: -0.03}, button_data, hat_data)
+
+        _, _, _, state = self.subject.iterate_coalesced(axis_data, button_data, hat_data, last_state)
+
+        self.assert_(state is last_state)
+        self.assert_(self.subject.state_change_callback.mock_calls == [])
+
+    @patch('controller.pygame.event')
+    def test_iterate_coalesced_timeout(self, event):
+        event.wait.return_value = _TEST_NOEVENT
+
+        self.subject.iterate_coalesced({}, {}, {}, None)
+
+        self.assert_(event.wait.mock_calls == [call(1000)])
+        self.assert_(event.get.mock_calls == [])
+        self.assert_(self.subject.state_change_callback.mock_calls == [])
+
+    @patch('controller.pygame.event')
+    def test_wait_for_event_without_timeout(self, event):
+        event.wait.side_effect = [TypeError, _TEST_EVENTS[0]]
+
+        self.assert_(self.subject.wait_for_event(1.0) == _TEST_EVENTS[0])
+        self.assert_(event.wait.mock_calls == [call(1000), call()])
+
+    def test_loop(self):
+        self.subject.get_initial_datas = Mock()
+        self.subject.get_initial_datas.return_value = 1, 2, 3
+
+        self.subject.iterate_coalesced = Mock()
+        self.subject.iterate_coalesced.return_value = 1, 2, 3, 4
+
+        self.subject.loop(test_mode=True)
+
+        self.assert_(self.subject.iterate_coalesced.mock_calls == [
+            call(1, 2, 3, None)
+        ])
@@ -0,0 +1,124 @@
+import math
+import pickle
+import sys
+
+from protocol import encode_state, DeltaEncoder, KEYFRAME_INTERVAL
+
+# roughly what a UDP / IPv4 / 802.11 frame costs on top of the payload
+OVERHEAD = 8 + 20 + 34
+
+SYNTHETIC_DURATION = 60.0
+
+# the controller's send rate (controller.DEBOUNCE_PERIOD, without needing pygame to find it out)
+PERIOD = 1.0 / 50.0
+
+
+def load_session(path):
+    # a pickle stream of (time, state), as written by "controller.py --record-session" or a vehicle history spill
+    samples = []
+    with open(path, 'rb') as f:
+        while 1:
+            try:
+                samples.append(pickle.load(f))
+            except EOFError:
+                break
+
+    return samples
+
+
+def synthetic_session(duration=SYNTHETIC_DURATION, rate=100.0):
+    # steering wanders, the accelerator is squeezed now and then and the brake is left alone
+    samples = []
+    for i in range(int(duration * rate)):
+        t = i / rate
+        samples.append((t, {
+            'steering': round(math.sin(t * 0.7) * math.sin(t * 3.1), 3),
+            'brake': -1.0,
+            'accelerator': round(max(-1.0, math.sin(t * 0.2) * 2 - 1.0), 3),
+            'stop': False,
+            'record': False,
+            'play': False,
+        }))
+
+    return samples
+
+
+def replay(samples, period, keyframe_interval):
+    # what the scheduler would have sent: the latest state every period
+    encoder = DeltaEncoder(keyframe_interval)
+
+    full_bytes = 0
+    delta_bytes = 0
+    packets = 0
+
+    index = 0
+    state = None
+
+    started, finished = samples[0][0], samples[-1][0]
+
+    tick = 0
+    while started + (tick * period) <= finished:
+        now = started + (tick * period)
+        tick += 1
+
+        while index < len(samples) and samples[index][0] <= now:
+            state = samples[index][1]
+            index += 1
+
+        if state is None:
+            continue
+
+        packets += 1
+        full_bytes += len(encode_state(state, packets, now))
+        delta_bytes += len(encoder.encode(state, packets, now))
+
+    duration = max(finished - started, period)
+
+    return {
+        'duration': duration,
+        'packets': packets,
+        'full_bytes_per_second': full_bytes / duration,
+        'delta_bytes_per_second': delta_bytes / duration,
+        'full_wire_bytes_per_second': (full_bytes + (packets * OVERHEAD)) / duration,
+        'delta_wire_bytes_per_second': (delta_bytes + (packets * OVERHEAD)) / duration,
+        'keyframes': encoder.keyframes,
+    }
+
+
+def report(name, results):
+    print('{:<32}{:>8} packets{:>10.0f} B/s full{:>10.0f} B/s delta ({:.0f}% saved, {:.0f}% on the wire)'.format(
+        name,
+        results['packets'],
+        results['full_bytes_per_second'],
+        results['delta_bytes_per_second'],
+        (1 - (results['delta_bytes_per_second'] / results['full_bytes_per_second'])) * 100,
+        (1 - (results['delta_wire_bytes_per_second'] / results['full_wire_bytes_per_second'])) * 100,
+    ))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    period = PERIOD
+    if '--period' in args:
+        i = args.index('--period')
+        period = float(args[i + 1])
+        args = args[:i] + args[i + 2:]
+
+    keyframe_interval = KEYFRAME_INTERVAL
+    if '--keyframe-interval' in args:
+        i = args.index('--keyframe-interval')
+        keyframe_interval = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+
+    if args:
+        sessions = [(path, load_session(path)) for path in args]
+    else:
+        sessions = [('(synthetic)', synthetic_session())]
+
+    for name, samples in sessions:
+        if not samples:
+            print('{:<32}empty'.format(name))
+            continue
+
+        report(name, replay(samples, period, keyframe_interval))
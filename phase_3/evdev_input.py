@@ -0,0 +1,310 @@
+import errno
+import fcntl
+import glob
+import os
+import select
+import struct
+
+try:
+    # pygame's values when it's installed, so events from either source look the same to Controller.handle_event
+    from pygame import JOYAXISMOTION, JOYHATMOTION, JOYBUTTONDOWN, JOYBUTTONUP, NOEVENT
+except ImportError:
+    # SDL 1.2's, for a headless box without pygame
+    JOYAXISMOTION, JOYHATMOTION, JOYBUTTONDOWN, JOYBUTTONUP, NOEVENT = 7, 9, 10, 11, 0
+
+# struct input_event: a struct timeval (native longs, so 16 bytes on a 32 bit Pi and 24 on 64 bit), type, code, value
+INPUT_EVENT_FORMAT = struct.Struct('@llHHi')
+
+# struct input_absinfo: value, minimum, maximum, fuzz, flat, resolution
+ABSINFO_FORMAT = struct.Struct('@6i')
+
+# see linux/input-event-codes.h
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+
+SYN_REPORT = 0
+SYN_DROPPED = 3
+
+ABS_X = 0x00
+ABS_HAT0X = 0x10
+ABS_HAT3Y = 0x17
+ABS_CNT = 0x40
+
+BTN_MISC = 0x100
+BTN_JOYSTICK = 0x120
+KEY_CNT = 0x300
+
+# how many events a single read asks for
+READ_EVENTS = 64
+
+# where udev links joysticks and gamepads
+BY_ID_PATTERN = '/dev/input/by-id/*-event-joystick'
+
+
+def _ioc(direction, number, size):
+    # _IOC from asm-generic/ioctl.h for the evdev ('E') ioctls
+    return (direction << 30) | (size << 16) | (ord('E') << 8) | number
+
+
+_IOC_WRITE = 1
+_IOC_READ = 2
+
+
+def eviocgbit(event_type, length):
+    return _ioc(_IOC_READ, 0x20 + event_type, length)
+
+
+def eviocgkey(length):
+    return _ioc(_IOC_READ, 0x18, length)
+
+
+def eviocgabs(code):
+    return _ioc(_IOC_READ, 0x40 + code, ABSINFO_FORMAT.size)
+
+
+EVIOCGRAB = _ioc(_IOC_WRITE, 0x90, struct.calcsize('@i'))
+
+
+def _get_bits(fd, request, count):
+    # the codes set in the bitmask an EVIOCGBIT / EVIOCGKEY fills in
+    bits = bytearray((count + 7) // 8)
+    fcntl.ioctl(fd, request, bits)
+
+    return [i for i in range(count) if bits[i // 8] & (1 << (i % 8))]
+
+
+def find_joystick(pattern=BY_ID_PATTERN):
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise ValueError('expected a joystick matching {} but there was none'.format(repr(pattern)))
+
+    return paths[0]
+
+
+class JoystickEvent(object):
+    # just the attributes of a pygame joystick event that Controller.handle_event reads
+    __slots__ = ('type', 'axis', 'button', 'hat', 'value')
+
+    def __init__(self, type_, axis=None, button=None, hat=None, value=None):
+        self.type = type_
+        self.axis = axis
+        self.button = button
+        self.hat = hat
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, JoystickEvent) and all(
+            getattr(self, key) == getattr(other, key) for key in self.__slots__
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'JoystickEvent({})'.format(
+            ', '.join('{}={}'.format(key, repr(getattr(self, key))) for key in self.__slots__)
+        )
+
+
+class EvdevJoystick(object):
+    # reads input_event structs straight from a /dev/input/event* device (or anything else that gives them, e.g. a
+    # pipe), waking on epoll and reading everything that's there at once; stands in for pygame's Joystick and event
+    # queue in Controller (see Controller's joystick argument)
+    def __init__(self, path=None, fd=None, axis_codes=None, button_codes=None, absinfo_by_code=None, grab=False):
+        if (path is None) == (fd is None):
+            raise ValueError('expected one of path or fd but got {} and {}'.format(repr(path), repr(fd)))
+
+        self.path = path
+
+        self.owns_fd = fd is None
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK) if fd is None else fd
+
+        if not self.owns_fd:
+            fcntl.fcntl(self.fd, fcntl.F_SETFL, fcntl.fcntl(self.fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        # what the device has, in code order; a pipe can't be asked, so tests say
+        if axis_codes is None:
+            axis_codes = _get_bits(self.fd, eviocgbit(EV_ABS, (ABS_CNT + 7) // 8), ABS_CNT)
+
+        if button_codes is None:
+            button_codes = _get_bits(self.fd, eviocgbit(EV_KEY, (KEY_CNT + 7) // 8), KEY_CNT)
+
+        # numbered the same way as SDL's evdev driver, so profiles written against pygame index the same; hats aren't
+        # axes, and joystick / gamepad buttons come before the miscellaneous ones
+        self.hat_codes = [x for x in axis_codes if ABS_HAT0X <= x <= ABS_HAT3Y]
+        axis_codes = [x for x in axis_codes if not ABS_HAT0X <= x <= ABS_HAT3Y]
+        button_codes = [x for x in button_codes if x >= BTN_JOYSTICK] + \
+                       [x for x in button_codes if BTN_MISC <= x < BTN_JOYSTICK]
+
+        self.axis_by_code = dict((code, index) for index, code in enumerate(axis_codes))
+        self.button_by_code = dict((code, index) for index, code in enumerate(button_codes))
+
+        # (minimum, maximum) per axis, to scale raw values to -1.0 .. 1.0
+        if absinfo_by_code is None:
+            absinfo_by_code = dict((code, self.get_absinfo(code)[1:3]) for code in axis_codes)
+
+        self.scale_by_code = {}
+        for code in axis_codes:
+            minimum, maximum = absinfo_by_code.get(code, (-32768, 32767))
+            self.scale_by_code[code] = (minimum, 2.0 / ((maximum - minimum) or 1))
+
+        # pygame's hat value is (x, y) with up positive; evdev has down positive
+        self.hat_values = [[0, 0] for _ in range(max([(x - ABS_HAT0X) // 2 + 1 for x in self.hat_codes] or [0]))]
+
+        # part of a struct left over from the last read
+        self.remainder = b''
+
+        # the kernel's buffer overflowed; everything up to the next SYN_REPORT is to be thrown away
+        self.dropping = False
+
+        self.events_read = 0
+        self.reads = 0
+        self.dropped = 0
+
+        if grab:
+            # nothing else (e.g. the console) sees the device's events while we have it
+            fcntl.ioctl(self.fd, EVIOCGRAB, 1)
+
+        self.epoll = select.epoll()
+        self.epoll.register(self.fd, select.EPOLLIN)
+
+    def fileno(self):
+        return self.fd
+
+    def get_absinfo(self, code):
+        return ABSINFO_FORMAT.unpack(fcntl.ioctl(self.fd, eviocgabs(code), b'\x00' * ABSINFO_FORMAT.size))
+
+    def get_numaxes(self):
+        return len(self.axis_by_code)
+
+    def get_numbuttons(self):
+        return len(self.button_by_code)
+
+    def get_numhats(self):
+        return len(self.hat_values)
+
+    def wait(self, timeout):
+        # True once there's something to read, False on timeout
+        return bool(self.epoll.poll(timeout))
+
+    def read(self):
+        # everything there is to read right now, without blocking
+        chunks = [self.remainder]
+
+        size = INPUT_EVENT_FORMAT.size * READ_EVENTS
+        while 1:
+            try:
+                data = os.read(self.fd, size)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+
+                raise
+
+            self.reads += 1
+
+            if not data:
+                break
+
+            chunks.append(data)
+
+            if len(data) < size:
+                break
+
+        data = b''.join(chunks)
+
+        whole = len(data) - (len(data) % INPUT_EVENT_FORMAT.size)
+        self.remainder = data[whole:]
+
+        return data[:whole]
+
+    def read_events(self):
+        # as JoystickEvents; SYN_REPORTs and anything the controller doesn't care about are left out
+        data = self.read()
+
+        events = []
+        for offset in range(0, len(data), INPUT_EVENT_FORMAT.size):
+            _, _, event_type, code, value = INPUT_EVENT_FORMAT.unpack_from(data, offset)
+
+            self.events_read += 1
+
+            if event_type == EV_SYN:
+                if code == SYN_DROPPED:
+                    self.dropping = True
+                    self.dropped += 1
+                elif code == SYN_REPORT and self.dropping:
+                    self.dropping = False
+                    events.extend(self.resync())
+
+                continue
+
+            if self.dropping:
+                continue
+
+            event = self.translate(event_type, code, value)
+            if event is not None:
+                events.append(event)
+
+        return events
+
+    def translate(self, event_type, code, value):
+        if event_type == EV_ABS:
+            if ABS_HAT0X <= code <= ABS_HAT3Y:
+                hat = (code - ABS_HAT0X) // 2
+                if hat >= len(self.hat_values):
+                    return None
+
+                self.hat_values[hat][(code - ABS_HAT0X) % 2] = value
+
+                x, y = self.hat_values[hat]
+
+                return JoystickEvent(JOYHATMOTION, hat=hat, value=(x, -y))
+
+            axis = self.axis_by_code.get(code)
+            if axis is None:
+                return None
+
+            minimum, scale = self.scale_by_code[code]
+
+            return JoystickEvent(JOYAXISMOTION, axis=axis, value=max(-1.0, min(1.0, ((value - minimum) * scale) - 1.0)))
+
+        if event_type == EV_KEY:
+            button = self.button_by_code.get(code)
+
+            # 2 is autorepeat, which a button that's still held doesn't need
+            if button is None or value == 2:
+                return None
+
+            return JoystickEvent(JOYBUTTONDOWN if value else JOYBUTTONUP, button=button)
+
+        return None
+
+    def resync(self):
+        # after a SYN_DROPPED, ask the device where everything is now rather than trust what got through
+        if not self.owns_fd:
+            return []
+
+        events = []
+
+        for code in list(self.axis_by_code) + self.hat_codes:
+            events.append(self.translate(EV_ABS, code, self.get_absinfo(code)[0]))
+
+        pressed = set(_get_bits(self.fd, eviocgkey((KEY_CNT + 7) // 8), KEY_CNT))
+        for code in self.button_by_code:
+            events.append(self.translate(EV_KEY, code, 1 if code in pressed else 0))
+
+        return events
+
+    def get_stats(self):
+        return {
+            'reads': self.reads,
+            'events_read': self.events_read,
+            'dropped': self.dropped,
+        }
+
+    def close(self):
+        self.epoll.close()
+
+        if self.owns_fd:
+            os.close(self.fd)
@@ -0,0 +1,198 @@
+import os
+import unittest
+
+from mock import Mock, call
+
+from controller import Controller
+from evdev_input import EvdevJoystick, JoystickEvent, INPUT_EVENT_FORMAT, READ_EVENTS, EV_SYN, EV_KEY, EV_ABS, \
+    SYN_REPORT, SYN_DROPPED, ABS_X, ABS_HAT0X, BTN_MISC, BTN_JOYSTICK, JOYAXISMOTION, JOYHATMOTION, JOYBUTTONDOWN, \
+    JOYBUTTONUP
+
+ABS_Y = 0x01
+ABS_Z = 0x02
+ABS_RX = 0x03
+ABS_RY = 0x04
+ABS_RZ = 0x05
+ABS_HAT0Y = 0x11
+
+BTN_SOUTH = 0x130
+BTN_EAST = 0x131
+BTN_NORTH = 0x133
+BTN_WEST = 0x134
+
+# roughly what a PS4 controller reports; the triggers rest at 0 and the sticks in the middle
+_AXIS_CODES = [ABS_X, ABS_Y, ABS_Z, ABS_RX, ABS_RY, ABS_RZ, ABS_HAT0X, ABS_HAT0Y]
+_BUTTON_CODES = [BTN_SOUTH, BTN_EAST, BTN_NORTH, BTN_WEST]
+_ABSINFO_BY_CODE = dict((code, (0, 255)) for code in _AXIS_CODES)
+
+
+def _pack(*events):
+    return b''.join(INPUT_EVENT_FORMAT.pack(0, 0, event_type, code, value) for event_type, code, value in events)
+
+
+class EvdevJoystickTest(unittest.TestCase):
+    def setUp(self):
+        self.read_fd, self.write_fd = os.pipe()
+
+        self.subject = EvdevJoystick(
+            fd=self.read_fd,
+            axis_codes=_AXIS_CODES,
+            button_codes=_BUTTON_CODES,
+            absinfo_by_code=_ABSINFO_BY_CODE,
+        )
+
+    def tearDown(self):
+        self.subject.close()
+
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+    def write(self, *events):
+        os.write(self.write_fd, _pack(*events))
+
+    def test_path_or_fd(self):
+        self.assertRaises(ValueError, EvdevJoystick)
+        self.assertRaises(ValueError, EvdevJoystick, path='/dev/input/event0', fd=self.read_fd)
+
+    def test_counts(self):
+        self.assert_(self.subject.get_numaxes() == 6)
+        self.assert_(self.subject.get_numbuttons() == 4)
+        self.assert_(self.subject.get_numhats() == 1)
+
+    def test_wait(self):
+        self.assert_(not self.subject.wait(0))
+
+        self.write((EV_SYN, SYN_REPORT, 0))
+
+        self.assert_(self.subject.wait(0))
+
+    def test_axes(self):
+        self.write((EV_ABS, ABS_X, 0), (EV_ABS, ABS_RZ, 255), (EV_ABS, ABS_Y, 128), (EV_SYN, SYN_REPORT, 0))
+
+        events = self.subject.read_events()
+
+        self.assert_(events[:2] == [
+            JoystickEvent(JOYAXISMOTION, axis=0, value=-1.0),
+            JoystickEvent(JOYAXISMOTION, axis=5, value=1.0),
+        ])
+        self.assertAlmostEqual(events[2].value, 0.0, places=2)
+
+    def test_buttons(self):
+        # 2 is autorepeat
+        self.write((EV_KEY, BTN_EAST, 1), (EV_KEY, BTN_EAST, 2), (EV_KEY, BTN_EAST, 0), (EV_SYN, SYN_REPORT, 0))
+
+        self.assert_(self.subject.read_events() == [
+            JoystickEvent(JOYBUTTONDOWN, button=1),
+            JoystickEvent(JOYBUTTONUP, button=1),
+        ])
+
+    def test_hats_are_up_positive(self):
+        self.write((EV_ABS, ABS_HAT0X, 1), (EV_ABS, ABS_HAT0Y, -1), (EV_SYN, SYN_REPORT, 0))
+
+        self.assert_(self.subject.read_events() == [
+            JoystickEvent(JOYHATMOTION, hat=0, value=(1, 0)),
+            JoystickEvent(JOYHATMOTION, hat=0, value=(1, 1)),
+        ])
+
+    def test_unknown_codes(self):
+        self.write((EV_KEY, BTN_MISC, 1), (EV_ABS, ABS_HAT0X + 2, 1), (4, 4, 1), (EV_SYN, SYN_REPORT, 0))
+
+        self.assert_(self.subject.read_events() == [])
+
+    def test_partial_struct(self):
+        data = _pack((EV_KEY, BTN_SOUTH, 1), (EV_KEY, BTN_SOUTH, 0))
+
+        os.write(self.write_fd, data[:INPUT_EVENT_FORMAT.size + 3])
+        self.assert_(self.subject.read_events() == [JoystickEvent(JOYBUTTONDOWN, button=0)])
+
+        os.write(self.write_fd, data[INPUT_EVENT_FORMAT.size + 3:])
+        self.assert_(self.subject.read_events() == [JoystickEvent(JOYBUTTONUP, button=0)])
+
+    def test_bulk(self):
+        self.write(*[(EV_ABS, ABS_X, i % 256) for i in range(READ_EVENTS * 3)])
+
+        self.assert_(len(self.subject.read_events()) == READ_EVENTS * 3)
+        self.assert_(self.subject.get_stats()['reads'] == 3)
+
+    def test_dropped(self):
+        # everything up to the SYN_REPORT after a SYN_DROPPED is incomplete, so it's thrown away
+        self.write(
+            (EV_KEY, BTN_SOUTH, 1),
+            (EV_SYN, SYN_DROPPED, 0),
+            (EV_KEY, BTN_EAST, 1),
+            (EV_SYN, SYN_REPORT, 0),
+            (EV_KEY, BTN_NORTH, 1),
+        )
+
+        self.assert_(self.subject.read_events() == [
+            JoystickEvent(JOYBUTTONDOWN, button=0),
+            JoystickEvent(JOYBUTTONDOWN, button=2),
+        ])
+        self.assert_(self.subject.get_stats()['dropped'] == 1)
+
+    def test_button_order(self):
+        subject = EvdevJoystick(fd=self.read_fd, axis_codes=[], button_codes=[BTN_MISC, BTN_JOYSTICK, BTN_SOUTH])
+
+        self.assert_(subject.button_by_code == {BTN_JOYSTICK: 0, BTN_SOUTH: 1, BTN_MISC: 2})
+
+        subject.close()
+
+
+class EvdevControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.read_fd, self.write_fd = os.pipe()
+
+        self.joystick = EvdevJoystick(
+            fd=self.read_fd,
+            axis_codes=_AXIS_CODES,
+            button_codes=_BUTTON_CODES,
+            absinfo_by_code=_ABSINFO_BY_CODE,
+        )
+
+        self.subject = Controller(coalesce_events=True, joystick=self.joystick)
+        self.subject.state_change_callback = Mock()
+
+    def tearDown(self):
+        self.joystick.close()
+
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+    def test_get_initial_datas(self):
+        self.assert_(self.subject.get_initial_datas() == ({}, {0: False, 1: False, 2: False, 3: False}, {0: (0, 0)}))
+
+    def test_iterate_coalesced(self):
+        os.write(self.write_fd, _pack(
+            (EV_ABS, ABS_X, 0),
+            (EV_ABS, ABS_RX, 0),
+            (EV_ABS, ABS_RY, 0),
+            (EV_KEY, BTN_SOUTH, 1),
+            (EV_SYN, SYN_REPORT, 0),
+        ))
+
+        axis_data, button_data, hat_data, last_state = self.subject.iterate_coalesced(
+            *self.subject.get_initial_datas() + (None,)
+        )
+
+        # the same state pygame events with the same values would have built
+        expected = Controller.build_state({0: -1.0, 3: -1.0, 4: -1.0}, button_data, hat_data)
+
+        self.assert_(axis_data == {0: -1.0, 3: -1.0, 4: -1.0})
+        self.assert_(button_data[0] is True)
+        self.assert_(last_state == expected)
+        self.assert_(self.subject.state_change_callback.mock_calls == [call(expected)])
+
+        self.assert_(self.subject.events_per_frame.maximum == 4)
+        self.assert_(self.subject.get_stats()['joystick']['events_read'] == 5)
+
+    def test_iterate_coalesced_timeout(self):
+        self.subject.joystick.wait = Mock(return_value=False)
+
+        self.assert_(self.subject.iterate_coalesced({}, {}, {}, None) == ({}, {}, {}, None))
+        self.assert_(self.subject.joystick.wait.mock_calls == [call(1.0)])
+
+    def test_iterate_coalesced_nothing_but_syn(self):
+        os.write(self.write_fd, _pack((EV_SYN, SYN_REPORT, 0)))
+
+        self.assert_(self.subject.iterate_coalesced({}, {}, {}, None) == ({}, {}, {}, None))
+        self.assert_(self.subject.state_change_callback.mock_calls == [])
@@ -0,0 +1,196 @@
+import time
+import traceback
+from threading import Thread, Event, Lock
+
+from clock import monotonic
+from stats import Histogram
+
+# pigpio's script states (pigpio.PI_SCRIPT_*)
+PI_SCRIPT_INITING = 0
+PI_SCRIPT_HALTED = 1
+PI_SCRIPT_RUNNING = 2
+PI_SCRIPT_WAITING = 3
+PI_SCRIPT_FAILED = 4
+
+SCRIPT_INIT_TIMEOUT = 1.0
+
+# p0 is bumped by every feed; if it hasn't moved after a whole timeout the idle command runs and p1 counts it
+WATCHDOG_SCRIPT = '''
+tag 0
+lda p0
+sta v0
+mils {timeout_ms}
+lda p0
+cmp v0
+jnz 0
+{idle_command}
+lda p1
+add 1
+sta p1
+jmp 0
+'''
+
+
+class ThreadWatchdog(Thread):
+    def __init__(self, output, gpio, frequency, idle_duty, timeout, clock=monotonic, sleep=time.sleep):
+        super(ThreadWatchdog, self).__init__()
+
+        self.daemon = True
+
+        self.output = output
+        self.gpio = gpio
+        self.frequency = frequency
+        self.idle_duty = idle_duty
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+
+        self.last_fed_at = None
+        self.tripped = False
+
+        self.trips = 0
+
+        # how long after the deadline the idle write actually happened
+        self.trip_latency = Histogram(timeout / 100.0, 1000)
+
+        self.lock = Lock()
+
+        self.stop_event = Event()
+
+    def feed(self):
+        now = self.clock()
+
+        with self.lock:
+            self.last_fed_at = now
+            tripped, self.tripped = self.tripped, False
+
+        # the idle write went behind the output driver's back, so its idea of the last duty is stale
+        if tripped:
+            self.output.invalidate(self.gpio)
+
+        if not self.is_alive() and not self.stop_event.is_set():
+            self.start()
+
+    def disarm(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def get_stats(self):
+        return {
+            'trips': self.trips,
+            'trip_latency': self.trip_latency.summary(),
+        }
+
+    def iterate(self):
+        with self.lock:
+            deadline = self.last_fed_at + self.timeout
+            tripped = self.tripped
+
+        now = self.clock()
+
+        if now < deadline:
+            self.sleep(deadline - now)
+            return
+
+        if tripped:
+            # nothing more to do until the next feed
+            self.sleep(self.timeout)
+            return
+
+        self.output.force(self.gpio, self.frequency, self.idle_duty)
+
+        with self.lock:
+            # a feed that landed while we were writing wins; the next state overwrites the idle duty anyway
+            self.tripped = True
+
+        self.trips += 1
+        self.trip_latency.record(self.clock() - deadline)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.iterate()
+            except Exception:
+                traceback.print_exc()
+
+
+class ScriptWatchdog(object):
+    def __init__(self, output, gpio, frequency, idle_duty, timeout, clock=monotonic, sleep=time.sleep):
+        self.output = output
+        self.pi = output.pi
+        self.gpio = gpio
+        self.frequency = frequency
+        self.idle_duty = idle_duty
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+
+        # every feed is a round trip to pigpiod, so they're spread out to a few per timeout
+        self.feed_interval = timeout / 4.0
+
+        self.script_id = None
+
+        self.feeds = 0
+        self.last_fed_at = None
+        self.last_updated_at = None
+
+    def build_script(self):
+        return WATCHDOG_SCRIPT.format(
+            timeout_ms=int(self.timeout * 1000),
+            idle_command=self.output.get_script_command(self.gpio, self.frequency, self.idle_duty),
+        )
+
+    def arm(self):
+        self.script_id = self.pi.store_script(self.build_script().encode('ascii'))
+        if self.script_id < 0:
+            raise ValueError('expected pigpiod to accept the watchdog script but got {}'.format(self.script_id))
+
+        deadline = self.clock() + SCRIPT_INIT_TIMEOUT
+        while self.pi.script_status(self.script_id)[0] == PI_SCRIPT_INITING:
+            if self.clock() > deadline:
+                raise ValueError('expected the watchdog script to be ready within {} seconds'.format(
+                    SCRIPT_INIT_TIMEOUT
+                ))
+
+            self.sleep(0.001)
+
+        self.pi.run_script(self.script_id, [self.feeds, 0])
+
+    def feed(self):
+        now = self.clock()
+
+        if self.script_id is None:
+            self.arm()
+
+        # pigpiod may well have written the idle duty; it runs on its own, so the gap is all we have to go on
+        if self.last_fed_at is not None and now - self.last_fed_at >= self.timeout:
+            self.output.invalidate(self.gpio)
+
+        self.last_fed_at = now
+
+        if self.last_updated_at is not None and now - self.last_updated_at < self.feed_interval:
+            return
+
+        self.feeds += 1
+        self.pi.update_script(self.script_id, [self.feeds])
+        self.last_updated_at = now
+
+    def disarm(self):
+        if self.script_id is None:
+            return
+
+        self.pi.stop_script(self.script_id)
+        self.pi.delete_script(self.script_id)
+        self.script_id = None
+
+    def get_stats(self):
+        trips = None
+        if self.script_id is not None:
+            status, params = self.pi.script_status(self.script_id)
+            trips = params[1]
+
+        return {
+            'feeds': self.feeds,
+            'trips': trips,
+        }
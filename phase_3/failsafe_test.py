@@ -0,0 +1,184 @@
+import time
+import unittest
+from threading import Thread, Event
+
+from mock import patch
+
+import fake_pigpio
+from failsafe import ThreadWatchdog, ScriptWatchdog
+from output import SoftwarePWMOutput, HardwarePWMOutput
+
+_GPIO = 18
+_FREQUENCY = 50
+_IDLE_DUTY = 7.5
+_IDLE_VALUE = 19
+
+_TIMEOUT = 0.05
+
+# how long past the deadline the idle write is allowed to land, even with the CPU busy
+_BOUND = 0.05
+
+
+class CPULoad(object):
+    def __init__(self, threads=4):
+        self.stop_event = Event()
+        self.threads = [Thread(target=self.spin) for _ in range(threads)]
+
+    def spin(self):
+        x = 0
+        while not self.stop_event.is_set():
+            x += 1
+
+    def __enter__(self):
+        for thread in self.threads:
+            thread.start()
+
+        return self
+
+    def __exit__(self, *args):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+
+class WatchdogTestMixin(object):
+    watchdog_class = None
+
+    def setUp(self):
+        self.pi = fake_pigpio.FakePi()
+        self.output = SoftwarePWMOutput(self.pi)
+
+        self.output.set(_GPIO, _FREQUENCY, 10.0)
+
+        self.subject = self.watchdog_class(self.output, _GPIO, _FREQUENCY, _IDLE_DUTY, _TIMEOUT)
+        self.addCleanup(self.subject.disarm)
+
+    def get_idle_writes(self):
+        return [x for x in self.pi.writes if x[1] == _GPIO and x[2] == _IDLE_VALUE]
+
+    def wait_for_idle_write(self, timeout=1.0):
+        deadline = time.time() + timeout
+        while not self.get_idle_writes() and time.time() < deadline:
+            time.sleep(0.001)
+
+        return self.get_idle_writes()
+
+    def test_no_trip_while_fed(self):
+        for _ in range(20):
+            self.subject.feed()
+            time.sleep(_TIMEOUT / 5)
+
+        self.assert_(self.get_idle_writes() == [])
+
+    def test_trip_latency_under_load(self):
+        with CPULoad():
+            last_fed_at = time.time()
+            self.subject.feed()
+
+            writes = self.wait_for_idle_write()
+
+        self.assert_(len(writes) >= 1)
+
+        latency = writes[0][0] - last_fed_at
+
+        self.assert_(latency >= _TIMEOUT)
+        self.assert_(latency < _TIMEOUT * 2 + _BOUND)
+
+    def test_feed_after_trip_invalidates_output(self):
+        self.subject.feed()
+        self.wait_for_idle_write()
+
+        time.sleep(_TIMEOUT)
+        self.subject.feed()
+
+        # the same duty as before the trip has to actually be written again
+        self.output.set(_GPIO, _FREQUENCY, 10.0)
+
+        self.assert_(self.pi.duty_by_gpio[_GPIO] == self.output.quantize(10.0))
+
+
+class ThreadWatchdogTest(WatchdogTestMixin, unittest.TestCase):
+    watchdog_class = ThreadWatchdog
+
+    def test_stats(self):
+        self.subject.feed()
+        self.wait_for_idle_write()
+        time.sleep(0.01)
+
+        stats = self.subject.get_stats()
+
+        self.assert_(stats['trips'] == 1)
+        self.assert_(stats['trip_latency']['count'] == 1)
+
+
+class ScriptWatchdogTest(WatchdogTestMixin, unittest.TestCase):
+    watchdog_class = ScriptWatchdog
+
+    def test_script(self):
+        self.assert_('pwm 18 19' in self.subject.build_script())
+
+    def test_hardware_script(self):
+        subject = ScriptWatchdog(HardwarePWMOutput(self.pi), _GPIO, _FREQUENCY, _IDLE_DUTY, _TIMEOUT)
+
+        self.assert_('hp 18 50 75000' in subject.build_script())
+
+    def test_stats(self):
+        self.subject.feed()
+        self.wait_for_idle_write()
+
+        stats = self.subject.get_stats()
+
+        self.assert_(stats['feeds'] == 1)
+        self.assert_(stats['trips'] >= 1)
+
+    def test_feeds_are_spread_out(self):
+        for _ in range(10):
+            self.subject.feed()
+
+        self.assert_(self.subject.feeds == 1)
+
+
+class VehicleWatchdogTest(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('vehicle.pigpio', fake_pigpio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        import vehicle
+
+        self.subject = vehicle.Vehicle(
+            vehicle.STEERING_GPIO,
+            vehicle.THROTTLE_GPIO,
+            vehicle.FREQUENCY,
+            vehicle.MIN_DUTY,
+            vehicle.IDLE_DUTY,
+            vehicle.MAX_DUTY,
+            vehicle.TIMEOUT,
+            watchdog_class=ThreadWatchdog,
+            watchdog_timeout=_TIMEOUT,
+        )
+        self.addCleanup(self.subject.disarm_watchdog)
+
+        self.vehicle = vehicle
+
+    def test_stalled_loop_idles_throttle(self):
+        state = {
+            'steering': 0.0,
+            'brake': -1.0,
+            'accelerator': 1.0,
+            'stop': False,
+            'record': False,
+            'play': False,
+        }
+
+        self.subject.handle_state(state, None)
+
+        throttle_gpio = self.vehicle.THROTTLE_GPIO
+        idle = self.subject.output.quantize(self.vehicle.IDLE_DUTY)
+
+        self.assert_(self.subject.pi.duty_by_gpio[throttle_gpio] != idle)
+
+        # no more trips round the control loop
+        time.sleep(_TIMEOUT * 2 + _BOUND)
+
+        self.assert_(self.subject.pi.duty_by_gpio[throttle_gpio] == idle)
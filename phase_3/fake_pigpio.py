@@ -0,0 +1,189 @@
+import time
+from threading import Thread, Event, Lock
+
+PI_SCRIPT_INITING = 0
+PI_SCRIPT_HALTED = 1
+PI_SCRIPT_RUNNING = 2
+PI_SCRIPT_WAITING = 3
+PI_SCRIPT_FAILED = 4
+
+
+class FakeScript(Thread):
+    # just enough of pigpio's script language for failsafe.WATCHDOG_SCRIPT
+    def __init__(self, pi, text):
+        super(FakeScript, self).__init__()
+
+        self.daemon = True
+
+        self.pi = pi
+
+        self.instructions = [line.split() for line in text.decode('ascii').splitlines() if line.strip()]
+        self.index_by_tag = dict(
+            (int(instruction[1]), index) for index, instruction in enumerate(self.instructions)
+            if instruction[0] == 'tag'
+        )
+
+        self.params = [0] * 10
+        self.variables = [0] * 150
+        self.accumulator = 0
+        self.flag = 0
+
+        self.status = PI_SCRIPT_HALTED
+
+        self.stop_event = Event()
+
+    def value(self, operand):
+        if operand.startswith('p'):
+            return self.params[int(operand[1:])]
+        elif operand.startswith('v'):
+            return self.variables[int(operand[1:])]
+
+        return int(operand)
+
+    def execute(self, index):
+        instruction = self.instructions[index]
+        command, operands = instruction[0], instruction[1:]
+
+        if command == 'tag':
+            pass
+        elif command == 'lda':
+            self.accumulator = self.value(operands[0])
+        elif command == 'sta':
+            target = operands[0]
+            if target.startswith('p'):
+                self.params[int(target[1:])] = self.accumulator
+            else:
+                self.variables[int(target[1:])] = self.accumulator
+        elif command == 'add':
+            self.accumulator += self.value(operands[0])
+        elif command == 'cmp':
+            self.flag = self.accumulator - self.value(operands[0])
+        elif command == 'jmp':
+            return self.index_by_tag[int(operands[0])]
+        elif command == 'jnz':
+            if self.flag != 0:
+                return self.index_by_tag[int(operands[0])]
+        elif command == 'mils':
+            self.status = PI_SCRIPT_WAITING
+            self.stop_event.wait(self.value(operands[0]) / 1000.0)
+            self.status = PI_SCRIPT_RUNNING
+        elif command == 'pwm':
+            self.pi.set_PWM_dutycycle(self.value(operands[0]), self.value(operands[1]))
+        elif command == 'hp':
+            self.pi.hardware_PWM(self.value(operands[0]), self.value(operands[1]), self.value(operands[2]))
+        else:
+            raise ValueError('expected a supported script command but got {}'.format(repr(command)))
+
+        return index + 1
+
+    def run(self):
+        self.status = PI_SCRIPT_RUNNING
+
+        index = 0
+        while not self.stop_event.is_set() and index < len(self.instructions):
+            index = self.execute(index)
+
+        self.status = PI_SCRIPT_HALTED
+
+
+class FakePi(object):
+    def __init__(self, clock=time.time):
+        self.clock = clock
+
+        self.connected = True
+
+        self.frequency_by_gpio = {}
+        self.duty_by_gpio = {}
+        self.writes = []
+
+        self.write_callback = None
+
+        self.scripts = []
+
+        self.lock = Lock()
+
+    def set_write_callback(self, write_callback):
+        if not callable(write_callback):
+            raise TypeError('expected {} to be callable but it was not'.format(repr(write_callback)))
+
+        self.write_callback = write_callback
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        with self.lock:
+            self.frequency_by_gpio[user_gpio] = frequency
+
+        return frequency
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        now = self.clock()
+
+        with self.lock:
+            self.duty_by_gpio[user_gpio] = dutycycle
+            self.writes.append((now, user_gpio, dutycycle))
+
+        if self.write_callback is not None:
+            self.write_callback(now, user_gpio, dutycycle)
+
+        return 0
+
+    def set_PWM_range(self, user_gpio, range_):
+        return 255
+
+    def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+        now = self.clock()
+
+        with self.lock:
+            self.frequency_by_gpio[gpio] = PWMfreq
+            self.duty_by_gpio[gpio] = PWMduty
+            self.writes.append((now, gpio, PWMduty))
+
+        if self.write_callback is not None:
+            self.write_callback(now, gpio, PWMduty)
+
+        return 0
+
+    def store_script(self, script):
+        with self.lock:
+            self.scripts.append(FakeScript(self, script))
+
+            return len(self.scripts) - 1
+
+    def script_status(self, script_id):
+        script = self.scripts[script_id]
+
+        return script.status, tuple(script.params)
+
+    def run_script(self, script_id, params=None):
+        script = self.scripts[script_id]
+        for i, param in enumerate(params or []):
+            script.params[i] = param
+
+        script.start()
+
+        return 0
+
+    def update_script(self, script_id, params=None):
+        script = self.scripts[script_id]
+        for i, param in enumerate(params or []):
+            script.params[i] = param
+
+        return 0
+
+    def stop_script(self, script_id):
+        script = self.scripts[script_id]
+        script.stop_event.set()
+        if script.is_alive():
+            script.join()
+
+        return 0
+
+    def delete_script(self, script_id):
+        self.stop_script(script_id)
+
+        return 0
+
+    def stop(self):
+        self.connected = False
+
+
+pi = FakePi
@@ -0,0 +1,118 @@
+DEFAULT_PWM_RANGE = 255
+
+HARDWARE_PWM_RANGE = 1000000
+
+# GPIOs that can drive one of the two hardware PWM channels
+HARDWARE_PWM_CHANNEL_BY_GPIO = {
+    12: 0,
+    18: 0,
+    13: 1,
+    19: 1,
+}
+
+
+class SoftwarePWMOutput(object):
+    def __init__(self, pi, pwm_range=DEFAULT_PWM_RANGE):
+        self.pi = pi
+        self.pwm_range = pwm_range
+
+        self.last_frequency_by_gpio = {}
+        self.last_duty_by_gpio = {}
+
+        self.writes = 0
+        self.suppressed_writes = 0
+
+    def quantize(self, duty):
+        return int(round((duty / 100.0) * self.pwm_range))
+
+    def invalidate(self, gpio=None):
+        if gpio is None:
+            self.last_frequency_by_gpio.clear()
+            self.last_duty_by_gpio.clear()
+        else:
+            self.last_frequency_by_gpio.pop(gpio, None)
+            self.last_duty_by_gpio.pop(gpio, None)
+
+    def set(self, gpio, frequency, duty):
+        last_frequency = self.last_frequency_by_gpio.get(gpio)
+        if last_frequency is None or last_frequency != frequency:
+            self.pi.set_PWM_frequency(gpio, frequency)
+            if self.pwm_range != DEFAULT_PWM_RANGE:
+                self.pi.set_PWM_range(gpio, self.pwm_range)
+
+            self.last_frequency_by_gpio[gpio] = frequency
+
+        # compare at the resolution pigpio actually applies, not as floats
+        duty = self.quantize(duty)
+
+        last_duty = self.last_duty_by_gpio.get(gpio)
+        if last_duty is None or last_duty != duty:
+            self.pi.set_PWM_dutycycle(gpio, duty)
+            self.last_duty_by_gpio[gpio] = duty
+            self.writes += 1
+        else:
+            self.suppressed_writes += 1
+
+    def force(self, gpio, frequency, duty):
+        # straight to pigpio without touching the cache, so it's safe from another thread (see failsafe.py)
+        self.pi.set_PWM_dutycycle(gpio, self.quantize(duty))
+
+    def get_script_command(self, gpio, frequency, duty):
+        # the same write as force(), as a pigpio script command
+        return 'pwm {} {}'.format(gpio, self.quantize(duty))
+
+    def get_stats(self):
+        return {
+            'writes': self.writes,
+            'suppressed_writes': self.suppressed_writes,
+        }
+
+
+class HardwarePWMOutput(SoftwarePWMOutput):
+    def __init__(self, pi, pwm_range=DEFAULT_PWM_RANGE):
+        super(HardwarePWMOutput, self).__init__(pi, pwm_range)
+
+        self.gpio_by_channel = {}
+        self.last_setting_by_gpio = {}
+
+    def invalidate(self, gpio=None):
+        super(HardwarePWMOutput, self).invalidate(gpio)
+
+        if gpio is None:
+            self.last_setting_by_gpio.clear()
+        else:
+            self.last_setting_by_gpio.pop(gpio, None)
+
+    def force(self, gpio, frequency, duty):
+        if gpio not in HARDWARE_PWM_CHANNEL_BY_GPIO:
+            return super(HardwarePWMOutput, self).force(gpio, frequency, duty)
+
+        self.pi.hardware_PWM(gpio, int(frequency), int(round((duty / 100.0) * HARDWARE_PWM_RANGE)))
+
+    def get_script_command(self, gpio, frequency, duty):
+        if gpio not in HARDWARE_PWM_CHANNEL_BY_GPIO:
+            return super(HardwarePWMOutput, self).get_script_command(gpio, frequency, duty)
+
+        return 'hp {} {} {}'.format(gpio, int(frequency), int(round((duty / 100.0) * HARDWARE_PWM_RANGE)))
+
+    def set(self, gpio, frequency, duty):
+        channel = HARDWARE_PWM_CHANNEL_BY_GPIO.get(gpio)
+
+        # anything that isn't on a hardware PWM channel falls back to software PWM
+        if channel is None:
+            return super(HardwarePWMOutput, self).set(gpio, frequency, duty)
+
+        channel_gpio = self.gpio_by_channel.setdefault(channel, gpio)
+        if channel_gpio != gpio:
+            raise ValueError('expected hardware PWM channel {} to only drive GPIO {} but got GPIO {}'.format(
+                channel, channel_gpio, gpio
+            ))
+
+        setting = (int(frequency), int(round((duty / 100.0) * HARDWARE_PWM_RANGE)))
+
+        if self.last_setting_by_gpio.get(gpio) != setting:
+            self.pi.hardware_PWM(gpio, setting[0], setting[1])
+            self.last_setting_by_gpio[gpio] = setting
+            self.writes += 1
+        else:
+            self.suppressed_writes += 1
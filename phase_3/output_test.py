@@ -0,0 +1,79 @@
+import unittest
+
+from mock import Mock, call
+
+from output import SoftwarePWMOutput, HardwarePWMOutput
+
+
+class SoftwarePWMOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.pi = Mock()
+
+        self.subject = SoftwarePWMOutput(self.pi)
+
+    def test_set(self):
+        self.subject.set(19, 50.0, 7.5)
+        self.subject.set(19, 50.0, 7.6)
+        self.subject.set(19, 50.0, 7.8)
+
+        # 7.5% and 7.6% are both 19/255, so only the first and last make it to pigpio
+        self.assert_(self.pi.mock_calls == [
+            call.set_PWM_frequency(19, 50.0),
+            call.set_PWM_dutycycle(19, 19),
+            call.set_PWM_dutycycle(19, 20),
+        ])
+        self.assert_(self.subject.get_stats() == {'writes': 2, 'suppressed_writes': 1})
+
+    def test_set_many_channels(self):
+        for gpio in range(4, 10):
+            self.subject.set(gpio, 50.0, 10.0)
+
+        self.assert_(len(self.pi.set_PWM_dutycycle.mock_calls) == 6)
+
+    def test_set_pwm_range(self):
+        self.subject = SoftwarePWMOutput(self.pi, pwm_range=2000)
+
+        self.subject.set(19, 50.0, 7.6)
+
+        self.assert_(self.pi.mock_calls == [
+            call.set_PWM_frequency(19, 50.0),
+            call.set_PWM_range(19, 2000),
+            call.set_PWM_dutycycle(19, 152),
+        ])
+
+    def test_invalidate(self):
+        self.subject.set(19, 50.0, 7.5)
+        self.subject.invalidate(19)
+        self.subject.set(19, 50.0, 7.5)
+
+        self.assert_(len(self.pi.set_PWM_dutycycle.mock_calls) == 2)
+
+
+class HardwarePWMOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.pi = Mock()
+
+        self.subject = HardwarePWMOutput(self.pi)
+
+    def test_set(self):
+        self.subject.set(19, 50.0, 7.5)
+        self.subject.set(19, 50.0, 7.5000001)
+        self.subject.set(19, 50.0, 7.6)
+
+        self.assert_(self.pi.mock_calls == [
+            call.hardware_PWM(19, 50, 75000),
+            call.hardware_PWM(19, 50, 76000),
+        ])
+
+    def test_set_software_fallback(self):
+        self.subject.set(4, 50.0, 7.5)
+
+        self.assert_(self.pi.mock_calls == [
+            call.set_PWM_frequency(4, 50.0),
+            call.set_PWM_dutycycle(4, 19),
+        ])
+
+    def test_set_shared_channel(self):
+        self.subject.set(12, 50.0, 7.5)
+
+        self.assertRaises(ValueError, self.subject.set, 18, 50.0, 7.5)
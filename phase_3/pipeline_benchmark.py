@@ -0,0 +1,220 @@
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from threading import Thread
+
+from pygame import JOYAXISMOTION, JOYBUTTONDOWN, JOYBUTTONUP
+
+import fake_pigpio
+import vehicle
+from clock import monotonic, thread_time
+from controller import Controller, DEBOUNCE_PERIOD
+from publisher import Publisher
+from scheduler import MonotonicScheduler
+from subscriber import Subscriber
+from trace_report import load_traces, get_latencies, summarise
+from tracing import TRACER, STAGE_NAMES, EVENT_RECEIVED, PWM_WRITTEN
+
+PORT = 13339
+
+DURATION = 5.0
+EVENT_RATE = 500.0
+
+# out of the working tree unless --output says otherwise
+OUTPUT_PATH = os.path.join(tempfile.gettempdir(), 'pipeline_benchmark.json')
+
+
+class SyntheticEvent(object):
+    def __init__(self, type, axis=None, value=None, button=None):
+        self.type = type
+        self.axis = axis
+        self.value = value
+        self.button = button
+
+
+def generate_events(duration, event_rate):
+    # both triggers released, then the steering sweeps back and forth with the odd accelerator blip
+    yield SyntheticEvent(JOYAXISMOTION, axis=4, value=-1.0)
+    yield SyntheticEvent(JOYAXISMOTION, axis=5, value=-1.0)
+
+    for i in range(int(duration * event_rate)):
+        t = i / event_rate
+
+        yield SyntheticEvent(JOYAXISMOTION, axis=0, value=math.sin(t * 2 * math.pi))
+
+        if i % 50 == 0:
+            yield SyntheticEvent(JOYAXISMOTION, axis=5, value=math.cos(t * math.pi))
+
+        if i % 250 == 0:
+            yield SyntheticEvent(JOYBUTTONDOWN if i % 500 == 0 else JOYBUTTONUP, button=1)
+
+
+class StageTimer(object):
+    def __init__(self):
+        self.cpu_time_by_stage = {}
+
+    def wrap(self, stage, func):
+        def wrapped(*args, **kwargs):
+            started = thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.cpu_time_by_stage[stage] = self.cpu_time_by_stage.get(stage, 0.0) + (thread_time() - started)
+
+        return wrapped
+
+
+def feed_events(events, event_rate, state_change_callback):
+    axis_data, button_data, hat_data = {}, {0: False, 1: False, 2: False, 3: False}, {}
+    last_state = None
+
+    started = monotonic()
+    for i, event in enumerate(events):
+        delay = started + (i / event_rate) - monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        received_at = TRACER.clock()
+
+        axis_data, button_data, hat_data = Controller.handle_event(event, axis_data, button_data, hat_data)
+        state = Controller.build_state(axis_data, button_data, hat_data)
+        if state == last_state:
+            continue
+
+        last_state = state
+
+        trace_id = TRACER.new_trace_id()
+        TRACER.mark(trace_id, EVENT_RECEIVED, received_at)
+        state_change_callback(state.with_trace_id(trace_id))
+
+
+def run(duration, event_rate, period):
+    directory = tempfile.mkdtemp()
+    trace_path = os.path.join(directory, 'trace')
+
+    timer = StageTimer()
+
+    vehicle.pigpio = fake_pigpio
+
+    v = vehicle.Vehicle(
+        vehicle.STEERING_GPIO,
+        vehicle.THROTTLE_GPIO,
+        vehicle.FREQUENCY,
+        vehicle.MIN_DUTY,
+        vehicle.IDLE_DUTY,
+        vehicle.MAX_DUTY,
+        vehicle.TIMEOUT,
+    )
+    v.run = timer.wrap('vehicle', v.run)
+
+    subscriber = Subscriber(port=PORT, timeout=vehicle.TIMEOUT * 2)
+    subscriber.set_receive_callback(v.add_state_event)
+    subscriber.run = timer.wrap('subscriber', subscriber.run)
+
+    publisher = Publisher(host='127.0.0.1', port=PORT)
+
+    scheduler = MonotonicScheduler(period=period)
+    scheduler.set_iteration_callback(publisher.send)
+    scheduler.run = timer.wrap('scheduler_and_publisher', scheduler.run)
+
+    events = list(generate_events(duration, event_rate))
+
+    feeder = Thread(target=timer.wrap('controller', feed_events), args=(events, event_rate, scheduler.set_state))
+
+    TRACER.enable(trace_path)
+
+    try:
+        v.start()
+        subscriber.start()
+        scheduler.start()
+
+        started = monotonic()
+        feeder.start()
+        feeder.join()
+
+        # let the last state make it through
+        time.sleep(period * 5)
+        elapsed = monotonic() - started
+
+        scheduler.stop()
+        scheduler.join()
+
+        subscriber.stop()
+        subscriber.join()
+
+        v.stop()
+        v.join()
+    finally:
+        TRACER.disable()
+
+    try:
+        timestamp_by_stage_by_trace_id = load_traces([trace_path])
+    finally:
+        shutil.rmtree(directory)
+
+    latencies_by_span = get_latencies(timestamp_by_stage_by_trace_id)
+
+    end_to_end = '{} -> {}'.format(STAGE_NAMES[EVENT_RECEIVED], STAGE_NAMES[PWM_WRITTEN])
+    latency_summary = summarise(latencies_by_span)
+
+    pwm_writes = len([x for x in v.pi.writes if x[1] == vehicle.STEERING_GPIO])
+
+    return {
+        'timestamp': time.time(),
+        'duration': elapsed,
+        'event_rate': event_rate,
+        'period': period,
+        'events': len(events),
+        'states_built': len(timestamp_by_stage_by_trace_id),
+        'states_applied': len([x for x in timestamp_by_stage_by_trace_id.values() if PWM_WRITTEN in x]),
+        'packets': subscriber.get_stats(),
+        'mailbox': v.state_queue.get_stats(),
+        'output': v.output.get_stats(),
+        'pwm_writes_per_second': pwm_writes / elapsed,
+        'states_per_second': v.state_queue.get_count / elapsed,
+        'event_to_pwm_latency': latency_summary.get(end_to_end),
+        'latency_by_span': latency_summary,
+        'cpu_by_stage': dict(
+            (stage, {'seconds': cpu_time, 'percent': (cpu_time / elapsed) * 100})
+            for stage, cpu_time in timer.cpu_time_by_stage.items()
+        ),
+        'scheduler': scheduler.get_stats(),
+    }
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    output_path = OUTPUT_PATH
+    if '--output' in args:
+        output_path = args[args.index('--output') + 1]
+
+    duration = float(args[args.index('--duration') + 1]) if '--duration' in args else DURATION
+    event_rate = float(args[args.index('--event-rate') + 1]) if '--event-rate' in args else EVENT_RATE
+    period = float(args[args.index('--period') + 1]) if '--period' in args else DEBOUNCE_PERIOD
+
+    vehicle.silence_output()
+
+    results = run(duration, event_rate, period)
+
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=4, sort_keys=True)
+
+    latency = results['event_to_pwm_latency'] or {}
+
+    sys.__stdout__.write(
+        'states/s {:.1f}    event to PWM p50 {:.3f} ms    p99 {:.3f} ms    cpu {}    (written to {})\n'.format(
+            results['states_per_second'],
+            (latency.get('p50') or 0) * 1000,
+            (latency.get('p99') or 0) * 1000,
+            ', '.join(
+                '{} {:.1f}%'.format(stage, cpu['percent'])
+                for stage, cpu in sorted(results['cpu_by_stage'].items())
+            ),
+            output_path,
+        )
+    )
@@ -0,0 +1,99 @@
+from state import State, STEERING, BRAKE, ACCELERATOR, to_state
+
+INTERPOLATED_INDICES = (STEERING, BRAKE, ACCELERATOR)
+
+
+def interpolate_states(state, next_state, fraction):
+    interpolated = list(state)
+
+    for index in INTERPOLATED_INDICES:
+        value = state[index]
+        next_value = next_state[index]
+        if value is None or next_value is None:
+            continue
+
+        interpolated[index] = value + ((next_value - value) * fraction)
+
+    return State(interpolated)
+
+
+class Playback(object):
+    # samples are read as they're played rather than up front, so a recording that's spilled to disk (see RingBuffer)
+    # stays there; they're iterated again from the start on a seek backwards, so they need to be re-iterable
+    def __init__(self, samples, speed=1.0, offset=0.0, interpolate=True):
+        if speed <= 0:
+            raise ValueError('expected speed to be positive but it was {}'.format(repr(speed)))
+
+        self.samples = samples
+
+        self.started_at = None
+        self.iterator = None
+        self.current = None
+        self.following = None
+
+        self.rewind()
+
+        self.speed = speed
+        self.interpolate = interpolate
+
+        self.offset = 0.0
+        self.seek(offset)
+
+    def read_next(self):
+        sample = next(self.iterator, None)
+        if sample is None:
+            return None
+
+        recorded_at, state = sample
+
+        # times are relative to the start of the recording, and recordings from before State are dicts
+        return recorded_at - self.started_at, to_state(state)
+
+    def rewind(self):
+        self.iterator = iter(self.samples)
+
+        first = next(self.iterator, None)
+        if first is None:
+            raise ValueError('expected at least one sample to play back')
+
+        self.started_at = first[0]
+
+        self.current = (0.0, to_state(first[1]))
+        self.following = self.read_next()
+
+    def advance(self, position):
+        # to the last sample at or before position; False if position is beyond the end of the recording
+        if position < self.current[0]:
+            self.rewind()
+
+        while self.following is not None and self.following[0] <= position:
+            self.current, self.following = self.following, self.read_next()
+
+        return self.following is not None or position <= self.current[0]
+
+    def seek(self, offset):
+        if offset < 0 or not self.advance(offset):
+            raise ValueError('expected offset to be between 0 and the end of the recording but it was {}'.format(
+                repr(offset)
+            ))
+
+        self.offset = offset
+
+    def position_at(self, elapsed):
+        return self.offset + (elapsed * self.speed)
+
+    def state_at(self, elapsed):
+        position = self.position_at(elapsed)
+        if not self.advance(position):
+            return None
+
+        time, state = self.current
+
+        if not self.interpolate or self.following is None:
+            return state
+
+        next_time, next_state = self.following
+        if next_time == time:
+            return state
+
+        return interpolate_states(state, next_state, (position - time) / (next_time - time))
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from playback import Playback, interpolate_states
+from ring_buffer import RingBuffer
+from state import State
+
+
+def _state(steering, accelerator=-1.0):
+    return State((steering, -1.0, accelerator, False, False, False, 0))
+
+
+_TEST_SAMPLES = [
+    (100.0, _state(0.0)),
+    (100.125, _state(0.5, accelerator=0.0)),
+    (100.375, _state(-0.5)),
+]
+
+
+class HelperFunctionTest(unittest.TestCase):
+    def test_interpolate_states(self):
+        state = interpolate_states(_state(0.0), _state(1.0, accelerator=None), 0.25)
+
+        self.assert_(state == _state(0.25))
+
+
+class PlaybackTest(unittest.TestCase):
+    def setUp(self):
+        self.subject = Playback(_TEST_SAMPLES)
+
+    def test_init_bad_args(self):
+        self.assertRaises(ValueError, Playback, [])
+        self.assertRaises(ValueError, Playback, _TEST_SAMPLES, speed=0)
+        self.assertRaises(ValueError, Playback, _TEST_SAMPLES, offset=1.0)
+
+    def test_state_at(self):
+        self.assert_(self.subject.state_at(0.0) == _state(0.0))
+        self.assertAlmostEqual(self.subject.state_at(0.0625).steering, 0.25)
+        self.assertAlmostEqual(self.subject.state_at(0.0625).accelerator, -0.5)
+        self.assertAlmostEqual(self.subject.state_at(0.375).steering, -0.5)
+        self.assert_(self.subject.state_at(0.38) is None)
+
+    def test_state_at_without_interpolation(self):
+        self.subject.interpolate = False
+
+        self.assert_(self.subject.state_at(0.0625) == _state(0.0))
+
+    def test_state_at_speed(self):
+        self.subject.speed = 2.0
+
+        self.assertAlmostEqual(self.subject.state_at(0.0625).steering, 0.5)
+        self.assert_(self.subject.state_at(0.19) is None)
+
+    def test_state_at_backwards(self):
+        self.assertAlmostEqual(self.subject.state_at(0.375).steering, -0.5)
+        self.assertAlmostEqual(self.subject.state_at(0.0625).steering, 0.25)
+
+    def test_reads_samples_as_it_plays(self):
+        read = []
+
+        def samples():
+            for sample in _TEST_SAMPLES:
+                read.append(sample)
+                yield sample
+
+        class Samples(object):
+            def __iter__(self):
+                return samples()
+
+        subject = Playback(Samples())
+        self.assert_(len(read) == 2)
+
+        subject.state_at(0.2)
+        self.assert_(len(read) == 3)
+
+    def test_ring_buffer_with_spill(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        ring_buffer = RingBuffer(1, spill_path=os.path.join(directory, 'spill'))
+        self.addCleanup(ring_buffer.close)
+
+        for sample in _TEST_SAMPLES:
+            ring_buffer.append(sample)
+
+        subject = Playback(ring_buffer)
+
+        self.assertAlmostEqual(subject.state_at(0.0625).steering, 0.25)
+        self.assertAlmostEqual(subject.state_at(0.375).steering, -0.5)
+        self.assert_(subject.state_at(0.38) is None)
+
+    def test_seek(self):
+        self.subject.seek(0.25)
+
+        self.assertAlmostEqual(self.subject.state_at(0.0).steering, 0.0)
+        self.assertAlmostEqual(self.subject.state_at(0.125).steering, -0.5)
@@ -0,0 +1,300 @@
+import struct
+
+from state import State, to_state
+
+VERSION = 3
+
+# only the fields that changed since the last keyframe (a full version 3 packet)
+DELTA_VERSION = 4
+
+# sent back to a publisher by a subscriber that's missing the keyframe a delta refers to
+KEYFRAME_REQUEST_VERSION = 5
+
+# a full packet every this many packets, so a lost keyframe can't stall the stream for long
+KEYFRAME_INTERVAL = 25
+
+SEQUENCE_MODULUS = 2 ** 32
+
+# version, steering, brake, accelerator, flags
+STATE_FORMAT_V1 = struct.Struct('!BfffB')
+
+# version, sequence, timestamp, steering, brake, accelerator, flags
+STATE_FORMAT_V2 = struct.Struct('!BIdfffB')
+
+# version, sequence, trace id (0 if untraced), timestamp, steering, brake, accelerator, flags
+STATE_FORMAT = struct.Struct('!BIIdfffB')
+
+# where the axes sit in an encoded packet, so they can be patched without re-encoding
+STEERING_OFFSET = struct.calcsize('!BIId')
+BRAKE_OFFSET = STEERING_OFFSET + 4
+ACCELERATOR_OFFSET = BRAKE_OFFSET + 4
+
+VALUE_FORMAT = struct.Struct('!f')
+
+# version, sequence, keyframe id (its sequence modulo 256), field mask, flags; followed by whatever the mask says
+DELTA_HEADER_FORMAT = struct.Struct('!BIBBB')
+
+FIELD_STEERING = 1 << 0
+FIELD_BRAKE = 1 << 1
+FIELD_ACCELERATOR = 1 << 2
+FIELD_TRACE_ID = 1 << 3
+
+DELTA_FIELDS = (
+    (FIELD_STEERING, 'steering', 'f'),
+    (FIELD_BRAKE, 'brake', 'f'),
+    (FIELD_ACCELERATOR, 'accelerator', 'f'),
+)
+
+KEYFRAME_ID_MODULUS = 256
+
+KEYFRAME_REQUEST = struct.pack('!B', KEYFRAME_REQUEST_VERSION)
+
+FLAG_STOP = 1 << 0
+FLAG_RECORD = 1 << 1
+FLAG_PLAY = 1 << 2
+
+_NAN = float('nan')
+
+
+def _encode_value(value):
+    # None (axis not yet seen) travels as NaN
+    return _NAN if value is None else value
+
+
+def _decode_value(value):
+    return None if value != value else value
+
+
+def _encode_flags(state):
+    flags = 0
+    if state.stop:
+        flags |= FLAG_STOP
+    if state.record:
+        flags |= FLAG_RECORD
+    if state.play:
+        flags |= FLAG_PLAY
+
+    return flags
+
+
+def _decode_fields(steering, brake, accelerator, flags, trace_id=0):
+    # _decode_value inlined; this runs for every packet
+    return State((
+        steering if steering == steering else None,
+        brake if brake == brake else None,
+        accelerator if accelerator == accelerator else None,
+        bool(flags & FLAG_STOP),
+        bool(flags & FLAG_RECORD),
+        bool(flags & FLAG_PLAY),
+        trace_id,
+    ))
+
+
+def encode_state(state, sequence=0, timestamp=0.0):
+    state = to_state(state)
+
+    return STATE_FORMAT.pack(
+        VERSION,
+        sequence % SEQUENCE_MODULUS,
+        state.trace_id,
+        timestamp,
+        _encode_value(state.steering),
+        _encode_value(state.brake),
+        _encode_value(state.accelerator),
+        _encode_flags(state),
+    )
+
+
+def encode_state_into(buffer, offset, state, sequence=0, timestamp=0.0):
+    # straight into a writable buffer (e.g. a shared memory slot) rather than a new string
+    state = to_state(state)
+
+    STATE_FORMAT.pack_into(
+        buffer,
+        offset,
+        VERSION,
+        sequence % SEQUENCE_MODULUS,
+        state.trace_id,
+        timestamp,
+        _encode_value(state.steering),
+        _encode_value(state.brake),
+        _encode_value(state.accelerator),
+        _encode_flags(state),
+    )
+
+
+def decode_fields(fields):
+    # what STATE_FORMAT.unpack_from gave for a full packet, e.g. read in place from a shared memory slot
+    version, sequence, trace_id, timestamp, steering, brake, accelerator, flags = fields
+    if version != VERSION:
+        raise ValueError('expected protocol version {} but got {}'.format(VERSION, version))
+
+    return sequence, timestamp, _decode_fields(steering, brake, accelerator, flags, trace_id)
+
+
+def decode_packet(data):
+    if not data:
+        raise ValueError('expected a packet but got nothing')
+
+    version = ord(data[0:1])
+
+    if version == VERSION:
+        packet_format = STATE_FORMAT
+    elif version == 2:
+        packet_format = STATE_FORMAT_V2
+    elif version == 1:
+        packet_format = STATE_FORMAT_V1
+    elif version == DELTA_VERSION:
+        raise ValueError('expected a full packet but got a delta (use a DeltaDecoder)')
+    else:
+        raise ValueError('expected protocol version {} but got {}'.format(VERSION, version))
+
+    if len(data) != packet_format.size:
+        raise ValueError('expected {} bytes but got {}'.format(packet_format.size, len(data)))
+
+    trace_id = 0
+
+    if version == 1:
+        _, steering, brake, accelerator, flags = packet_format.unpack(data)
+        sequence, timestamp = None, None
+    elif version == 2:
+        _, sequence, timestamp, steering, brake, accelerator, flags = packet_format.unpack(data)
+    else:
+        _, sequence, trace_id, timestamp, steering, brake, accelerator, flags = packet_format.unpack(data)
+
+    return sequence, timestamp, _decode_fields(steering, brake, accelerator, flags, trace_id)
+
+
+def decode_state(data):
+    return decode_packet(data)[2]
+
+
+def _build_delta_formats():
+    formats = {}
+    for mask in range(FIELD_TRACE_ID << 1):
+        fields = ''.join(field_format for bit, _, field_format in DELTA_FIELDS if mask & bit)
+        if mask & FIELD_TRACE_ID:
+            fields += 'I'
+
+        formats[mask] = struct.Struct('!' + fields)
+
+    return formats
+
+
+# one precompiled body format per field mask
+_DELTA_FORMATS = _build_delta_formats()
+
+
+class DeltaEncoder(object):
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        if keyframe_interval < 1:
+            raise ValueError('expected keyframe_interval to be at least 1 but it was {}'.format(repr(keyframe_interval)))
+
+        # a delta names its keyframe by the low 8 bits of its sequence, so it can't be further away than that
+        if keyframe_interval >= KEYFRAME_ID_MODULUS:
+            raise ValueError('expected keyframe_interval to be less than {} but it was {}'.format(
+                KEYFRAME_ID_MODULUS, repr(keyframe_interval)
+            ))
+
+        self.keyframe_interval = keyframe_interval
+
+        self.keyframe_values = None
+        self.keyframe_id = None
+        self.since_keyframe = 0
+        self.keyframe_requested = False
+
+        self.keyframes = 0
+        self.deltas = 0
+
+    def request_keyframe(self):
+        self.keyframe_requested = True
+
+    def encode(self, state, sequence=0, timestamp=0.0):
+        sequence %= SEQUENCE_MODULUS
+
+        state = to_state(state)
+
+        values = [_encode_value(state.steering), _encode_value(state.brake), _encode_value(state.accelerator)]
+
+        if self.keyframe_values is None or self.keyframe_requested or self.since_keyframe >= self.keyframe_interval:
+            self.keyframe_values = values
+            self.keyframe_id = sequence % KEYFRAME_ID_MODULUS
+            self.since_keyframe = 0
+            self.keyframe_requested = False
+            self.keyframes += 1
+
+            return encode_state(state, sequence, timestamp)
+
+        self.since_keyframe += 1
+        self.deltas += 1
+
+        mask = 0
+        changed = []
+        for (bit, _, _), value, keyframe_value in zip(DELTA_FIELDS, values, self.keyframe_values):
+            # NaN never equals itself, so an axis that's still unset isn't resent every packet
+            if value != keyframe_value and not (value != value and keyframe_value != keyframe_value):
+                mask |= bit
+                changed.append(value)
+
+        trace_id = state.trace_id
+        if trace_id:
+            mask |= FIELD_TRACE_ID
+            changed.append(trace_id)
+
+        return DELTA_HEADER_FORMAT.pack(
+            DELTA_VERSION, sequence, self.keyframe_id, mask, _encode_flags(state)
+        ) + _DELTA_FORMATS[mask].pack(*changed)
+
+
+class DeltaDecoder(object):
+    def __init__(self):
+        self.keyframe_by_id = {}
+
+        self.missing_keyframes = 0
+
+    def decode(self, data):
+        if not data:
+            raise ValueError('expected a packet but got nothing')
+
+        if ord(data[0:1]) != DELTA_VERSION:
+            sequence, timestamp, state = decode_packet(data)
+
+            if sequence is not None:
+                # keyed by id rather than "the latest" so a late keyframe can't clobber a newer one
+                keyframe_id = sequence % KEYFRAME_ID_MODULUS
+
+                last = self.keyframe_by_id.get(keyframe_id)
+                if last is None or (sequence - last[0]) % SEQUENCE_MODULUS < SEQUENCE_MODULUS // 2:
+                    self.keyframe_by_id[keyframe_id] = (sequence, state)
+
+            return sequence, timestamp, state
+
+        if len(data) < DELTA_HEADER_FORMAT.size:
+            raise ValueError('expected at least {} bytes but got {}'.format(DELTA_HEADER_FORMAT.size, len(data)))
+
+        _, sequence, keyframe_id, mask, flags = DELTA_HEADER_FORMAT.unpack_from(data)
+
+        body_format = _DELTA_FORMATS.get(mask)
+        if body_format is None or len(data) != DELTA_HEADER_FORMAT.size + body_format.size:
+            raise ValueError('expected a delta body for mask {} but got {} bytes'.format(mask, len(data)))
+
+        keyframe_sequence, keyframe = self.keyframe_by_id.get(keyframe_id, (None, None))
+
+        # the id wraps every KEYFRAME_ID_MODULUS packets, so the one we have may be an older keyframe with the same id
+        # (the one the delta was against was lost); that's as good as not having it
+        if keyframe is None or (sequence - keyframe_sequence) % SEQUENCE_MODULUS >= KEYFRAME_ID_MODULUS:
+            self.missing_keyframes += 1
+            return sequence, None, None
+
+        values = iter(body_format.unpack_from(data, DELTA_HEADER_FORMAT.size))
+
+        state = _decode_fields(
+            next(values) if mask & FIELD_STEERING else _encode_value(keyframe.steering),
+            next(values) if mask & FIELD_BRAKE else _encode_value(keyframe.brake),
+            next(values) if mask & FIELD_ACCELERATOR else _encode_value(keyframe.accelerator),
+            flags,
+            next(values) if mask & FIELD_TRACE_ID else 0,
+        )
+
+        # deltas don't carry a timestamp; restarts are picked up from the next keyframe
+        return sequence, None, state
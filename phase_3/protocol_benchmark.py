@@ -0,0 +1,42 @@
+import timeit
+
+from protocol import encode_state, decode_state
+
+_STATE = {
+    'steering': -0.37,
+    'brake': -0.7058500000000001,
+    'accelerator': -0.98035,
+    'stop': False,
+    'record': False,
+    'play': False,
+}
+
+ITERATIONS = 100000
+
+
+def repr_eval_round_trip():
+    return eval(repr(_STATE))
+
+
+def binary_round_trip():
+    return decode_state(encode_state(_STATE))
+
+
+def benchmark(name, func, size, iterations=ITERATIONS):
+    duration = min(timeit.repeat(func, number=iterations, repeat=3))
+
+    print('{:<12}{:>8} bytes{:>10.2f} us/packet{:>12.0f} packets/s'.format(
+        name,
+        size,
+        (duration / iterations) * 1000000,
+        iterations / duration,
+    ))
+
+    return duration
+
+
+if __name__ == '__main__':
+    repr_eval_duration = benchmark('repr/eval', repr_eval_round_trip, len(repr(_STATE)))
+    binary_duration = benchmark('binary', binary_round_trip, len(encode_state(_STATE)))
+
+    print('speedup: {:.1f}x'.format(repr_eval_duration / binary_duration))
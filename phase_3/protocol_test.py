@@ -0,0 +1,197 @@
+import unittest
+
+from protocol import encode_state, decode_state, decode_packet, STATE_FORMAT, STATE_FORMAT_V1, STATE_FORMAT_V2, \
+    DeltaEncoder, DeltaDecoder, DELTA_HEADER_FORMAT, KEYFRAME_ID_MODULUS
+from state import State
+
+_TEST_STATE = State.from_dict({
+    'steering': 0.25,
+    'brake': -1.0,
+    'accelerator': 0.5,
+    'stop': False,
+    'record': True,
+    'play': False,
+})
+
+_TEST_PARTIAL_STATE = State.from_dict({
+    'steering': 0.0,
+    'brake': None,
+    'accelerator': None,
+    'stop': True,
+    'record': False,
+    'play': True,
+})
+
+
+class ProtocolTest(unittest.TestCase):
+    def test_encode_state(self):
+        data = encode_state(_TEST_STATE)
+
+        self.assert_(len(data) == STATE_FORMAT.size)
+
+    def test_round_trip(self):
+        self.assert_(decode_state(encode_state(_TEST_STATE)) == _TEST_STATE)
+
+    def test_round_trip_with_none(self):
+        self.assert_(decode_state(encode_state(_TEST_PARTIAL_STATE)) == _TEST_PARTIAL_STATE)
+
+    def test_decode_packet(self):
+        sequence, timestamp, state = decode_packet(encode_state(_TEST_STATE, 1337, 1234.5))
+
+        self.assert_(sequence == 1337)
+        self.assert_(timestamp == 1234.5)
+        self.assert_(state == _TEST_STATE)
+
+    def test_round_trip_with_trace_id(self):
+        state = _TEST_STATE.replace(trace_id=31337)
+
+        self.assert_(decode_state(encode_state(state)) == state)
+
+    def test_decode_packet_version_2(self):
+        sequence, timestamp, state = decode_packet(STATE_FORMAT_V2.pack(2, 1337, 1234.5, 0.25, -1.0, 0.5, 2))
+
+        self.assert_(sequence == 1337)
+        self.assert_(timestamp == 1234.5)
+        self.assert_(state == _TEST_STATE)
+
+    def test_decode_packet_version_1(self):
+        sequence, timestamp, state = decode_packet(STATE_FORMAT_V1.pack(1, 0.25, -1.0, 0.5, 2))
+
+        self.assert_(sequence is None)
+        self.assert_(timestamp is None)
+        self.assert_(state == _TEST_STATE)
+
+    def test_decode_state_bad_length(self):
+        self.assertRaises(ValueError, decode_state, encode_state(_TEST_STATE)[:-1])
+
+    def test_decode_state_bad_version(self):
+        data = encode_state(_TEST_STATE)
+
+        self.assertRaises(ValueError, decode_state, b'\xff' + data[1:])
+
+
+class DeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.encoder = DeltaEncoder(keyframe_interval=3)
+        self.decoder = DeltaDecoder()
+
+    def round_trip(self, state, sequence):
+        data = self.encoder.encode(state, sequence, float(sequence))
+
+        return data, self.decoder.decode(data)
+
+    def test_first_packet_is_a_keyframe(self):
+        data, (sequence, timestamp, state) = self.round_trip(_TEST_STATE, 1)
+
+        self.assert_(len(data) == STATE_FORMAT.size)
+        self.assert_(sequence == 1)
+        self.assert_(timestamp == 1.0)
+        self.assert_(state == _TEST_STATE)
+
+    def test_unchanged_delta_is_just_a_header(self):
+        self.round_trip(_TEST_STATE, 1)
+        data, (sequence, timestamp, state) = self.round_trip(_TEST_STATE, 2)
+
+        self.assert_(len(data) == DELTA_HEADER_FORMAT.size)
+        self.assert_(sequence == 2)
+        self.assert_(timestamp is None)
+        self.assert_(state == _TEST_STATE)
+
+    def test_delta_carries_changed_fields_and_flags(self):
+        self.round_trip(_TEST_STATE, 1)
+
+        changed = _TEST_STATE.replace(steering=-0.75, stop=True)
+        data, (_, _, state) = self.round_trip(changed, 2)
+
+        self.assert_(len(data) == DELTA_HEADER_FORMAT.size + 4)
+        self.assert_(state == changed)
+
+    def test_deltas_are_against_the_keyframe(self):
+        self.round_trip(_TEST_STATE, 1)
+        self.encoder.encode(_TEST_STATE.replace(steering=-0.75), 2)
+
+        # the delta for 2 was lost, but 3 still decodes on its own
+        changed = _TEST_STATE.replace(accelerator=-0.5)
+        _, (_, _, state) = self.round_trip(changed, 3)
+
+        self.assert_(state == changed)
+
+    def test_unset_axes_are_not_resent(self):
+        self.round_trip(_TEST_PARTIAL_STATE, 1)
+        data, (_, _, state) = self.round_trip(_TEST_PARTIAL_STATE, 2)
+
+        self.assert_(len(data) == DELTA_HEADER_FORMAT.size)
+        self.assert_(state == _TEST_PARTIAL_STATE)
+
+    def test_trace_id(self):
+        self.round_trip(_TEST_STATE, 1)
+
+        traced = _TEST_STATE.replace(trace_id=1234)
+        _, (_, _, state) = self.round_trip(traced, 2)
+
+        self.assert_(state == traced)
+
+    def test_keyframe_interval(self):
+        sizes = [len(self.round_trip(_TEST_STATE, sequence)[0]) for sequence in range(1, 9)]
+
+        self.assert_([size == STATE_FORMAT.size for size in sizes] == [
+            True, False, False, False, True, False, False, False
+        ])
+
+    def test_request_keyframe(self):
+        self.round_trip(_TEST_STATE, 1)
+        self.encoder.request_keyframe()
+
+        self.assert_(len(self.round_trip(_TEST_STATE, 2)[0]) == STATE_FORMAT.size)
+        self.assert_(len(self.round_trip(_TEST_STATE, 3)[0]) == DELTA_HEADER_FORMAT.size)
+
+    def test_missing_keyframe(self):
+        self.encoder.encode(_TEST_STATE, 1)
+
+        sequence, timestamp, state = self.decoder.decode(self.encoder.encode(_TEST_STATE, 2))
+
+        self.assert_(sequence == 2)
+        self.assert_(state is None)
+        self.assert_(self.decoder.missing_keyframes == 1)
+
+    def test_late_keyframe_does_not_replace_a_newer_one(self):
+        old_keyframe = self.encoder.encode(_TEST_STATE, 1)
+        self.encoder.request_keyframe()
+
+        changed = _TEST_STATE.replace(steering=-0.75)
+        self.decoder.decode(self.encoder.encode(changed, 2))
+        self.decoder.decode(old_keyframe)
+
+        self.assert_(self.decoder.decode(self.encoder.encode(changed, 3))[2] == changed)
+
+    def test_stale_keyframe_after_the_id_wraps(self):
+        encoder = DeltaEncoder(keyframe_interval=KEYFRAME_ID_MODULUS - 1)
+
+        self.decoder.decode(encoder.encode(_TEST_STATE.replace(accelerator=1.0), 1))
+
+        idle = _TEST_STATE.replace(accelerator=-1.0)
+        for sequence in range(2, KEYFRAME_ID_MODULUS + 1):
+            self.decoder.decode(encoder.encode(idle, sequence))
+
+        # the keyframe for 257 (the same id as 1) is lost, so its deltas mustn't be read against 1
+        encoder.encode(idle, KEYFRAME_ID_MODULUS + 1)
+
+        sequence, _, state = self.decoder.decode(encoder.encode(idle, KEYFRAME_ID_MODULUS + 2))
+
+        self.assert_(sequence == KEYFRAME_ID_MODULUS + 2)
+        self.assert_(state is None)
+        self.assert_(self.decoder.missing_keyframes == 1)
+
+    def test_keyframe_interval_must_fit_the_id(self):
+        self.assertRaises(ValueError, DeltaEncoder, keyframe_interval=0)
+        self.assertRaises(ValueError, DeltaEncoder, keyframe_interval=KEYFRAME_ID_MODULUS)
+
+    def test_decode_packet_rejects_delta(self):
+        self.encoder.encode(_TEST_STATE, 1)
+
+        self.assertRaises(ValueError, decode_packet, self.encoder.encode(_TEST_STATE, 2))
+
+    def test_decode_bad_delta(self):
+        self.encoder.encode(_TEST_STATE, 1)
+
+        self.assertRaises(ValueError, self.decoder.decode, self.encoder.encode(_TEST_STATE, 2) + b'\x00')
@@ -1,15 +1,211 @@
+import select
 import socket
+import time
+
+from protocol import encode_state, DeltaEncoder, KEYFRAME_REQUEST, SEQUENCE_MODULUS, STEERING_OFFSET, \
+    ACCELERATOR_OFFSET, VALUE_FORMAT, STATE_FORMAT
+from shared_memory import SharedStateSlot, SHARED_MEMORY_PATH
+from tracing import TRACER, SENT, get_trace_id
 
 
 class Publisher(object):
-    def __init__(self, host, port):
+    def __init__(self, host, port, keyframe_interval=None):
         self.host = host
         self.port = port
 
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
+        self.sequence = 0
+
+        # None sends every state in full; otherwise only changes, with a full keyframe every keyframe_interval
+        self.encoder = DeltaEncoder(keyframe_interval) if keyframe_interval is not None else None
+
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.keyframe_requests = 0
+
+    def handle_keyframe_requests(self):
+        while select.select([self.socket], [], [], 0)[0]:
+            try:
+                data, _ = self.socket.recvfrom(65536)
+            except socket.error:
+                return
+
+            if data == KEYFRAME_REQUEST:
+                self.keyframe_requests += 1
+                self.encoder.request_keyframe()
+
+    def encode(self, state):
+        if self.encoder is None:
+            return encode_state(state, self.sequence, time.time())
+
+        self.handle_keyframe_requests()
+
+        return self.encoder.encode(state, self.sequence, time.time())
+
     def send(self, state):
+        if state is None:
+            return
+
+        self.sequence = (self.sequence + 1) % SEQUENCE_MODULUS
+
+        data = self.encode(state)
+
         try:
-            self.socket.sendto(repr(state), (self.host, self.port))
+            self.socket.sendto(data, (self.host, self.port))
         except socket.error:
-            pass
+            return
+
+        self.packets_sent += 1
+        self.bytes_sent += len(data)
+
+        if TRACER.enabled:
+            TRACER.mark(get_trace_id(state), SENT)
+
+    def get_stats(self):
+        stats = {
+            'sent': self.packets_sent,
+            'bytes_sent': self.bytes_sent,
+        }
+
+        if self.encoder is not None:
+            stats.update({
+                'keyframes': self.encoder.keyframes,
+                'deltas': self.encoder.deltas,
+                'keyframe_requests': self.keyframe_requests,
+            })
+
+        return stats
+
+
+class SharedMemoryPublisher(object):
+    # for a controller on the same host as the vehicle; each state overwrites the last in a shared slot, so a
+    # reader only ever sees the newest
+    def __init__(self, path=SHARED_MEMORY_PATH):
+        self.path = path
+
+        self.slot = SharedStateSlot(path, create=True)
+
+        self.sequence = 0
+
+        self.states_sent = 0
+
+    def send(self, state):
+        if state is None:
+            return
+
+        self.sequence = (self.sequence + 1) % SEQUENCE_MODULUS
+
+        self.slot.write(state, self.sequence, time.time())
+
+        self.states_sent += 1
+
+        if TRACER.enabled:
+            TRACER.mark(get_trace_id(state), SENT)
+
+    def get_stats(self):
+        return {
+            'sent': self.states_sent,
+            'bytes_sent': self.states_sent * STATE_FORMAT.size,
+        }
+
+    def close(self):
+        self.slot.close()
+
+
+class TargetOverride(object):
+    # both in the units the packet carries, i.e. after the controller profile's scaling: trim is added to steering
+    # (-1.0 left to 1.0 right) and speed_cap is the highest accelerator sent (-1.0 released to 1.0 full, so 0.0 is
+    # half throttle rather than none)
+    def __init__(self, trim=0.0, speed_cap=None):
+        self.trim = trim
+        self.speed_cap = speed_cap
+
+    def apply(self, packet, state):
+        steering = state.get('steering')
+        if self.trim and steering is not None:
+            VALUE_FORMAT.pack_into(packet, STEERING_OFFSET, max(-1.0, min(1.0, steering + self.trim)))
+
+        accelerator = state.get('accelerator')
+        if self.speed_cap is not None and accelerator is not None and accelerator > self.speed_cap:
+            VALUE_FORMAT.pack_into(packet, ACCELERATOR_OFFSET, self.speed_cap)
+
+
+class FanoutPublisher(Publisher):
+    def __init__(self, targets, multicast_group=None, multicast_port=None, multicast_ttl=1):
+        if not targets and multicast_group is None:
+            raise ValueError('expected at least one target or a multicast group')
+
+        if multicast_group is not None:
+            if multicast_port is None:
+                raise ValueError('expected a multicast_port to go with multicast_group')
+
+            targets = list(targets) + [(multicast_group, multicast_port)]
+
+        super(FanoutPublisher, self).__init__(host=None, port=None)
+
+        self.targets = [tuple(target) for target in targets]
+
+        if multicast_group is not None:
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, multicast_ttl)
+
+        self.override_by_target = {}
+
+        self.sent_by_target = dict((target, 0) for target in self.targets)
+        self.failed_by_target = dict((target, 0) for target in self.targets)
+        self.last_error_by_target = {}
+
+    def set_override(self, target, trim=0.0, speed_cap=None):
+        target = tuple(target)
+        if target not in self.sent_by_target:
+            raise ValueError('expected {} to be one of {} but it was not'.format(repr(target), repr(self.targets)))
+
+        if not trim and speed_cap is None:
+            self.override_by_target.pop(target, None)
+        else:
+            self.override_by_target[target] = TargetOverride(trim, speed_cap)
+
+    def send(self, state):
+        if state is None:
+            return
+
+        self.sequence = (self.sequence + 1) % SEQUENCE_MODULUS
+
+        # encoded once; targets with overrides get a copy with just their fields patched
+        packet = encode_state(state, self.sequence, time.time())
+
+        # Python 2's socket has no sendmmsg, and failures are counted per target, so this is a sendto per target on
+        # the one socket; a multicast group is the way to reach a whole fleet with a single send
+        sendto = self.socket.sendto
+        override_by_target = self.override_by_target
+
+        sent = False
+        for target in self.targets:
+            override = override_by_target.get(target)
+            if override is None:
+                data = packet
+            else:
+                data = bytearray(packet)
+                override.apply(data, state)
+
+            try:
+                sendto(data, target)
+            except socket.error as e:
+                self.failed_by_target[target] += 1
+                self.last_error_by_target[target] = e
+                continue
+
+            self.sent_by_target[target] += 1
+            sent = True
+
+        if sent and TRACER.enabled:
+            TRACER.mark(get_trace_id(state), SENT)
+
+    def get_stats(self):
+        return dict(
+            ('{}:{}'.format(*target), {
+                'sent': self.sent_by_target[target],
+                'failed': self.failed_by_target[target],
+                'last_error': repr(self.last_error_by_target.get(target)),
+            }) for target in self.targets
+        )
@@ -0,0 +1,192 @@
+import socket
+import time
+import unittest
+
+from mock import patch
+
+from protocol import decode_packet, STATE_FORMAT, DELTA_HEADER_FORMAT, KEYFRAME_REQUEST
+from publisher import Publisher, FanoutPublisher, TargetOverride
+from state import State
+
+_STATE = State.from_dict({
+    'steering': 0.5,
+    'brake': -1.0,
+    'accelerator': 0.75,
+    'stop': False,
+    'record': False,
+    'play': False,
+})
+
+
+class TargetOverrideTest(unittest.TestCase):
+    def test_apply_trims_steering(self):
+        from protocol import encode_state
+
+        packet = bytearray(encode_state(_STATE, 1, 2.0))
+        TargetOverride(trim=0.25).apply(packet, _STATE)
+
+        sequence, timestamp, state = decode_packet(bytes(packet))
+
+        self.assert_(sequence == 1)
+        self.assert_(timestamp == 2.0)
+        self.assert_(state.steering == 0.75)
+        self.assert_(state.accelerator == 0.75)
+
+    def test_apply_clamps_trimmed_steering(self):
+        from protocol import encode_state
+
+        packet = bytearray(encode_state(_STATE, 1, 2.0))
+        TargetOverride(trim=1.0).apply(packet, _STATE)
+
+        self.assert_(decode_packet(bytes(packet))[2].steering == 1.0)
+
+    def test_apply_caps_accelerator(self):
+        from protocol import encode_state
+
+        packet = bytearray(encode_state(_STATE, 1, 2.0))
+        TargetOverride(speed_cap=0.5).apply(packet, _STATE)
+
+        state = decode_packet(bytes(packet))[2]
+
+        self.assert_(state.steering == 0.5)
+        self.assert_(state.accelerator == 0.5)
+
+    def test_apply_leaves_unset_axes_alone(self):
+        from protocol import encode_state
+
+        state = _STATE.replace(steering=None, accelerator=None)
+
+        packet = bytearray(encode_state(state, 1, 2.0))
+        TargetOverride(trim=0.25, speed_cap=0.5).apply(packet, state)
+
+        state = decode_packet(bytes(packet))[2]
+
+        self.assert_(state.steering is None)
+        self.assert_(state.accelerator is None)
+
+
+class FanoutPublisherTest(unittest.TestCase):
+    def setUp(self):
+        self.receivers = []
+        for _ in range(2):
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.bind(('127.0.0.1', 0))
+            s.settimeout(1.0)
+            self.receivers.append(s)
+
+        self.targets = [s.getsockname() for s in self.receivers]
+
+        self.subject = FanoutPublisher(targets=self.targets)
+
+    def tearDown(self):
+        for s in self.receivers:
+            s.close()
+
+        self.subject.socket.close()
+
+    def test_constructor_needs_a_target(self):
+        self.assertRaises(ValueError, FanoutPublisher, [])
+        self.assertRaises(ValueError, FanoutPublisher, [], multicast_group='239.0.0.1')
+
+    def test_send_reaches_every_target_with_one_sequence(self):
+        self.subject.send(_STATE)
+
+        packets = [decode_packet(s.recv(65536)) for s in self.receivers]
+
+        self.assert_(packets[0] == packets[1])
+        self.assert_(packets[0][0] == 1)
+        self.assert_(packets[0][2] == _STATE)
+
+    def test_send_applies_overrides_per_target(self):
+        self.subject.set_override(self.targets[1], trim=-0.25, speed_cap=0.5)
+
+        self.subject.send(_STATE)
+
+        plain, overridden = [decode_packet(s.recv(65536))[2] for s in self.receivers]
+
+        self.assert_(plain == _STATE)
+        self.assert_(overridden == _STATE.replace(steering=0.25, accelerator=0.5))
+
+    def test_set_override_to_nothing_removes_it(self):
+        self.subject.set_override(self.targets[0], trim=0.25)
+        self.subject.set_override(self.targets[0])
+
+        self.assert_(self.subject.override_by_target == {})
+
+    def test_set_override_unknown_target(self):
+        self.assertRaises(ValueError, self.subject.set_override, ('127.0.0.1', 1), trim=0.25)
+
+    def test_send_counts_failures_per_target(self):
+        sendto = self.subject.socket.sendto
+
+        def fail_for_first(data, target):
+            if target == self.targets[0]:
+                raise socket.error('nope')
+
+            return sendto(data, target)
+
+        with patch.object(self.subject, 'socket') as s:
+            s.sendto.side_effect = fail_for_first
+
+            self.subject.send(_STATE)
+            self.subject.send(_STATE)
+
+        stats = self.subject.get_stats()
+
+        first = '{}:{}'.format(*self.targets[0])
+        second = '{}:{}'.format(*self.targets[1])
+
+        self.assert_(stats[first]['sent'] == 0)
+        self.assert_(stats[first]['failed'] == 2)
+        self.assert_(stats[second]['sent'] == 2)
+        self.assert_(stats[second]['failed'] == 0)
+
+    def test_send_none(self):
+        self.subject.send(None)
+
+        self.assert_(self.subject.sequence == 0)
+
+
+class DeltaPublisherTest(unittest.TestCase):
+    def setUp(self):
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(('127.0.0.1', 0))
+        self.receiver.settimeout(1.0)
+        self.addCleanup(self.receiver.close)
+
+        host, port = self.receiver.getsockname()
+
+        self.subject = Publisher(host=host, port=port, keyframe_interval=25)
+        self.addCleanup(self.subject.socket.close)
+
+    def receive(self):
+        data, addr = self.receiver.recvfrom(65536)
+
+        return data, addr
+
+    def test_sends_deltas_after_a_keyframe(self):
+        self.subject.send(_STATE)
+        self.subject.send(_STATE)
+
+        sizes = [len(self.receive()[0]) for _ in range(2)]
+
+        self.assert_(sizes == [STATE_FORMAT.size, DELTA_HEADER_FORMAT.size])
+        self.assert_(self.subject.get_stats() == {
+            'sent': 2,
+            'bytes_sent': STATE_FORMAT.size + DELTA_HEADER_FORMAT.size,
+            'keyframes': 1,
+            'deltas': 1,
+            'keyframe_requests': 0,
+        })
+
+    def test_keyframe_request(self):
+        self.subject.send(_STATE)
+        _, addr = self.receive()
+
+        self.receiver.sendto(KEYFRAME_REQUEST, addr)
+        time.sleep(0.01)
+
+        self.subject.send(_STATE)
+
+        self.assert_(len(self.receive()[0]) == STATE_FORMAT.size)
+        self.assert_(self.subject.keyframe_requests == 1)
@@ -0,0 +1,115 @@
+import os
+import pickle
+
+
+class RingBuffer(object):
+    def __init__(self, capacity, spill_path=None):
+        if capacity < 1:
+            raise ValueError('expected capacity to be at least 1 but it was {}'.format(repr(capacity)))
+
+        self.capacity = capacity
+        self.spill_path = spill_path
+
+        self.items = [None] * capacity
+        self.head = 0
+        self.size = 0
+
+        # the oldest items overflow to the spill file (if any) and are consumed from there first
+        self.spill_file = None
+        self.spill_read_offset = 0
+        self.spilled = 0
+
+        self.dropped = 0
+
+    def __len__(self):
+        return self.spilled + self.size
+
+    def __iter__(self):
+        for item in self.iter_spilled():
+            yield item
+
+        for i in range(self.size):
+            yield self.items[(self.head + i) % self.capacity]
+
+    def iter_spilled(self):
+        if not self.spilled:
+            return
+
+        self.spill_file.flush()
+
+        with open(self.spill_path, 'rb') as f:
+            f.seek(self.spill_read_offset)
+            for _ in range(self.spilled):
+                yield pickle.load(f)
+
+    def spill(self, item):
+        if self.spill_file is None:
+            self.spill_file = open(self.spill_path, 'w+b')
+
+        self.spill_file.seek(0, os.SEEK_END)
+        pickle.dump(item, self.spill_file, pickle.HIGHEST_PROTOCOL)
+        self.spilled += 1
+
+    def unspill(self):
+        self.spill_file.flush()
+        self.spill_file.seek(self.spill_read_offset)
+        item = pickle.load(self.spill_file)
+        self.spill_read_offset = self.spill_file.tell()
+        self.spilled -= 1
+
+        if not self.spilled:
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+            self.spill_read_offset = 0
+
+        return item
+
+    def append(self, item):
+        if self.size < self.capacity:
+            self.items[(self.head + self.size) % self.capacity] = item
+            self.size += 1
+            return
+
+        if self.spill_path is not None:
+            self.spill(self.items[self.head])
+        else:
+            self.dropped += 1
+
+        self.items[self.head] = item
+        self.head = (self.head + 1) % self.capacity
+
+    def popleft(self):
+        if self.spilled:
+            return self.unspill()
+
+        if not self.size:
+            raise IndexError('pop from an empty ring buffer')
+
+        item = self.items[self.head]
+        self.items[self.head] = None
+        self.head = (self.head + 1) % self.capacity
+        self.size -= 1
+
+        return item
+
+    def clear(self):
+        self.items = [None] * self.capacity
+        self.head = 0
+        self.size = 0
+        self.dropped = 0
+
+        if self.spill_file is not None:
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+
+        self.spill_read_offset = 0
+        self.spilled = 0
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+            os.remove(self.spill_path)
+
+        self.spill_read_offset = 0
+        self.spilled = 0
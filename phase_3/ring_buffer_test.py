@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ring_buffer import RingBuffer
+
+
+class RingBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.subject = RingBuffer(capacity=3)
+
+    def test_init_bad_capacity(self):
+        self.assertRaises(ValueError, RingBuffer, 0)
+
+    def test_append_and_popleft(self):
+        for i in range(3):
+            self.subject.append(i)
+
+        self.assert_(len(self.subject) == 3)
+        self.assert_([self.subject.popleft() for _ in range(3)] == [0, 1, 2])
+        self.assertRaises(IndexError, self.subject.popleft)
+
+    def test_append_overflow_drops_oldest(self):
+        for i in range(5):
+            self.subject.append(i)
+
+        self.assert_(list(self.subject) == [2, 3, 4])
+        self.assert_(self.subject.dropped == 2)
+
+    def test_clear(self):
+        for i in range(5):
+            self.subject.append(i)
+
+        self.subject.clear()
+
+        self.assert_(len(self.subject) == 0)
+        self.assert_(list(self.subject) == [])
+
+
+class SpillingRingBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spill_path = os.path.join(self.directory, 'spill')
+
+        self.subject = RingBuffer(capacity=2, spill_path=self.spill_path)
+
+    def tearDown(self):
+        self.subject.close()
+        shutil.rmtree(self.directory)
+
+    def test_append_overflow_spills_oldest(self):
+        for i in range(5):
+            self.subject.append({'i': i})
+
+        self.assert_(len(self.subject) == 5)
+        self.assert_(self.subject.dropped == 0)
+        self.assert_(list(self.subject) == [{'i': i} for i in range(5)])
+
+    def test_popleft_reads_spill_first(self):
+        for i in range(4):
+            self.subject.append(i)
+
+        self.assert_(self.subject.popleft() == 0)
+
+        self.subject.append(4)
+
+        self.assert_([self.subject.popleft() for _ in range(4)] == [1, 2, 3, 4])
+        self.assertRaises(IndexError, self.subject.popleft)
+        self.assert_(os.path.getsize(self.spill_path) == 0)
@@ -0,0 +1,79 @@
+import errno
+import select
+import socket
+import traceback
+from threading import Event
+
+from clock import monotonic
+
+
+class EventLoopRuntime(object):
+    def __init__(self, vehicle, subscriber, clock=monotonic):
+        self.vehicle = vehicle
+        self.subscriber = subscriber
+        self.clock = clock
+
+        # the subscriber is only borrowed for its socket and packet handling, its thread is never started
+        self.socket = self.subscriber.socket
+        self.socket.setblocking(False)
+
+        self.stop_event = Event()
+
+        self.failsafe_deadline = None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def receive_pending(self):
+        received = False
+
+        while 1:
+            try:
+                data, addr = self.socket.recvfrom(65536)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+
+                raise
+
+            try:
+                state = self.subscriber.handle_datagram(data, addr)
+            except Exception:
+                traceback.print_exc()
+                continue
+
+            if state is None:
+                continue
+
+            # same mailbox as the threaded model, so coalescing and recording behave identically
+            self.vehicle.add_state_event(state)
+            received = True
+
+        return received
+
+    def iterate(self, last_state):
+        # the same timeout the threaded model waits on the queue for, so playback still steps once per PWM period
+        if self.failsafe_deadline is None:
+            self.failsafe_deadline = self.clock() + self.vehicle.get_queue_timeout()
+
+        timeout = max(self.failsafe_deadline - self.clock(), 0)
+
+        readable, _, _ = select.select([self.socket], [], [], timeout)
+
+        if readable and self.receive_pending():
+            self.failsafe_deadline = self.clock() + self.vehicle.get_queue_timeout()
+            return self.vehicle.iterate(last_state)
+
+        if self.clock() < self.failsafe_deadline:
+            return last_state
+
+        self.failsafe_deadline = self.clock() + self.vehicle.get_queue_timeout()
+
+        return self.vehicle.handle_state(self.vehicle.build_failsafe_state(last_state), last_state)
+
+    def run(self, test_mode=False):
+        last_state = None
+        while not self.stop_event.is_set():
+            last_state = self.iterate(last_state)
+            if test_mode:
+                break
@@ -0,0 +1,123 @@
+import socket
+import sys
+import time
+from threading import Event, Thread
+
+import fake_pigpio
+import vehicle
+from protocol import encode_state
+from runtime import EventLoopRuntime
+from stats import Histogram
+from subscriber import Subscriber
+
+PORT = 13338
+
+SAMPLES = 2000
+
+# every state swings the steering end to end so every packet results in a PWM write
+_STATES = [
+    {
+        'steering': steering,
+        'brake': -1.0,
+        'accelerator': -1.0,
+        'stop': False,
+        'record': False,
+        'play': False,
+    } for steering in (-1.0, 1.0)
+]
+
+
+def build_vehicle():
+    vehicle.pigpio = fake_pigpio
+
+    return vehicle.Vehicle(
+        vehicle.STEERING_GPIO,
+        vehicle.THROTTLE_GPIO,
+        vehicle.FREQUENCY,
+        vehicle.MIN_DUTY,
+        vehicle.IDLE_DUTY,
+        vehicle.MAX_DUTY,
+        vehicle.TIMEOUT,
+    )
+
+
+def measure(v, samples):
+    latency = Histogram(0.00001, 10000)
+    written = Event()
+
+    def write_callback(now, gpio, duty):
+        if gpio == vehicle.STEERING_GPIO:
+            written.set()
+
+    v.pi.set_write_callback(write_callback)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    for sequence in range(1, samples + 1):
+        written.clear()
+
+        sent = time.time()
+        sock.sendto(encode_state(_STATES[sequence % 2], sequence, sent), ('127.0.0.1', PORT))
+
+        if not written.wait(1.0):
+            raise Exception('timed out waiting for PWM write {}'.format(sequence))
+
+        latency.record(v.pi.writes[-1][0] - sent)
+
+    sock.close()
+
+    return latency
+
+
+def benchmark_threaded(samples):
+    v = build_vehicle()
+    v.start()
+
+    subscriber = Subscriber(port=PORT, timeout=vehicle.TIMEOUT * 2)
+    subscriber.set_receive_callback(v.add_state_event)
+    subscriber.start()
+
+    try:
+        return measure(v, samples)
+    finally:
+        subscriber.stop()
+        subscriber.join()
+        subscriber.socket.close()
+
+        v.stop()
+        v.join()
+
+
+def benchmark_event_loop(samples):
+    v = build_vehicle()
+
+    runtime = EventLoopRuntime(v, Subscriber(port=PORT, timeout=vehicle.TIMEOUT * 2))
+
+    # only so the benchmark can send from here; the runtime itself is a single thread
+    thread = Thread(target=runtime.run)
+    thread.start()
+
+    try:
+        return measure(v, samples)
+    finally:
+        runtime.stop()
+        thread.join()
+        runtime.socket.close()
+
+
+def report(name, latency):
+    sys.__stdout__.write('{:<12}p50 {:>8.1f} us    p99 {:>8.1f} us    max {:>8.1f} us\n'.format(
+        name,
+        latency.percentile(50) * 1000000,
+        latency.percentile(99) * 1000000,
+        latency.maximum * 1000000,
+    ))
+
+
+if __name__ == '__main__':
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else SAMPLES
+
+    vehicle.silence_output()
+
+    report('threaded', benchmark_threaded(samples))
+    report('event loop', benchmark_event_loop(samples))
@@ -0,0 +1,72 @@
+import socket
+import unittest
+
+from mock import Mock, call
+
+from protocol import encode_state
+from runtime import EventLoopRuntime
+from subscriber import Subscriber
+from state import State
+
+_TEST_STATE = State.from_dict({
+    'steering': 0.25,
+    'brake': -1.0,
+    'accelerator': 0.5,
+    'stop': False,
+    'record': False,
+    'play': False,
+})
+
+
+class EventLoopRuntimeTest(unittest.TestCase):
+    def setUp(self):
+        self.vehicle = Mock()
+        self.vehicle.get_queue_timeout.return_value = 0.05
+        self.vehicle.iterate.return_value = 'some_state'
+        self.vehicle.build_failsafe_state.return_value = 'some_failsafe_state'
+        self.vehicle.handle_state.return_value = 'some_other_state'
+
+        self.subscriber = Subscriber(port=0, timeout=0.1)
+
+        self.subject = EventLoopRuntime(self.vehicle, self.subscriber)
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.address = ('127.0.0.1', self.subscriber.socket.getsockname()[1])
+
+    def tearDown(self):
+        self.socket.close()
+        self.subscriber.socket.close()
+
+    def test_iterate_receive(self):
+        for sequence in (1, 2, 2):
+            self.socket.sendto(encode_state(_TEST_STATE, sequence, 1.0), self.address)
+
+        state = self.subject.iterate(None)
+
+        self.assert_(state == 'some_state')
+        self.assert_(self.vehicle.mock_calls == [
+            call.get_queue_timeout(),
+            call.add_state_event(_TEST_STATE),
+            call.add_state_event(_TEST_STATE),
+            call.get_queue_timeout(),
+            call.iterate(None),
+        ])
+        self.assert_(self.subscriber.get_stats()['duplicate'] == 1)
+
+    def test_iterate_failsafe(self):
+        state = self.subject.iterate('some_last_state')
+
+        self.assert_(state == 'some_other_state')
+        self.assert_(self.vehicle.mock_calls == [
+            call.get_queue_timeout(),
+            call.get_queue_timeout(),
+            call.build_failsafe_state('some_last_state'),
+            call.handle_state('some_failsafe_state', 'some_last_state'),
+        ])
+
+    def test_run(self):
+        self.subject.iterate = Mock()
+
+        self.subject.run(test_mode=True)
+
+        self.assert_(self.subject.iterate.mock_calls == [call(None)])
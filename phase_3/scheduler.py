@@ -1,8 +1,17 @@
 import datetime
+import errno
+import fcntl
+import os
+import select
 import time
 
 from threading import Thread, Event, RLock
 
+from clock import monotonic
+from state import State
+from stats import Histogram
+from tracing import TRACER, SCHEDULED, get_trace_id
+
 
 class Scheduler(Thread):
     def __init__(self, period):
@@ -46,3 +55,222 @@ class Scheduler(Thread):
 
             if stopped < planned_stop:
                 time.sleep((planned_stop - stopped).total_seconds())
+
+
+MISSED_TICK_CATCH_UP = 'catch_up'
+MISSED_TICK_SKIP = 'skip'
+
+MISSED_TICK_POLICIES = (MISSED_TICK_CATCH_UP, MISSED_TICK_SKIP)
+
+HISTOGRAM_BUCKETS_PER_PERIOD = 100
+HISTOGRAM_PERIODS = 10
+
+# half the vehicle's failsafe timeout (vehicle.TIMEOUT), so one lost heartbeat doesn't trip it
+HEARTBEAT_PERIOD = 0.1
+
+
+class MonotonicScheduler(Scheduler):
+    def __init__(self, period, missed_tick_policy=MISSED_TICK_SKIP, clock=monotonic, sleep=time.sleep):
+        super(MonotonicScheduler, self).__init__(period)
+
+        if missed_tick_policy not in MISSED_TICK_POLICIES:
+            raise ValueError('expected missed_tick_policy to be one of {} but it was {}'.format(
+                repr(MISSED_TICK_POLICIES), repr(missed_tick_policy)
+            ))
+
+        self.missed_tick_policy = missed_tick_policy
+        self.clock = clock
+        self.sleep = sleep
+
+        bucket_width = period / HISTOGRAM_BUCKETS_PER_PERIOD
+        bucket_count = HISTOGRAM_BUCKETS_PER_PERIOD * HISTOGRAM_PERIODS
+
+        self.lateness = Histogram(bucket_width, bucket_count)
+        self.callback_duration = Histogram(bucket_width, bucket_count)
+
+        self.started = None
+        self.tick = 0
+        self.skipped_ticks = 0
+
+    def get_stats(self):
+        return {
+            'ticks': self.tick,
+            'skipped_ticks': self.skipped_ticks,
+            'lateness': self.lateness.summary(),
+            'callback_duration': self.callback_duration.summary(),
+        }
+
+    def iterate(self):
+        if self.started is None:
+            self.started = self.clock()
+
+        # tick N fires at t0 + N * period, regardless of how long earlier ticks took
+        deadline = self.started + (self.tick * self.period)
+
+        now = self.clock()
+        if now < deadline:
+            self.sleep(deadline - now)
+            now = self.clock()
+
+        self.lateness.record(now - deadline)
+
+        if self.iteration_callback is not None:
+            with self.lock:
+                if TRACER.enabled:
+                    TRACER.mark(get_trace_id(self.state), SCHEDULED)
+                self.iteration_callback(self.state)
+
+            self.callback_duration.record(self.clock() - now)
+
+        self.tick += 1
+
+        if self.missed_tick_policy == MISSED_TICK_SKIP:
+            due_tick = int((self.clock() - self.started) / self.period)
+            if due_tick > self.tick:
+                self.skipped_ticks += due_tick - self.tick
+                self.tick = due_tick
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.iterate()
+
+
+def same_state(state, other_state):
+    # a fresh trace id on an otherwise identical state isn't a change
+    if isinstance(state, State) and isinstance(other_state, State):
+        return state.same_as(other_state)
+
+    if isinstance(state, dict) and isinstance(other_state, dict) and ('trace_id' in state or 'trace_id' in other_state):
+        return dict(state, trace_id=None) == dict(other_state, trace_id=None)
+
+    return state == other_state
+
+
+class ChangeDrivenScheduler(Scheduler):
+    def __init__(self, heartbeat_period=HEARTBEAT_PERIOD, min_interval=0.0, clock=monotonic, wait=None):
+        super(ChangeDrivenScheduler, self).__init__(heartbeat_period)
+
+        if heartbeat_period <= 0:
+            raise ValueError('expected heartbeat_period to be positive but it was {}'.format(repr(heartbeat_period)))
+
+        if not 0.0 <= min_interval <= heartbeat_period:
+            raise ValueError('expected min_interval to be between 0.0 and heartbeat_period but it was {}'.format(
+                repr(min_interval)
+            ))
+
+        self.heartbeat_period = heartbeat_period
+        self.min_interval = min_interval
+        self.clock = clock
+
+        # a pipe rather than an Event; on Python 2 a timed Event.wait polls, costing up to 50ms of latency
+        self.wake_read_fd, self.wake_write_fd = os.pipe()
+        for fd in (self.wake_read_fd, self.wake_write_fd):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.wait = wait if wait is not None else self.wait_for_change
+
+        self.changed = False
+        self.changed_at = None
+
+        self.last_sent_at = None
+
+        self.sent_on_change = 0
+        self.heartbeats = 0
+        self.suppressed = 0
+
+        bucket_width = heartbeat_period / HISTOGRAM_BUCKETS_PER_PERIOD
+        bucket_count = HISTOGRAM_BUCKETS_PER_PERIOD * HISTOGRAM_PERIODS
+
+        self.change_latency = Histogram(bucket_width, bucket_count)
+        self.callback_duration = Histogram(bucket_width, bucket_count)
+
+    def wake(self):
+        try:
+            os.write(self.wake_write_fd, b'\x00')
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def wait_for_change(self, timeout):
+        readable, _, _ = select.select([self.wake_read_fd], [], [], timeout)
+        if readable:
+            try:
+                os.read(self.wake_read_fd, 4096)
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+
+    def stop(self):
+        super(ChangeDrivenScheduler, self).stop()
+        self.wake()
+
+    def set_state(self, state):
+        with self.lock:
+            if same_state(state, self.state):
+                self.suppressed += 1
+                return
+
+            self.state = state
+
+            if not self.changed:
+                self.changed = True
+                self.changed_at = self.clock()
+
+        self.wake()
+
+    def get_stats(self):
+        return {
+            'sent_on_change': self.sent_on_change,
+            'heartbeats': self.heartbeats,
+            'suppressed': self.suppressed,
+            'change_latency': self.change_latency.summary(),
+            'callback_duration': self.callback_duration.summary(),
+        }
+
+    def get_timeout(self, now):
+        if self.changed:
+            if self.last_sent_at is None:
+                return 0.0
+
+            # changes go straight out, only held back enough to respect min_interval
+            return max(0.0, self.last_sent_at + self.min_interval - now)
+
+        # nothing to keep alive until there's been a state
+        if self.last_sent_at is None:
+            return None
+
+        return max(0.0, self.last_sent_at + self.heartbeat_period - now)
+
+    def iterate(self):
+        with self.lock:
+            timeout = self.get_timeout(self.clock())
+
+        if timeout is None or timeout > 0:
+            self.wait(timeout)
+            return
+
+        with self.lock:
+            now = self.clock()
+
+            if self.changed:
+                self.change_latency.record(now - self.changed_at)
+                self.sent_on_change += 1
+                self.changed = False
+            else:
+                self.heartbeats += 1
+
+            self.last_sent_at = now
+
+            if self.iteration_callback is not None:
+                if TRACER.enabled:
+                    TRACER.mark(get_trace_id(self.state), SCHEDULED)
+                self.iteration_callback(self.state)
+
+        self.callback_duration.record(self.clock() - now)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.iterate()
+
+    def close(self):
+        os.close(self.wake_read_fd)
+        os.close(self.wake_write_fd)
@@ -0,0 +1,195 @@
+import time
+import unittest
+
+from mock import Mock, call
+
+from scheduler import MonotonicScheduler, ChangeDrivenScheduler, MISSED_TICK_CATCH_UP, MISSED_TICK_SKIP, same_state
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.now += duration
+
+
+class MonotonicSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def build_subject(self, missed_tick_policy):
+        subject = MonotonicScheduler(
+            period=0.02,
+            missed_tick_policy=missed_tick_policy,
+            clock=self.clock,
+            sleep=self.clock.sleep,
+        )
+        subject.set_state('some_state')
+
+        return subject
+
+    def test_init_bad_policy(self):
+        self.assertRaises(ValueError, MonotonicScheduler, 0.02, 'some_policy')
+
+    def test_iterate_is_drift_free(self):
+        subject = self.build_subject(MISSED_TICK_SKIP)
+
+        def slow_callback(state):
+            self.clock.now += 0.005
+
+        subject.set_iteration_callback(slow_callback)
+
+        for _ in range(50):
+            subject.iterate()
+
+        # 50 ticks of 20ms, the last one fired at t0 + 49 * period then took 5ms
+        self.assertAlmostEqual(self.clock.now, 100.0 + (49 * 0.02) + 0.005)
+        self.assert_(subject.tick == 50)
+        self.assert_(subject.skipped_ticks == 0)
+        self.assertAlmostEqual(subject.callback_duration.mean(), 0.005)
+        self.assert_(subject.lateness.maximum < 1e-9)
+
+    def test_iterate_skip(self):
+        subject = self.build_subject(MISSED_TICK_SKIP)
+        subject.set_iteration_callback(Mock())
+
+        subject.iterate()
+        self.clock.now += 0.075
+        subject.iterate()
+
+        # ticks 1, 2 and 3 were all due; 1 fired late, 2 was skipped and 3 is next
+        self.assert_(subject.tick == 3)
+        self.assert_(subject.skipped_ticks == 1)
+        self.assert_(subject.iteration_callback.mock_calls == [call('some_state')] * 2)
+
+    def test_iterate_catch_up(self):
+        subject = self.build_subject(MISSED_TICK_CATCH_UP)
+        subject.set_iteration_callback(Mock())
+
+        subject.iterate()
+        self.clock.now += 0.075
+
+        for _ in range(3):
+            subject.iterate()
+
+        # all the missed ticks fire back to back without sleeping
+        self.assertAlmostEqual(self.clock.now, 100.075)
+        self.assert_(subject.tick == 4)
+        self.assert_(subject.skipped_ticks == 0)
+        self.assert_(subject.lateness.count == 4)
+        self.assert_(len(subject.iteration_callback.mock_calls) == 4)
+
+
+class SameStateTest(unittest.TestCase):
+    def test_same_state(self):
+        self.assert_(same_state({'steering': 0.5}, {'steering': 0.5}))
+        self.assert_(not same_state({'steering': 0.5}, {'steering': -0.5}))
+        self.assert_(not same_state(None, {'steering': 0.5}))
+
+    def test_trace_id_is_ignored(self):
+        self.assert_(same_state({'steering': 0.5, 'trace_id': 1}, {'steering': 0.5, 'trace_id': 2}))
+        self.assert_(same_state({'steering': 0.5, 'trace_id': 1}, {'steering': 0.5}))
+
+
+class ChangeDrivenSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.callback = Mock()
+
+        self.subject = ChangeDrivenScheduler(
+            heartbeat_period=0.1,
+            min_interval=0.01,
+            clock=self.clock,
+            wait=self.wait,
+        )
+        self.subject.set_iteration_callback(self.callback)
+        self.addCleanup(self.subject.close)
+
+        self.waits = []
+
+    def wait(self, timeout):
+        self.waits.append(round(timeout, 6) if timeout is not None else None)
+        if timeout is not None:
+            self.clock.sleep(timeout)
+
+    def test_init_bad_periods(self):
+        self.assertRaises(ValueError, ChangeDrivenScheduler, 0)
+        self.assertRaises(ValueError, ChangeDrivenScheduler, 0.1, 0.2)
+
+    def test_nothing_is_sent_before_the_first_state(self):
+        self.subject.iterate()
+
+        self.assert_(self.waits == [None])
+        self.assert_(self.callback.mock_calls == [])
+
+    def test_change_is_sent_straight_away(self):
+        self.subject.set_state('some_state')
+        self.subject.iterate()
+
+        self.assert_(self.waits == [])
+        self.assert_(self.callback.mock_calls == [call('some_state')])
+        self.assert_(self.subject.sent_on_change == 1)
+
+    def test_identical_state_is_suppressed(self):
+        self.subject.set_state('some_state')
+        self.subject.iterate()
+
+        self.subject.set_state('some_state')
+        self.subject.iterate()
+
+        self.assert_(self.subject.suppressed == 1)
+        self.assert_(self.callback.mock_calls == [call('some_state')])
+
+    def test_heartbeat(self):
+        self.subject.set_state('some_state')
+
+        for _ in range(5):
+            self.subject.iterate()
+
+        # sent, waited out the heartbeat, heartbeat, waited again, heartbeat
+        self.assert_(self.callback.mock_calls == [call('some_state')] * 3)
+        self.assert_(self.waits == [0.1, 0.1])
+        self.assert_(self.subject.heartbeats == 2)
+
+    def test_min_interval(self):
+        self.subject.set_state('some_state')
+        self.subject.iterate()
+
+        self.subject.set_state('some_other_state')
+        self.subject.iterate()
+        self.subject.iterate()
+
+        self.assert_(self.waits == [0.01])
+        self.assert_(self.callback.mock_calls == [call('some_state'), call('some_other_state')])
+        self.assert_(self.subject.sent_on_change == 2)
+
+    def test_change_latency(self):
+        self.subject.set_state('some_state')
+        self.clock.sleep(0.005)
+        self.subject.iterate()
+
+        self.assert_(abs(self.subject.change_latency.maximum - 0.005) < 1e-9)
+
+    def test_set_state_wakes_the_real_wait(self):
+        subject = ChangeDrivenScheduler(heartbeat_period=10.0)
+        self.addCleanup(subject.close)
+
+        sent = []
+        subject.set_iteration_callback(sent.append)
+
+        subject.start()
+
+        started = time.time()
+        subject.set_state('some_state')
+
+        while not sent and time.time() - started < 1.0:
+            time.sleep(0.001)
+
+        subject.stop()
+        subject.join()
+
+        self.assert_(sent == ['some_state'])
@@ -0,0 +1,96 @@
+import mmap
+import os
+import struct
+
+from protocol import STATE_FORMAT, encode_state_into
+
+# a publisher target of "shm:(path)" writes to a slot in a file rather than sending packets
+SHARED_MEMORY_PREFIX = 'shm:'
+
+# tmpfs on Linux, so the file is only ever memory
+SHARED_MEMORY_PATH = '/dev/shm/pi-rc-car'
+
+# native byte order; odd while a write is in progress, bumped by two for every state written
+SEQLOCK_FORMAT = struct.Struct('=I')
+
+SEQLOCK_MODULUS = 2 ** 32
+
+# the counter, padded out to 8 bytes, then a full version 3 packet
+PACKET_OFFSET = 8
+
+SLOT_SIZE = PACKET_OFFSET + STATE_FORMAT.size
+
+# how many times a reader tries again after catching a write in progress before giving up on this poll
+READ_RETRIES = 100
+
+
+def is_shared_memory_target(target):
+    return target.startswith(SHARED_MEMORY_PREFIX)
+
+
+def get_shared_memory_path(target):
+    return target[len(SHARED_MEMORY_PREFIX):] or SHARED_MEMORY_PATH
+
+
+class SharedStateSlot(object):
+    def __init__(self, path=SHARED_MEMORY_PATH, create=False):
+        self.path = path
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT if create else os.O_RDWR)
+        try:
+            if create and os.fstat(fd).st_size < SLOT_SIZE:
+                os.ftruncate(fd, SLOT_SIZE)
+            elif os.fstat(fd).st_size < SLOT_SIZE:
+                raise ValueError('expected {} to be at least {} bytes but it was {}'.format(
+                    repr(path), SLOT_SIZE, os.fstat(fd).st_size
+                ))
+
+            self.map = mmap.mmap(fd, SLOT_SIZE)
+        finally:
+            # the mapping keeps its own reference
+            os.close(fd)
+
+        # only the writer's idea of the counter matters; a writer that died mid-write left it odd
+        self.counter = self.read_counter()
+        if self.counter & 1:
+            self.counter = (self.counter + 1) % SEQLOCK_MODULUS
+
+        self.torn_reads = 0
+
+    def read_counter(self):
+        return SEQLOCK_FORMAT.unpack_from(self.map, 0)[0]
+
+    def write(self, state, sequence, timestamp):
+        # odd while the packet is being written, so a reader that overlaps it knows to try again; there's no
+        # barrier to be had from Python, so a reader also checks the counter hasn't moved once it's done
+        self.counter = (self.counter + 1) % SEQLOCK_MODULUS
+        SEQLOCK_FORMAT.pack_into(self.map, 0, self.counter)
+
+        encode_state_into(self.map, PACKET_OFFSET, state, sequence, timestamp)
+
+        self.counter = (self.counter + 1) % SEQLOCK_MODULUS
+        SEQLOCK_FORMAT.pack_into(self.map, 0, self.counter)
+
+    def read(self, last_counter=None):
+        # (counter, unpacked packet fields), or (last_counter, None) if nothing new has been written; read in place,
+        # so there's no syscall and nothing copied but the fields themselves
+        for _ in range(READ_RETRIES):
+            before = SEQLOCK_FORMAT.unpack_from(self.map, 0)[0]
+            if before == last_counter or before == 0:
+                return last_counter, None
+
+            if before & 1:
+                self.torn_reads += 1
+                continue
+
+            fields = STATE_FORMAT.unpack_from(self.map, PACKET_OFFSET)
+
+            if SEQLOCK_FORMAT.unpack_from(self.map, 0)[0] == before:
+                return before, fields
+
+            self.torn_reads += 1
+
+        return last_counter, None
+
+    def close(self):
+        self.map.close()
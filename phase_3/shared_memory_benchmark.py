@@ -0,0 +1,89 @@
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import timeit
+
+from publisher import Publisher, SharedMemoryPublisher
+from state import State
+from subscriber import Subscriber, SharedMemorySubscriber
+
+PORT = 13339
+
+SAMPLES = 100000
+
+# every state differs from the last so nothing is skipped as already seen
+_STATES = [State((steering, -1.0, -1.0, False, False, False, 0)) for steering in (-1.0, 1.0)]
+
+
+def benchmark_udp(samples):
+    subscriber = Subscriber(port=PORT, timeout=1.0)
+    publisher = Publisher(host='127.0.0.1', port=PORT)
+
+    recvfrom = subscriber.socket.recvfrom
+
+    def send_and_receive(i):
+        publisher.send(_STATES[i % 2])
+        data, addr = recvfrom(65536)
+        subscriber.handle_datagram(data, addr)
+
+    try:
+        return timeit.timeit(lambda: [send_and_receive(i) for i in range(samples)], number=1)
+    finally:
+        publisher.socket.close()
+        subscriber.socket.close()
+
+
+def benchmark_shared_memory(samples, path):
+    publisher = SharedMemoryPublisher(path)
+    subscriber = SharedMemorySubscriber(path)
+
+    def send_and_receive(i):
+        publisher.send(_STATES[i % 2])
+        subscriber.read_latest()
+
+    try:
+        return timeit.timeit(lambda: [send_and_receive(i) for i in range(samples)], number=1)
+    finally:
+        publisher.close()
+        subscriber.slot.close()
+
+
+def benchmark_shared_memory_poll(samples, path):
+    # what a reader polling faster than anything is written pays for each poll
+    publisher = SharedMemoryPublisher(path)
+    subscriber = SharedMemorySubscriber(path)
+
+    publisher.send(_STATES[0])
+    subscriber.read_latest()
+
+    try:
+        return timeit.timeit(subscriber.read_latest, number=samples)
+    finally:
+        publisher.close()
+        subscriber.slot.close()
+
+
+def report(name, samples, elapsed):
+    sys.__stdout__.write('{:<24}{:>8.2f} us per state    {:>10.0f} states/s\n'.format(
+        name,
+        (elapsed / samples) * 1000000,
+        samples / elapsed,
+    ))
+
+
+if __name__ == '__main__':
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else SAMPLES
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'slot')
+
+    try:
+        report('udp (loopback)', samples, benchmark_udp(samples))
+        report('shared memory', samples, benchmark_shared_memory(samples, path))
+        report('shared memory (idle)', samples, benchmark_shared_memory_poll(samples, path))
+    except socket.error as e:
+        sys.__stdout__.write('couldn\'t bind {}: {}\n'.format(PORT, e))
+    finally:
+        shutil.rmtree(directory)
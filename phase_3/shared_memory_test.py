@@ -0,0 +1,194 @@
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Process
+
+from mock import MagicMock
+
+from protocol import decode_fields
+from publisher import SharedMemoryPublisher
+from shared_memory import SharedStateSlot, SEQLOCK_FORMAT, SLOT_SIZE, READ_RETRIES, is_shared_memory_target, \
+    get_shared_memory_path, SHARED_MEMORY_PATH
+from state import State
+from subscriber import SharedMemorySubscriber
+
+_TEST_STATE = State((0.25, -1.0, 0.5, False, True, False, 0))
+
+
+def _write_states(path, count):
+    publisher = SharedMemoryPublisher(path)
+    for i in range(count):
+        publisher.send(_TEST_STATE.replace(steering=i / float(count)))
+
+    publisher.close()
+
+
+class SharedMemoryTargetTest(unittest.TestCase):
+    def test_target(self):
+        self.assert_(is_shared_memory_target('shm:/tmp/slot'))
+        self.assert_(not is_shared_memory_target('192.168.137.2'))
+        self.assert_(get_shared_memory_path('shm:/tmp/slot') == '/tmp/slot')
+        self.assert_(get_shared_memory_path('shm:') == SHARED_MEMORY_PATH)
+
+
+class SharedStateSlotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.path = os.path.join(self.directory, 'slot')
+
+        self.writer = SharedStateSlot(self.path, create=True)
+        self.reader = SharedStateSlot(self.path)
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+
+    def test_size(self):
+        self.assert_(os.path.getsize(self.path) == SLOT_SIZE)
+
+    def test_missing(self):
+        self.assertRaises(OSError, SharedStateSlot, os.path.join(self.directory, 'missing'))
+
+    def test_empty(self):
+        self.assert_(self.reader.read() == (None, None))
+
+    def test_write_read(self):
+        self.writer.write(_TEST_STATE, 1, 1.5)
+
+        counter, fields = self.reader.read()
+
+        self.assert_(counter == 2)
+        self.assert_(decode_fields(fields) == (1, 1.5, _TEST_STATE))
+
+    def test_nothing_new(self):
+        self.writer.write(_TEST_STATE, 1, 1.5)
+
+        counter, _ = self.reader.read()
+
+        self.assert_(self.reader.read(counter) == (counter, None))
+
+    def test_newest_wins(self):
+        self.writer.write(_TEST_STATE, 1, 1.5)
+        self.writer.write(_TEST_STATE.replace(steering=-0.5), 2, 1.6)
+
+        _, fields = self.reader.read()
+
+        self.assert_(decode_fields(fields) == (2, 1.6, _TEST_STATE.replace(steering=-0.5)))
+
+    def test_write_in_progress(self):
+        self.writer.write(_TEST_STATE, 1, 1.5)
+        SEQLOCK_FORMAT.pack_into(self.writer.map, 0, 3)
+
+        self.assert_(self.reader.read(2) == (2, None))
+        self.assert_(self.reader.torn_reads == READ_RETRIES)
+
+    def test_writer_restart(self):
+        # a writer that died mid-write left the counter odd; the next one carries on from the next even value
+        SEQLOCK_FORMAT.pack_into(self.writer.map, 0, 5)
+
+        writer = SharedStateSlot(self.path, create=True)
+        writer.write(_TEST_STATE, 1, 1.5)
+        writer.close()
+
+        self.assert_(self.reader.read()[0] == 8)
+
+
+class SharedMemoryPublisherSubscriberTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.path = os.path.join(self.directory, 'slot')
+
+        self.publisher = SharedMemoryPublisher(self.path)
+        self.subject = SharedMemorySubscriber(self.path, poll_interval=0.0)
+
+    def tearDown(self):
+        self.publisher.close()
+        self.subject.slot.close()
+
+    def test_read_latest(self):
+        self.assert_(self.subject.read_latest() is None)
+
+        self.publisher.send(_TEST_STATE)
+
+        self.assert_(self.subject.read_latest() == _TEST_STATE)
+        self.assert_(self.subject.read_latest() is None)
+
+    def test_send_none(self):
+        self.publisher.send(None)
+
+        self.assert_(self.publisher.get_stats()['sent'] == 0)
+        self.assert_(self.subject.read_latest() is None)
+
+    def test_trace_id(self):
+        self.publisher.send(_TEST_STATE.with_trace_id(7))
+
+        self.assert_(self.subject.read_latest().trace_id == 7)
+
+    def test_skipped_states_are_lost(self):
+        self.publisher.send(_TEST_STATE)
+        self.subject.read_latest()
+
+        self.publisher.send(_TEST_STATE.replace(steering=0.0))
+        self.publisher.send(_TEST_STATE.replace(steering=1.0))
+
+        self.assert_(self.subject.read_latest().steering == 1.0)
+        self.assert_(self.subject.get_stats()['lost'] == 1)
+
+    def test_stats(self):
+        self.publisher.send(_TEST_STATE)
+        self.subject.read_latest()
+
+        self.assert_(self.publisher.get_stats() == {'sent': 1, 'bytes_sent': 30})
+
+        stats = self.subject.get_stats()
+        self.assert_(stats['accepted'] == 1)
+        self.assert_(stats['polls'] == 1)
+        self.assert_(stats['torn_reads'] == 0)
+
+    def test_set_receive_callback(self):
+        self.assertRaises(TypeError, self.subject.set_receive_callback, None)
+
+    def test_run(self):
+        callback = MagicMock()
+
+        def send_and_stop(state):
+            callback(state)
+            self.subject.stop()
+
+        self.subject.set_receive_callback(send_and_stop)
+        self.publisher.send(_TEST_STATE)
+
+        self.subject.run()
+
+        callback.assert_called_once_with(_TEST_STATE)
+
+    def test_other_process(self):
+        count = 10000
+
+        process = Process(target=_write_states, args=(self.path, count))
+        process.start()
+
+        states = []
+        while process.is_alive():
+            state = self.subject.read_latest()
+            if state is not None:
+                states.append(state)
+
+        process.join()
+
+        state = self.subject.read_latest()
+        if state is not None:
+            states.append(state)
+
+        self.assert_(self.subject.sequence_tracker.last_sequence == count)
+
+        # in order and never a mix of two writes
+        steerings = [x.steering for x in states]
+        self.assert_(steerings == sorted(steerings))
+        for state in states:
+            self.assert_(state == _TEST_STATE.replace(steering=state.steering))
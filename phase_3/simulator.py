@@ -0,0 +1,397 @@
+import csv
+import math
+
+from clock import VirtualClock
+from fake_pigpio import FakePi
+from output import DEFAULT_PWM_RANGE, HARDWARE_PWM_RANGE
+from state import to_state
+
+# servo and ESC pulses, in seconds; a shorter pulse steers left and drives forward (see default_calibration)
+NEUTRAL_PULSE = 0.0015
+PULSE_HALF_RANGE = 0.0005
+
+# roughly a 1/10 scale car
+WHEELBASE = 0.26
+MAX_STEERING_ANGLE = math.radians(25.0)
+SERVO_SLEW_RATE = math.radians(60.0) / 0.12
+MAX_SPEED = 8.0
+REVERSE_RATIO = 0.5
+ESC_TIME_CONSTANT = 0.4
+ESC_DEADBAND = 0.04
+
+# physics step and how often the trajectory is sampled, both in (virtual) seconds
+STEP = 0.005
+SAMPLE_PERIOD = 0.02
+
+# the controller resends the last state at 50Hz (controller.DEBOUNCE_PERIOD) but a session only records changes
+RESEND_PERIOD = 1.0 / 50.0
+
+# how long to keep going once the session's over, for the car to come to rest
+SETTLE_DURATION = 2.0
+
+# what each trajectory sample is made of
+TRAJECTORY_FIELDS = ('time', 'x', 'y', 'heading', 'speed', 'steering_angle')
+
+
+def _pulse_to_command(pulse):
+    # -1.0 (full right / reverse) to 1.0 (full left / forward)
+    return max(-1.0, min(1.0, (NEUTRAL_PULSE - pulse) / PULSE_HALF_RANGE))
+
+
+class Servo(object):
+    def __init__(self, max_angle=MAX_STEERING_ANGLE, slew_rate=SERVO_SLEW_RATE):
+        self.max_angle = max_angle
+        self.slew_rate = slew_rate
+
+        self.angle = 0.0
+
+        # the pulse only changes when the vehicle writes, so neither does the target
+        self.pulse = None
+        self.target = None
+
+    def step(self, pulse, dt):
+        if pulse != self.pulse:
+            self.pulse = pulse
+            self.target = _pulse_to_command(pulse) * self.max_angle if pulse is not None else None
+
+        # without a pulse a servo just holds where it was
+        if self.target is not None and self.angle != self.target:
+            movement = self.slew_rate * dt
+            self.angle += max(-movement, min(movement, self.target - self.angle))
+
+        return self.angle
+
+
+class ESC(object):
+    def __init__(self, max_speed=MAX_SPEED, reverse_ratio=REVERSE_RATIO, time_constant=ESC_TIME_CONSTANT,
+                 deadband=ESC_DEADBAND):
+        self.max_speed = max_speed
+        self.reverse_ratio = reverse_ratio
+        self.time_constant = time_constant
+        self.deadband = deadband
+
+        self.speed = 0.0
+
+        # the pulse only changes when the vehicle writes and the step hardly ever does, so both are worked out once
+        self.pulse = None
+        self.target = 0.0
+        self.dt = None
+        self.response = None
+
+    def get_target(self, pulse):
+        # without a pulse an ESC cuts the motor
+        command = _pulse_to_command(pulse) if pulse is not None else 0.0
+        if -self.deadband < command < self.deadband:
+            command = 0.0
+
+        target = command * self.max_speed
+        if command < 0:
+            target *= self.reverse_ratio
+
+        return target
+
+    def step(self, pulse, dt):
+        if pulse != self.pulse:
+            self.pulse = pulse
+            self.target = self.get_target(pulse)
+
+        if dt != self.dt:
+            self.dt = dt
+            self.response = 1.0 - math.exp(-dt / self.time_constant)
+
+        # first order lag towards the speed the throttle asks for
+        self.speed += (self.target - self.speed) * self.response
+
+        return self.speed
+
+
+class KinematicModel(object):
+    # a bicycle model; position in metres from where it started, heading in radians anticlockwise from the x axis
+    def __init__(self, wheelbase=WHEELBASE):
+        self.wheelbase = wheelbase
+
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0
+
+    def step(self, speed, steering_angle, dt):
+        self.x += speed * math.cos(self.heading) * dt
+        self.y += speed * math.sin(self.heading) * dt
+        self.heading += (speed / self.wheelbase) * math.tan(steering_angle) * dt
+
+
+class SimulatedPi(FakePi):
+    # FakePi with enough of pigpio's PWM state kept to work out the pulse each GPIO is putting out
+    def __init__(self, clock):
+        super(SimulatedPi, self).__init__(clock=clock)
+
+        self.range_by_gpio = {}
+
+        # in seconds, worked out on every write so the simulation can read it every step for free
+        self.pulse_by_gpio = {}
+
+    def update_pulse_width(self, gpio):
+        with self.lock:
+            frequency = self.frequency_by_gpio.get(gpio)
+            duty = self.duty_by_gpio.get(gpio)
+            range_ = self.range_by_gpio.get(gpio, DEFAULT_PWM_RANGE)
+
+            if not frequency or duty is None:
+                self.pulse_by_gpio.pop(gpio, None)
+            else:
+                self.pulse_by_gpio[gpio] = (duty / float(range_)) / frequency
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        frequency = super(SimulatedPi, self).set_PWM_frequency(user_gpio, frequency)
+        self.update_pulse_width(user_gpio)
+
+        return frequency
+
+    def set_PWM_range(self, user_gpio, range_):
+        with self.lock:
+            self.range_by_gpio[user_gpio] = range_
+
+        self.update_pulse_width(user_gpio)
+
+        return range_
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        with self.lock:
+            if self.range_by_gpio.get(user_gpio) == HARDWARE_PWM_RANGE:
+                del self.range_by_gpio[user_gpio]
+
+        result = super(SimulatedPi, self).set_PWM_dutycycle(user_gpio, dutycycle)
+        self.update_pulse_width(user_gpio)
+
+        return result
+
+    def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+        with self.lock:
+            self.range_by_gpio[gpio] = HARDWARE_PWM_RANGE
+
+        result = super(SimulatedPi, self).hardware_PWM(gpio, PWMfreq, PWMduty)
+        self.update_pulse_width(gpio)
+
+        return result
+
+    def get_pulse_width(self, gpio):
+        # in seconds, or None if nothing's been written
+        return self.pulse_by_gpio.get(gpio)
+
+
+class Simulation(object):
+    def __init__(self, steering_gpio, throttle_gpio, clock=None, servo=None, esc=None, model=None, step=STEP,
+                 sample_period=SAMPLE_PERIOD):
+        self.steering_gpio = steering_gpio
+        self.throttle_gpio = throttle_gpio
+
+        self.clock = clock if clock is not None else VirtualClock()
+
+        self.servo = servo if servo is not None else Servo()
+        self.esc = esc if esc is not None else ESC()
+        self.model = model if model is not None else KinematicModel()
+
+        self.step = step
+        self.sample_period = sample_period
+
+        # handed to the Vehicle in place of pigpio.pi()
+        self.pi = SimulatedPi(self.clock)
+
+        self.started_at = self.clock()
+        self.samples_taken = 0
+
+        # (time, x, y, heading, speed, steering angle) tuples, see TRAJECTORY_FIELDS
+        self.trajectory = []
+
+    def sample(self):
+        self.trajectory.append((
+            self.clock() - self.started_at,
+            self.model.x,
+            self.model.y,
+            self.model.heading,
+            self.esc.speed,
+            self.servo.angle,
+        ))
+
+        self.samples_taken += 1
+
+    def advance(self, dt):
+        # the pulses are whatever the vehicle last wrote, held for the whole step
+        pulse_by_gpio = self.pi.pulse_by_gpio
+
+        steering_angle = self.servo.step(pulse_by_gpio.get(self.steering_gpio), dt)
+        speed = self.esc.step(pulse_by_gpio.get(self.throttle_gpio), dt)
+
+        self.model.step(speed, steering_angle, dt)
+
+        self.clock.advance(dt)
+
+    def advance_to(self, now):
+        # in whole steps, plus whatever's left over, sampling on the way
+        while 1:
+            next_sample_at = self.started_at + (self.samples_taken * self.sample_period)
+            if next_sample_at > now:
+                break
+
+            self.advance_by(next_sample_at - self.clock())
+            self.sample()
+
+        self.advance_by(now - self.clock())
+
+    def advance_by(self, duration):
+        while duration > self.step:
+            self.advance(self.step)
+            duration -= self.step
+
+        if duration > 0:
+            self.advance(duration)
+
+
+def build_vehicle(simulation, calibration=None, **kwargs):
+    # the same Vehicle the car runs, on the simulation's pi and clock; its thread is never started (see run_session)
+    import vehicle
+
+    return vehicle.Vehicle(
+        simulation.steering_gpio,
+        simulation.throttle_gpio,
+        vehicle.FREQUENCY,
+        vehicle.MIN_DUTY,
+        vehicle.IDLE_DUTY,
+        vehicle.MAX_DUTY,
+        vehicle.TIMEOUT,
+        clock=simulation.clock,
+        calibration=calibration,
+        pi=simulation.pi,
+        **kwargs
+    )
+
+
+def resend_states(samples, period=RESEND_PERIOD):
+    # what the vehicle would have received from a controller that only recorded changes
+    if period is None:
+        return samples
+
+    resent = []
+    for i, (t, state) in enumerate(samples):
+        resent.append((t, state))
+
+        if i + 1 < len(samples):
+            resend_at = t + period
+            while resend_at < samples[i + 1][0]:
+                resent.append((resend_at, state))
+                resend_at += period
+
+    return resent
+
+
+def run_until(vehicle, simulation, now, last_state):
+    # what the control loop does while nothing's arriving: the queue times out and it handles the failsafe state
+    while simulation.clock() + vehicle.get_queue_timeout() < now:
+        simulation.advance_to(simulation.clock() + vehicle.get_queue_timeout())
+        last_state = vehicle.handle_state(vehicle.build_failsafe_state(last_state), last_state)
+
+    return last_state
+
+
+def run_session(vehicle, simulation, samples, resend_period=RESEND_PERIOD, settle_duration=SETTLE_DURATION):
+    # samples are (time, state) pairs, as recorded by "controller.py --record-session"; instead of the vehicle's
+    # thread waiting on its queue, each state is put and handled at the (virtual) time it would have arrived
+    if not samples:
+        return simulation.trajectory
+
+    started_at = simulation.clock()
+    first_at = samples[0][0]
+
+    last_state = None
+    for t, state in resend_states(samples, resend_period):
+        arrives_at = started_at + (t - first_at)
+
+        last_state = run_until(vehicle, simulation, arrives_at, last_state)
+        simulation.advance_to(arrives_at)
+
+        vehicle.add_state_event(to_state(state))
+        last_state = vehicle.iterate(last_state)
+
+    finished_at = simulation.clock() + settle_duration
+
+    run_until(vehicle, simulation, finished_at, last_state)
+    simulation.advance_to(finished_at)
+
+    return simulation.trajectory
+
+
+def write_trajectory(path, trajectory):
+    with open(path, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow(TRAJECTORY_FIELDS)
+        writer.writerows(trajectory)
+
+
+def load_trajectory(path):
+    with open(path, 'rb') as f:
+        reader = csv.reader(f)
+
+        header = tuple(next(reader))
+        if header != TRAJECTORY_FIELDS:
+            raise ValueError('expected {} to start with {} but it was {}'.format(
+                repr(path), repr(TRAJECTORY_FIELDS), repr(header)
+            ))
+
+        return [tuple(float(x) for x in row) for row in reader]
+
+
+def compare_trajectories(trajectory, baseline):
+    # the furthest apart (in metres) the two ever are
+    if len(trajectory) != len(baseline):
+        raise ValueError('expected {} samples but it was {}'.format(len(baseline), len(trajectory)))
+
+    return max([0.0] + [
+        math.hypot(a[1] - b[1], a[2] - b[2]) for a, b in zip(trajectory, baseline)
+    ])
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import time
+
+    from delta_benchmark import load_session, synthetic_session
+
+    args = sys.argv[1:]
+
+    # a recorded session, or a minute of synthetic driving
+    session_path = args[0] if args and not args[0].startswith('--') else None
+    samples = load_session(session_path) if session_path is not None else synthetic_session()
+
+    import vehicle
+
+    simulation = Simulation(vehicle.STEERING_GPIO, vehicle.THROTTLE_GPIO)
+    v = build_vehicle(simulation)
+
+    vehicle.silence_output()
+
+    started_at = time.time()
+    trajectory = run_session(v, simulation, samples)
+    elapsed = time.time() - started_at
+
+    simulated = simulation.clock() - simulation.started_at
+
+    sys.__stdout__.write('simulated {:.1f}s in {:.3f}s ({:.0f}x real time), ended at ({:.2f}, {:.2f})\n'.format(
+        simulated,
+        elapsed,
+        simulated / elapsed,
+        simulation.model.x,
+        simulation.model.y,
+    ))
+
+    if '--output' in args:
+        write_trajectory(args[args.index('--output') + 1], trajectory)
+
+    if '--compare' in args:
+        tolerance = float(args[args.index('--tolerance') + 1]) if '--tolerance' in args else 0.01
+        error = compare_trajectories(trajectory, load_trajectory(args[args.index('--compare') + 1]))
+
+        sys.__stdout__.write('furthest from the baseline {:.4f}m (tolerance {:.4f}m)\n'.format(error, tolerance))
+
+        if error > tolerance:
+            sys.exit(1)
@@ -0,0 +1,201 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from clock import VirtualClock
+from output import HardwarePWMOutput
+from simulator import Servo, ESC, KinematicModel, SimulatedPi, Simulation, build_vehicle, resend_states, \
+    run_session, write_trajectory, load_trajectory, compare_trajectories, MAX_STEERING_ANGLE, MAX_SPEED, \
+    SERVO_SLEW_RATE
+from state import State
+from vehicle import STEERING_GPIO, THROTTLE_GPIO, TIMEOUT
+
+# steering, brake, accelerator, stop, record, play, trace id
+_STRAIGHT = State((0.0, -1.0, 1.0, False, False, False, 0))
+_LEFT = State((-1.0, -1.0, 1.0, False, False, False, 0))
+_IDLE = State((0.0, -1.0, -1.0, False, False, False, 0))
+
+
+class ClockTest(unittest.TestCase):
+    def test_virtual_clock(self):
+        clock = VirtualClock(5.0)
+
+        clock.advance(0.5)
+        self.assert_(clock() == 5.5)
+
+        clock.advance_to(6.0)
+        self.assert_(clock() == 6.0)
+
+        self.assertRaises(ValueError, clock.advance, -1.0)
+        self.assertRaises(ValueError, clock.advance_to, 5.0)
+
+
+class ModelTest(unittest.TestCase):
+    def test_servo_slews(self):
+        subject = Servo()
+
+        self.assert_(subject.step(None, 0.01) == 0.0)
+
+        self.assertAlmostEqual(subject.step(0.001, 0.01), SERVO_SLEW_RATE * 0.01)
+        for _ in range(100):
+            subject.step(0.001, 0.01)
+
+        self.assertAlmostEqual(subject.angle, MAX_STEERING_ANGLE)
+
+        # no pulse, no movement
+        self.assertAlmostEqual(subject.step(None, 0.01), MAX_STEERING_ANGLE)
+
+    def test_esc(self):
+        subject = ESC()
+
+        for _ in range(1000):
+            subject.step(0.001, 0.01)
+
+        self.assertAlmostEqual(subject.speed, MAX_SPEED)
+
+        for _ in range(1000):
+            subject.step(0.002, 0.01)
+
+        self.assertAlmostEqual(subject.speed, -MAX_SPEED * subject.reverse_ratio)
+
+        # inside the deadband, or no pulse at all, the motor's off
+        for pulse in [0.0015 + 0.00001, None]:
+            for _ in range(1000):
+                subject.step(pulse, 0.01)
+
+            self.assertAlmostEqual(subject.speed, 0.0)
+
+    def test_kinematic_model(self):
+        subject = KinematicModel(wheelbase=1.0)
+
+        subject.step(2.0, 0.0, 0.5)
+        self.assert_((subject.x, subject.y, subject.heading) == (1.0, 0.0, 0.0))
+
+        subject.step(1.0, math.atan(1.0), 0.5)
+        self.assertAlmostEqual(subject.heading, 0.5)
+
+
+class SimulatedPiTest(unittest.TestCase):
+    def setUp(self):
+        self.subject = SimulatedPi(VirtualClock())
+
+    def test_software_pwm(self):
+        self.assert_(self.subject.get_pulse_width(12) is None)
+
+        self.subject.set_PWM_frequency(12, 50.0)
+        self.subject.set_PWM_dutycycle(12, 19)
+
+        self.assertAlmostEqual(self.subject.get_pulse_width(12), (19 / 255.0) / 50.0)
+
+        self.subject.set_PWM_range(12, 1000)
+        self.subject.set_PWM_dutycycle(12, 75)
+
+        self.assertAlmostEqual(self.subject.get_pulse_width(12), 0.0015)
+
+    def test_hardware_pwm(self):
+        self.subject.hardware_PWM(12, 50, 75000)
+
+        self.assertAlmostEqual(self.subject.get_pulse_width(12), 0.0015)
+
+        # back to software PWM at the default range
+        self.subject.set_PWM_dutycycle(12, 51)
+
+        self.assertAlmostEqual(self.subject.get_pulse_width(12), 0.004)
+
+
+class SimulationTest(unittest.TestCase):
+    def setUp(self):
+        self.simulation = Simulation(STEERING_GPIO, THROTTLE_GPIO)
+        self.vehicle = build_vehicle(self.simulation)
+
+    def test_vehicle_arms_on_the_simulated_pi(self):
+        self.assertAlmostEqual(self.simulation.pi.get_pulse_width(STEERING_GPIO), (19 / 255.0) / 50.0)
+        self.assert_(self.vehicle.clock is self.simulation.clock)
+
+    def test_straight(self):
+        # hardware PWM, because 8 bit software PWM can't put out a centred pulse (see below)
+        simulation = Simulation(STEERING_GPIO, THROTTLE_GPIO)
+        vehicle = build_vehicle(simulation, output_class=HardwarePWMOutput)
+
+        trajectory = run_session(vehicle, simulation, [(0.0, _STRAIGHT), (5.0, _STRAIGHT)])
+
+        _, x, y, heading, speed, _ = trajectory[-1]
+        self.assert_(x > 25.0)
+        self.assertAlmostEqual(y, 0.0)
+        self.assertAlmostEqual(heading, 0.0)
+
+    def test_software_pwm_centre_is_off_centre(self):
+        # 19 / 255 of 20ms is 1.490ms rather than 1.5ms, so "straight" pulls gently to the left
+        trajectory = run_session(self.vehicle, self.simulation, [(0.0, _STRAIGHT), (5.0, _STRAIGHT)])
+
+        self.assert_(0.0 < trajectory[-1][5] < math.radians(1.0))
+        self.assert_(trajectory[-1][2] > 1.0)
+
+    def test_left_is_anticlockwise(self):
+        trajectory = run_session(self.vehicle, self.simulation, [(0.0, _LEFT), (1.0, _LEFT)])
+
+        self.assert_(trajectory[-1][2] > 0.0)
+        self.assert_(trajectory[-1][3] > 0.0)
+
+    def test_samples(self):
+        trajectory = run_session(self.vehicle, self.simulation, [(10.0, _IDLE)], settle_duration=1.0)
+
+        self.assert_(len(trajectory) == 51)
+        self.assertAlmostEqual(trajectory[-1][0], 1.0)
+
+    def test_failsafe_timeout_in_virtual_time(self):
+        # a second of throttle, then silence; the vehicle idles TIMEOUT later without anything waiting for real
+        run_session(self.vehicle, self.simulation, [(0.0, _STRAIGHT), (1.0, _STRAIGHT)], settle_duration=1.0)
+
+        throttle_writes = [(t, duty) for t, gpio, duty in self.simulation.pi.writes if gpio == THROTTLE_GPIO]
+
+        self.assert_(throttle_writes[-1][1] == 19)
+        self.assertAlmostEqual(throttle_writes[-1][0], 1.0 + TIMEOUT)
+        self.assert_(self.simulation.esc.speed < 1.0)
+
+    def test_deterministic(self):
+        samples = [(i * 0.1, _STRAIGHT.replace(steering=math.sin(i * 0.1))) for i in range(50)]
+
+        trajectory = run_session(self.vehicle, self.simulation, samples)
+
+        simulation = Simulation(STEERING_GPIO, THROTTLE_GPIO)
+        self.assert_(run_session(build_vehicle(simulation), simulation, samples) == trajectory)
+
+    def test_resend_states(self):
+        self.assert_(resend_states([(0.0, _IDLE), (0.05, _STRAIGHT)], 0.02) == [
+            (0.0, _IDLE), (0.02, _IDLE), (0.04, _IDLE), (0.05, _STRAIGHT)
+        ])
+        self.assert_(resend_states([(0.0, _IDLE), (0.05, _STRAIGHT)], None) == [(0.0, _IDLE), (0.05, _STRAIGHT)])
+
+    def test_empty_session(self):
+        self.assert_(run_session(self.vehicle, self.simulation, []) == [])
+
+
+class TrajectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.trajectory = [(0.0, 0.0, 0.0, 0.0, 0.0, 0.0), (0.02, 0.1, 0.0, 0.0, 5.0, 0.1)]
+
+    def test_round_trip(self):
+        path = os.path.join(self.directory, 'trajectory.csv')
+        write_trajectory(path, self.trajectory)
+
+        self.assert_(load_trajectory(path) == self.trajectory)
+
+    def test_bad_header(self):
+        path = os.path.join(self.directory, 'trajectory.csv')
+        with open(path, 'w') as f:
+            f.write('a,b\n')
+
+        self.assertRaises(ValueError, load_trajectory, path)
+
+    def test_compare(self):
+        moved = [self.trajectory[0], (0.02, 0.1, 0.3, 0.0, 5.0, 0.1)]
+
+        self.assert_(compare_trajectories(self.trajectory, self.trajectory) == 0.0)
+        self.assertAlmostEqual(compare_trajectories(moved, self.trajectory), 0.3)
+        self.assertRaises(ValueError, compare_trajectories, self.trajectory[:1], self.trajectory)
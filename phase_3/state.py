@@ -0,0 +1,81 @@
+from operator import itemgetter
+
+FIELDS = ('steering', 'brake', 'accelerator', 'stop', 'record', 'play', 'trace_id')
+
+STEERING, BRAKE, ACCELERATOR, STOP, RECORD, PLAY, TRACE_ID = range(len(FIELDS))
+
+FIELD_INDEX = dict((field, index) for index, field in enumerate(FIELDS))
+
+
+class State(tuple):
+    # built from a tuple of all the fields, e.g. State((steering, brake, accelerator, stop, record, play, trace_id));
+    # construction, ==, "None in state" and slicing all stay in C, which a class with its own __init__ / __eq__ can't
+    __slots__ = ()
+
+    steering = property(itemgetter(STEERING))
+    brake = property(itemgetter(BRAKE))
+    accelerator = property(itemgetter(ACCELERATOR))
+    stop = property(itemgetter(STOP))
+    record = property(itemgetter(RECORD))
+    play = property(itemgetter(PLAY))
+
+    # 0 when untraced, same as on the wire
+    trace_id = property(itemgetter(TRACE_ID))
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls((
+            state.get('steering'),
+            state.get('brake'),
+            state.get('accelerator'),
+            state.get('stop'),
+            state.get('record'),
+            state.get('play'),
+            state.get('trace_id') or 0,
+        ))
+
+    def is_complete(self):
+        return None not in self
+
+    def same_as(self, other):
+        # equal apart from the trace id
+        return self[:TRACE_ID] == other[:TRACE_ID]
+
+    def with_trace_id(self, trace_id):
+        return State(self[:TRACE_ID] + (trace_id,))
+
+    def replace(self, **changes):
+        values = list(self)
+        for key, value in changes.items():
+            values[FIELD_INDEX[key]] = value
+
+        return State(values)
+
+    def get(self, key, default=None):
+        # so code that takes a dict or a State (tracing, publisher overrides) can read either
+        index = FIELD_INDEX.get(key)
+        if index is None:
+            return default
+
+        return self[index]
+
+    def to_dict(self):
+        state = dict(zip(FIELDS[:TRACE_ID], self))
+        if self[TRACE_ID]:
+            state['trace_id'] = self[TRACE_ID]
+
+        return state
+
+    def __reduce__(self):
+        return State, (tuple(self),)
+
+    def __repr__(self):
+        return 'State({})'.format(', '.join('{}={}'.format(key, repr(value)) for key, value in zip(FIELDS, self)))
+
+
+def to_state(state):
+    # anything dict-like (a test, a recording from before State) is converted; a State is passed through as is
+    if state is None or isinstance(state, State):
+        return state
+
+    return State.from_dict(state)
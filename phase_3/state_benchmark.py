@@ -0,0 +1,106 @@
+import sys
+import timeit
+
+from protocol import encode_state, STATE_FORMAT, FLAG_STOP, FLAG_RECORD, FLAG_PLAY, _decode_fields, _decode_value
+from state import State
+
+ITERATIONS = 100000
+
+_VALUES = (-0.37, -0.7058500000000001, -0.98035, False, False, False)
+
+_DICT = dict(zip(('steering', 'brake', 'accelerator', 'stop', 'record', 'play'), _VALUES))
+_OTHER_DICT = dict(_DICT, steering=0.37)
+
+_STATE = State(_VALUES + (0,))
+_OTHER_STATE = _STATE.replace(steering=0.37)
+
+
+def build_dict():
+    # the way Controller.build_state and Vehicle.build_failsafe_state used to
+    steering, brake, accelerator, stop, record, play = _VALUES
+
+    return {
+        'steering': steering,
+        'brake': brake,
+        'accelerator': accelerator,
+        'stop': stop,
+        'record': record,
+        'play': play,
+    }
+
+
+def build_state():
+    steering, brake, accelerator, stop, record, play = _VALUES
+
+    return State((steering, brake, accelerator, stop, record, play, 0))
+
+
+def check_dict():
+    # what Vehicle.iterate used to do on every pass
+    return None in _DICT.values() or _DICT == _OTHER_DICT
+
+
+def check_state():
+    return None in _STATE or _STATE == _OTHER_STATE
+
+
+def copy_dict():
+    return dict(_DICT, trace_id=1)
+
+
+def copy_state():
+    return _STATE.with_trace_id(1)
+
+
+_FIELDS = STATE_FORMAT.unpack(encode_state(_STATE))[4:]
+
+
+def decode_dict():
+    # the way protocol._decode_fields used to build its dicts
+    steering, brake, accelerator, flags = _FIELDS
+
+    return {
+        'steering': _decode_value(steering),
+        'brake': _decode_value(brake),
+        'accelerator': _decode_value(accelerator),
+        'stop': bool(flags & FLAG_STOP),
+        'record': bool(flags & FLAG_RECORD),
+        'play': bool(flags & FLAG_PLAY),
+    }
+
+
+def decode_state():
+    steering, brake, accelerator, flags = _FIELDS
+
+    return _decode_fields(steering, brake, accelerator, flags)
+
+
+def benchmark(name, func, iterations=ITERATIONS):
+    duration = min(timeit.repeat(func, number=iterations, repeat=3))
+
+    print('{:<20}{:>10.3f} us/op{:>12.0f} ops/s'.format(
+        name,
+        (duration / iterations) * 1000000,
+        iterations / duration,
+    ))
+
+    return duration
+
+
+if __name__ == '__main__':
+    print('{:<20}{:>10} bytes'.format('dict', sys.getsizeof(build_dict())))
+    print('{:<20}{:>10} bytes'.format('State', sys.getsizeof(build_state())))
+
+    print('')
+
+    for name, dict_func, state_func in [
+        ('build', build_dict, build_state),
+        ('check', check_dict, check_state),
+        ('copy', copy_dict, copy_state),
+        ('decode', decode_dict, decode_state),
+    ]:
+        dict_duration = benchmark('{} (dict)'.format(name), dict_func)
+        state_duration = benchmark('{} (State)'.format(name), state_func)
+
+        print('speedup: {:.1f}x'.format(dict_duration / state_duration))
+        print('')
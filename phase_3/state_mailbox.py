@@ -0,0 +1,66 @@
+from Queue import Empty
+from collections import deque
+from threading import Condition
+
+from clock import monotonic
+
+
+class Mailbox(object):
+    def __init__(self, capacity=1, clock=monotonic):
+        if capacity < 1:
+            raise ValueError('expected capacity to be at least 1 but it was {}'.format(repr(capacity)))
+
+        self.clock = clock
+
+        # (put time, item) pairs
+        self.items = deque(maxlen=capacity)
+        self.condition = Condition()
+
+        # when set, items pushed out by newer ones are kept (with their put time) for take_superseded()
+        self.retain_superseded = False
+        self.superseded = []
+
+        self.put_count = 0
+        self.get_count = 0
+        self.superseded_count = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.superseded_count += 1
+                if self.retain_superseded:
+                    self.superseded.append(self.items[0])
+
+            self.items.append((self.clock(), item))
+            self.put_count += 1
+
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        return self.get_with_put_time(timeout)[1]
+
+    def get_with_put_time(self, timeout=None):
+        with self.condition:
+            if not self.items:
+                self.condition.wait(timeout)
+
+            if not self.items:
+                raise Empty
+
+            self.get_count += 1
+
+            return self.items.popleft()
+
+    def take_superseded(self):
+        with self.condition:
+            superseded, self.superseded = self.superseded, []
+
+        return superseded
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'put': self.put_count,
+                'get': self.get_count,
+                'superseded': self.superseded_count,
+            }
@@ -0,0 +1,52 @@
+import unittest
+from Queue import Empty
+
+from mock import Mock
+
+from state_mailbox import Mailbox
+
+
+class MailboxTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Mock()
+        self.clock.side_effect = range(100)
+
+        self.subject = Mailbox(clock=self.clock)
+
+    def test_init_bad_capacity(self):
+        self.assertRaises(ValueError, Mailbox, 0)
+
+    def test_get_latest(self):
+        for i in range(5):
+            self.subject.put(i)
+
+        self.assert_(self.subject.get(timeout=0) == 4)
+        self.assert_(self.subject.get_stats() == {'put': 5, 'get': 1, 'superseded': 4})
+
+    def test_get_with_put_time(self):
+        self.subject.put('some_state')
+
+        self.assert_(self.subject.get_with_put_time(timeout=0) == (0, 'some_state'))
+
+    def test_get_empty(self):
+        self.assertRaises(Empty, self.subject.get, 0.01)
+
+    def test_bounded(self):
+        self.subject = Mailbox(capacity=2, clock=self.clock)
+
+        for i in range(5):
+            self.subject.put(i)
+
+        self.assert_(self.subject.get(timeout=0) == 3)
+        self.assert_(self.subject.get(timeout=0) == 4)
+        self.assert_(self.subject.superseded_count == 3)
+
+    def test_take_superseded(self):
+        self.subject.put(0)
+        self.subject.retain_superseded = True
+        self.subject.put(1)
+        self.subject.put(2)
+
+        self.assert_(self.subject.get(timeout=0) == 2)
+        self.assert_(self.subject.take_superseded() == [(0, 0), (1, 1)])
+        self.assert_(self.subject.take_superseded() == [])
@@ -0,0 +1,84 @@
+import pickle
+import unittest
+
+from protocol import encode_state, decode_state
+from scheduler import same_state
+from state import State, to_state
+
+_TEST_DICT = {
+    'steering': 0.25,
+    'brake': -1.0,
+    'accelerator': 0.5,
+    'stop': False,
+    'record': True,
+    'play': False,
+}
+
+
+class StateTest(unittest.TestCase):
+    def setUp(self):
+        self.subject = State((0.25, -1.0, 0.5, False, True, False, 0))
+
+    def test_fields(self):
+        self.assert_(self.subject.steering == 0.25)
+        self.assert_(self.subject.brake == -1.0)
+        self.assert_(self.subject.accelerator == 0.5)
+        self.assert_(self.subject.stop is False)
+        self.assert_(self.subject.record is True)
+        self.assert_(self.subject.play is False)
+        self.assert_(self.subject.trace_id == 0)
+
+    def test_no_instance_dict(self):
+        self.assertRaises(AttributeError, setattr, self.subject, 'turbo', True)
+
+    def test_is_complete(self):
+        self.assert_(self.subject.is_complete())
+        self.assert_(not self.subject.replace(brake=None).is_complete())
+        self.assert_(not self.subject.replace(stop=None).is_complete())
+
+    def test_equality(self):
+        self.assert_(self.subject == State((0.25, -1.0, 0.5, False, True, False, 0)))
+        self.assert_(self.subject != self.subject.replace(steering=0.0))
+        self.assert_(self.subject != self.subject.with_trace_id(1))
+
+    def test_same_as_ignores_the_trace_id(self):
+        self.assert_(self.subject.same_as(self.subject.with_trace_id(1)))
+        self.assert_(not self.subject.same_as(self.subject.replace(play=True)))
+        self.assert_(same_state(self.subject, self.subject.with_trace_id(1)))
+
+    def test_replace(self):
+        replaced = self.subject.replace(steering=-1.0, trace_id=3)
+
+        self.assert_(replaced.steering == -1.0)
+        self.assert_(replaced.trace_id == 3)
+        self.assert_(self.subject.steering == 0.25)
+        self.assertRaises(KeyError, self.subject.replace, turbo=True)
+
+    def test_get(self):
+        self.assert_(self.subject.get('steering') == 0.25)
+        self.assert_(self.subject.get('turbo', 'default') == 'default')
+
+    def test_dict_round_trip(self):
+        self.assert_(self.subject.to_dict() == _TEST_DICT)
+        self.assert_(State.from_dict(_TEST_DICT) == self.subject)
+        self.assert_(self.subject.with_trace_id(5).to_dict() == dict(_TEST_DICT, trace_id=5))
+
+    def test_to_state(self):
+        self.assert_(to_state(None) is None)
+        self.assert_(to_state(self.subject) is self.subject)
+        self.assert_(to_state(_TEST_DICT) == self.subject)
+
+    def test_pickle(self):
+        state = self.subject.with_trace_id(7)
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            unpickled = pickle.loads(pickle.dumps(state, protocol))
+
+            self.assert_(isinstance(unpickled, State))
+            self.assert_(unpickled == state)
+
+    def test_wire_round_trip(self):
+        state = decode_state(encode_state(self.subject.with_trace_id(3)))
+
+        self.assert_(isinstance(state, State))
+        self.assert_(state == self.subject.with_trace_id(3))
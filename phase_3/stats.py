@@ -0,0 +1,104 @@
+import math
+from threading import Lock
+
+
+class Histogram(object):
+    def __init__(self, bucket_width, bucket_count):
+        if bucket_width <= 0:
+            raise ValueError('expected bucket_width to be positive but it was {}'.format(repr(bucket_width)))
+
+        if bucket_count < 1:
+            raise ValueError('expected bucket_count to be at least 1 but it was {}'.format(repr(bucket_count)))
+
+        self.bucket_width = bucket_width
+        self.bucket_count = bucket_count
+
+        # the last bucket catches everything beyond the range
+        self.buckets = [0] * (bucket_count + 1)
+
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+        self.lock = Lock()
+
+    def record(self, value):
+        index = int(value / self.bucket_width)
+        if index < 0:
+            index = 0
+        elif index > self.bucket_count:
+            index = self.bucket_count
+
+        with self.lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += value
+
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+
+    def reset(self):
+        with self.lock:
+            self.buckets = [0] * (self.bucket_count + 1)
+            self.count = 0
+            self.total = 0.0
+            self.minimum = None
+            self.maximum = None
+
+    def mean(self):
+        with self.lock:
+            if self.count == 0:
+                return None
+
+            return self.total / self.count
+
+    def percentile(self, percent):
+        if not 0 <= percent <= 100:
+            raise ValueError('expected percent to be between 0 and 100 but it was {}'.format(repr(percent)))
+
+        with self.lock:
+            if self.count == 0:
+                return None
+
+            target = (percent / 100.0) * self.count
+            cumulative = 0
+            for index, bucket in enumerate(self.buckets):
+                cumulative += bucket
+                if bucket > 0 and cumulative >= target:
+                    break
+
+            if index == self.bucket_count:
+                return self.maximum
+
+            # upper edge of the bucket, but never more than we've actually seen
+            return min((index + 1) * self.bucket_width, self.maximum)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'min': self.minimum,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.maximum,
+        }
+
+
+def percentile(values, percent):
+    if not 0 <= percent <= 100:
+        raise ValueError('expected percent to be between 0 and 100 but it was {}'.format(repr(percent)))
+
+    if not values:
+        return None
+
+    values = sorted(values)
+
+    # nearest rank
+    index = max(int(math.ceil((percent / 100.0) * len(values))) - 1, 0)
+
+    return values[index]
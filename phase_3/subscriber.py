@@ -1,29 +1,244 @@
+import os
 import socket
+import struct
+import time
 import traceback
-from threading import Thread, Event
+from threading import Thread, Event, Lock
+
+from clock import monotonic
+from protocol import DeltaDecoder, KEYFRAME_REQUEST, SEQUENCE_MODULUS, decode_fields
+from shared_memory import SharedStateSlot, SHARED_MEMORY_PATH
+from state import State
+from tracing import TRACER, RECEIVED, get_trace_id
+
+# how many sequence numbers behind the newest we remember, to tell reordered from duplicate
+SEQUENCE_WINDOW = 64
+
+# how long a source can be silent before it no longer counts as driving
+SOURCE_TIMEOUT = 1.0
+
+# stray senders that have gone quiet are forgotten once there are this many
+MAX_SOURCES = 64
+
+# packet rates are worked out over windows this long
+RATE_WINDOW = 1.0
+
+ARBITRATION_MOST_RECENT = 'most_recent'
+ARBITRATION_OWNER_LOCK = 'owner_lock'
+ARBITRATION_PRIORITY = 'priority'
+ARBITRATION_FAILSAFE = 'failsafe'
+
+ARBITRATION_POLICIES = (ARBITRATION_MOST_RECENT, ARBITRATION_OWNER_LOCK, ARBITRATION_PRIORITY, ARBITRATION_FAILSAFE)
+
+# where systemd puts the first socket it passes on (sd_listen_fds)
+SD_LISTEN_FDS_START = 3
+
+# how long a shared memory subscriber sleeps between polls that found nothing new; 0 spins
+SHARED_MEMORY_POLL_INTERVAL = 0.001
+
+# what the vehicle is given while more than one source is driving under the failsafe policy
+# steering, brake, accelerator, stop, record, play, trace id
+CONFLICT_STATE = State((0.0, -1.0, -1.0, False, False, False, 0))
+
+
+class SequenceTracker(object):
+    def __init__(self, window=SEQUENCE_WINDOW):
+        self.window = window
+
+        self.last_sequence = None
+        self.last_timestamp = None
+        self.received_mask = 0
+
+        # where this run started; nothing before it was ever counted as lost
+        self.first_sequence = None
+
+        self.received = 0
+        self.accepted = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicate = 0
+        self.restarts = 0
+
+        self.lock = Lock()
+
+    def reset(self, sequence, timestamp):
+        self.first_sequence = sequence
+        self.last_sequence = sequence
+        self.last_timestamp = timestamp
+        self.received_mask = 1
+
+    def accept(self, sequence, timestamp):
+        with self.lock:
+            self.received += 1
+
+            # unsequenced (version 1) senders can't be filtered
+            if sequence is None:
+                self.accepted += 1
+                return True
+
+            if self.last_sequence is None:
+                self.reset(sequence, timestamp)
+                self.accepted += 1
+                return True
+
+            delta = (sequence - self.last_sequence) % SEQUENCE_MODULUS
+
+            if delta != 0 and delta < SEQUENCE_MODULUS // 2:
+                # newer than anything so far; anything skipped over is lost until it turns up
+                self.lost += delta - 1
+                self.received_mask = ((self.received_mask << delta) | 1) & ((1 << self.window) - 1)
+                self.last_sequence = sequence
+                self.last_timestamp = timestamp
+                self.accepted += 1
+                return True
+
+            # no newer than the last sequence but sent later by the clock, so the sender restarted (however close to
+            # the old run its sequence is); deltas carry no timestamp, so it's picked up from the next keyframe
+            if timestamp is not None and self.last_timestamp is not None and timestamp > self.last_timestamp:
+                self.restarts += 1
+                self.reset(sequence, timestamp)
+                self.accepted += 1
+                return True
+
+            if delta == 0:
+                self.duplicate += 1
+                return False
+
+            behind = SEQUENCE_MODULUS - delta
+
+            if behind < self.window:
+                bit = 1 << behind
+                if self.received_mask & bit:
+                    self.duplicate += 1
+                    return False
+
+                self.received_mask |= bit
+                self.reordered += 1
+
+                # only a gap after the start of this run was counted as lost
+                if (sequence - self.first_sequence) % SEQUENCE_MODULUS < SEQUENCE_MODULUS // 2:
+                    self.lost -= 1
+
+                return False
+
+            self.reordered += 1
+
+            return False
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'received': self.received,
+                'accepted': self.accepted,
+                'lost': self.lost,
+                'reordered': self.reordered,
+                'duplicate': self.duplicate,
+                'restarts': self.restarts,
+            }
+
+
+def join_multicast_group(sock, multicast_group):
+    sock.setsockopt(
+        socket.IPPROTO_IP,
+        socket.IP_ADD_MEMBERSHIP,
+        struct.pack('4sl', socket.inet_aton(multicast_group), socket.INADDR_ANY)
+    )
+
+
+def bind_socket(port, multicast_group=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if multicast_group is not None:
+        # more than one vehicle process on a host can join the same group
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    sock.bind(('', port))
+
+    if multicast_group is not None:
+        join_multicast_group(sock, multicast_group)
+
+    return sock
+
+
+def get_activated_socket(environ=None, fd=SD_LISTEN_FDS_START):
+    # the socket systemd bound for us (see systemd/), holding anything that arrived while we were starting
+    if environ is None:
+        environ = os.environ
+
+    if environ.get('LISTEN_PID') != str(os.getpid()) or int(environ.get('LISTEN_FDS', 0)) < 1:
+        return None
+
+    for key in ('LISTEN_PID', 'LISTEN_FDS', 'LISTEN_FDNAMES'):
+        environ.pop(key, None)
+
+    # fromfd duplicates the descriptor, so the original is closed rather than leaked
+    sock = socket.fromfd(fd, socket.AF_INET, socket.SOCK_DGRAM)
+    os.close(fd)
+
+    return sock
 
 
 class Subscriber(Thread):
-    def __init__(self, port, timeout):
+    def __init__(self, port, timeout, multicast_group=None, sock=None):
         super(Subscriber, self).__init__()
 
         self.port = port
         self.timeout = timeout
+        self.multicast_group = multicast_group
+
+        # an already bound socket (e.g. from get_activated_socket) can be handed over
+        if sock is None:
+            sock = bind_socket(self.port, self.multicast_group)
 
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind(('', self.port))
+        self.socket = sock
         self.socket.settimeout(self.timeout)
 
         self.stop_event = Event()
 
         self.receive_callback = None
 
+        self.sequence_tracker = SequenceTracker()
+        self.decoder = DeltaDecoder()
+
     def set_receive_callback(self, receive_callback):
         if not callable(receive_callback):
             raise TypeError('expected {} to be callable but it was not'.format(repr(receive_callback)))
 
         self.receive_callback = receive_callback
 
+    def get_stats(self):
+        stats = self.sequence_tracker.get_stats()
+        stats['missing_keyframes'] = self.decoder.missing_keyframes
+
+        return stats
+
+    def request_keyframe(self, addr):
+        if addr is None:
+            return
+
+        try:
+            self.socket.sendto(KEYFRAME_REQUEST, addr)
+        except socket.error:
+            pass
+
+    def decode(self, decoder, data, addr):
+        sequence, timestamp, state = decoder.decode(data)
+
+        # a delta against a keyframe we never got; ask for a fresh one rather than wait for the next
+        if state is None:
+            self.request_keyframe(addr)
+
+        return sequence, timestamp, state
+
+    def handle_datagram(self, data, addr=None):
+        sequence, timestamp, state = self.decode(self.decoder, data, addr)
+        if state is None or not self.sequence_tracker.accept(sequence, timestamp):
+            return None
+
+        if TRACER.enabled:
+            TRACER.mark(get_trace_id(state), RECEIVED)
+
+        return state
+
     def stop(self):
         self.stop_event.set()
 
@@ -31,9 +246,247 @@ class Subscriber(Thread):
         while not self.stop_event.is_set():
             try:
                 data, addr = self.socket.recvfrom(65536)
-                state = eval(data)
+                state = self.handle_datagram(data, addr)
+                if state is None:
+                    continue
+
                 self.receive_callback(state)
             except socket.timeout:
                 pass
             except Exception:
                 traceback.print_exc()
+
+
+class SharedMemorySubscriber(Thread):
+    # the other end of a SharedMemoryPublisher; same interface as Subscriber, but there's no socket, so it can't be
+    # driven by EventLoopRuntime; anything polling at its own rate can call read_latest() instead of starting it
+    def __init__(self, path=SHARED_MEMORY_PATH, poll_interval=SHARED_MEMORY_POLL_INTERVAL, sleep=time.sleep):
+        super(SharedMemorySubscriber, self).__init__()
+
+        self.path = path
+        self.poll_interval = poll_interval
+
+        self.sleep = sleep
+
+        # either end can start first; the slot reads as empty until the publisher writes to it
+        self.slot = SharedStateSlot(path, create=True)
+        self.last_counter = None
+
+        self.stop_event = Event()
+
+        self.receive_callback = None
+
+        self.sequence_tracker = SequenceTracker()
+
+        self.polls = 0
+
+    def set_receive_callback(self, receive_callback):
+        if not callable(receive_callback):
+            raise TypeError('expected {} to be callable but it was not'.format(repr(receive_callback)))
+
+        self.receive_callback = receive_callback
+
+    def get_stats(self):
+        stats = self.sequence_tracker.get_stats()
+        stats.update({
+            'polls': self.polls,
+            'torn_reads': self.slot.torn_reads,
+        })
+
+        return stats
+
+    def read_latest(self):
+        # the newest state, or None if there's been nothing new since the last call; no syscall either way
+        self.polls += 1
+
+        counter, fields = self.slot.read(self.last_counter)
+        if fields is None:
+            return None
+
+        self.last_counter = counter
+
+        # states the reader was too slow to see count as lost, same as they would over the network
+        sequence, timestamp, state = decode_fields(fields)
+        if not self.sequence_tracker.accept(sequence, timestamp):
+            return None
+
+        if TRACER.enabled:
+            TRACER.mark(get_trace_id(state), RECEIVED)
+
+        return state
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                state = self.read_latest()
+                if state is None:
+                    if self.poll_interval:
+                        self.sleep(self.poll_interval)
+
+                    continue
+
+                self.receive_callback(state)
+            except Exception:
+                traceback.print_exc()
+
+        self.slot.close()
+
+
+class Source(object):
+    def __init__(self, addr, priority=0, clock=monotonic):
+        self.addr = addr
+        self.priority = priority
+        self.clock = clock
+
+        self.sequence_tracker = SequenceTracker()
+        self.decoder = DeltaDecoder()
+
+        self.last_received_at = None
+        self.dropped = 0
+
+        self.window_started_at = None
+        self.window_count = 0
+        self.rate = 0.0
+
+    def is_active(self, now, source_timeout):
+        return self.last_received_at is not None and now - self.last_received_at <= source_timeout
+
+    def touch(self, now):
+        self.last_received_at = now
+
+        if self.window_started_at is None:
+            self.window_started_at = now
+            return
+
+        self.window_count += 1
+
+        elapsed = now - self.window_started_at
+        if elapsed >= RATE_WINDOW:
+            self.rate = self.window_count / elapsed
+            self.window_started_at = now
+            self.window_count = 0
+
+    def get_stats(self):
+        stats = self.sequence_tracker.get_stats()
+        stats.update({
+            'priority': self.priority,
+            'rate': self.rate,
+            'dropped': self.dropped,
+            'missing_keyframes': self.decoder.missing_keyframes,
+        })
+
+        return stats
+
+
+def parse_priority_by_host(args):
+    # every "--priority (host)=(priority)" in args
+    priority_by_host = {}
+
+    for i, arg in enumerate(args):
+        if arg != '--priority':
+            continue
+
+        value = args[i + 1] if i + 1 < len(args) else ''
+
+        host, _, priority = value.partition('=')
+        try:
+            priority_by_host[host] = int(priority)
+        except ValueError:
+            raise ValueError('expected host=priority but it was {}'.format(repr(value)))
+
+        if not host:
+            raise ValueError('expected host=priority but it was {}'.format(repr(value)))
+
+    return priority_by_host
+
+
+class MultiSourceSubscriber(Subscriber):
+    def __init__(self, port, timeout, policy=ARBITRATION_MOST_RECENT, priority_by_host=None,
+                 source_timeout=SOURCE_TIMEOUT, multicast_group=None, clock=monotonic, sock=None):
+        if policy not in ARBITRATION_POLICIES:
+            raise ValueError('expected policy to be one of {} but it was {}'.format(
+                repr(ARBITRATION_POLICIES), repr(policy)
+            ))
+
+        super(MultiSourceSubscriber, self).__init__(port, timeout, multicast_group=multicast_group, sock=sock)
+
+        self.policy = policy
+        self.priority_by_host = priority_by_host if priority_by_host is not None else {}
+        self.source_timeout = source_timeout
+        self.clock = clock
+
+        self.source_by_addr = {}
+        self.owner = None
+
+        self.conflicts = 0
+
+        self.lock = Lock()
+
+    def get_source(self, addr):
+        source = self.source_by_addr.get(addr)
+        if source is None:
+            if len(self.source_by_addr) >= MAX_SOURCES:
+                self.forget_inactive_sources()
+
+            source = Source(addr, self.priority_by_host.get(addr[0], 0), self.clock)
+            self.source_by_addr[addr] = source
+
+        return source
+
+    def forget_inactive_sources(self):
+        now = self.clock()
+
+        for addr, source in list(self.source_by_addr.items()):
+            if source is not self.owner and not source.is_active(now, self.source_timeout):
+                del self.source_by_addr[addr]
+
+    def claim(self, source, now):
+        owner = self.owner
+        if owner is None or owner is source or not owner.is_active(now, self.source_timeout):
+            return True
+
+        return self.policy == ARBITRATION_PRIORITY and source.priority > owner.priority
+
+    def handle_datagram(self, data, addr=None):
+        now = self.clock()
+
+        with self.lock:
+            source = self.get_source(addr)
+            source.touch(now)
+
+            # anyone who isn't going to get control is dropped before it costs a decode
+            if self.policy in (ARBITRATION_OWNER_LOCK, ARBITRATION_PRIORITY) and not self.claim(source, now):
+                source.dropped += 1
+                return None
+
+            sequence, timestamp, state = self.decode(source.decoder, data, addr)
+            if state is None or not source.sequence_tracker.accept(sequence, timestamp):
+                return None
+
+            # nobody drives while more than one source is talking
+            if self.policy == ARBITRATION_FAILSAFE:
+                for other in self.source_by_addr.values():
+                    if other is not source and other.is_active(now, self.source_timeout):
+                        self.conflicts += 1
+                        return CONFLICT_STATE
+
+            self.owner = source
+
+        if TRACER.enabled:
+            TRACER.mark(get_trace_id(state), RECEIVED)
+
+        return state
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'policy': self.policy,
+                'owner': '{}:{}'.format(*self.owner.addr) if self.owner is not None else None,
+                'conflicts': self.conflicts,
+                'sources': dict(
+                    ('{}:{}'.format(*addr), source.get_stats()) for addr, source in self.source_by_addr.items()
+                ),
+            }
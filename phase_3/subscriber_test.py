@@ -0,0 +1,264 @@
+import os
+import socket
+import unittest
+
+from protocol import encode_state, DeltaEncoder, KEYFRAME_REQUEST
+from subscriber import SequenceTracker, Subscriber, MultiSourceSubscriber, get_activated_socket, SOURCE_TIMEOUT, \
+    CONFLICT_STATE, ARBITRATION_MOST_RECENT, ARBITRATION_OWNER_LOCK, ARBITRATION_PRIORITY, ARBITRATION_FAILSAFE, \
+    parse_priority_by_host
+from state import State
+
+
+class SequenceTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.subject = SequenceTracker(window=8)
+
+    def accept_all(self, sequences, timestamp=1.0):
+        return [self.subject.accept(sequence, timestamp) for sequence in sequences]
+
+    def test_in_order(self):
+        self.assert_(self.accept_all([1, 2, 3]) == [True, True, True])
+        self.assert_(self.subject.get_stats() == {
+            'received': 3, 'accepted': 3, 'lost': 0, 'reordered': 0, 'duplicate': 0, 'restarts': 0,
+        })
+
+    def test_duplicate(self):
+        self.assert_(self.accept_all([1, 2, 2, 1]) == [True, True, False, False])
+        self.assert_(self.subject.duplicate == 2)
+
+    def test_loss_and_reorder(self):
+        self.assert_(self.accept_all([1, 4, 2, 5]) == [True, True, False, True])
+        self.assert_(self.subject.lost == 1)
+        self.assert_(self.subject.reordered == 1)
+
+    def test_wrap(self):
+        self.assert_(self.accept_all([2 ** 32 - 2, 2 ** 32 - 1, 0, 1]) == [True] * 4)
+        self.assert_(self.subject.lost == 0)
+
+    def test_unsequenced(self):
+        self.assert_(self.accept_all([None, None]) == [True, True])
+
+    def test_stale_beyond_window(self):
+        self.subject.accept(100, 10.0)
+
+        self.assert_(not self.subject.accept(50, 9.0))
+        self.assert_(self.subject.reordered == 1)
+
+    def test_restart(self):
+        self.subject.accept(100, 10.0)
+
+        self.assert_(self.subject.accept(1, 11.0))
+        self.assert_(self.subject.restarts == 1)
+        self.assert_(self.subject.accept(2, 11.02))
+
+    def test_restart_within_the_window(self):
+        self.subject.accept(30, 10.0)
+
+        self.assert_(self.accept_all(range(1, 31), timestamp=11.0) == [True] * 30)
+        self.assert_(self.subject.restarts == 1)
+        self.assert_(self.subject.lost == 0)
+
+    def test_restart_at_the_same_sequence(self):
+        self.subject.accept(5, 10.0)
+
+        self.assert_(not self.subject.accept(5, 10.0))
+        self.assert_(self.subject.accept(5, 11.0))
+        self.assert_(self.subject.restarts == 1)
+
+    def test_lost_is_never_negative(self):
+        # older than the first packet seen, so never counted as lost
+        self.assert_(self.accept_all([10, 9, 8]) == [True, False, False])
+        self.assert_(self.subject.lost == 0)
+        self.assert_(self.subject.reordered == 2)
+
+        # older than a restart
+        self.subject.accept(20, 2.0)
+        self.subject.accept(15, 3.0)
+        self.assert_(not self.subject.accept(14, 3.0))
+
+        self.assert_(self.subject.lost == 9)
+
+
+class FakeClock(object):
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+_STATE = State.from_dict({
+    'steering': 0.5,
+    'brake': -1.0,
+    'accelerator': 0.5,
+    'stop': False,
+    'record': False,
+    'play': False,
+})
+
+_DRIVER = ('10.0.0.1', 5000)
+_SPECTATOR = ('10.0.0.2', 5000)
+
+
+class MultiSourceSubscriberTest(unittest.TestCase):
+    def build(self, policy, **kwargs):
+        self.clock = FakeClock()
+        self.sequence_by_addr = {}
+
+        subject = MultiSourceSubscriber(port=0, timeout=0.1, policy=policy, clock=self.clock, **kwargs)
+        self.addCleanup(subject.socket.close)
+
+        return subject
+
+    def send(self, subject, addr, state=_STATE):
+        self.sequence_by_addr[addr] = self.sequence_by_addr.get(addr, 0) + 1
+
+        return subject.handle_datagram(encode_state(state, self.sequence_by_addr[addr], self.clock.now), addr)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, MultiSourceSubscriber, port=0, timeout=0.1, policy='loudest')
+
+    def test_most_recent_wins(self):
+        subject = self.build(ARBITRATION_MOST_RECENT)
+
+        self.assert_(self.send(subject, _DRIVER) == _STATE)
+        self.assert_(self.send(subject, _SPECTATOR, _STATE.replace(steering=-0.5)).steering == -0.5)
+
+    def test_sequences_are_tracked_per_source(self):
+        subject = self.build(ARBITRATION_MOST_RECENT)
+
+        # both senders start at sequence 1; neither should look like a duplicate of the other
+        self.assert_(self.send(subject, _DRIVER) is not None)
+        self.assert_(self.send(subject, _SPECTATOR) is not None)
+
+        sources = subject.get_stats()['sources']
+
+        self.assert_(sources['10.0.0.1:5000']['duplicate'] == 0)
+        self.assert_(sources['10.0.0.2:5000']['duplicate'] == 0)
+
+    def test_owner_lock(self):
+        subject = self.build(ARBITRATION_OWNER_LOCK)
+
+        self.assert_(self.send(subject, _DRIVER) is not None)
+        self.assert_(self.send(subject, _SPECTATOR) is None)
+        self.assert_(self.send(subject, _DRIVER) is not None)
+
+        # once the owner goes quiet anyone can take over
+        self.clock.now += SOURCE_TIMEOUT + 0.1
+        self.assert_(self.send(subject, _SPECTATOR) is not None)
+        self.assert_(self.send(subject, _DRIVER) is None)
+
+        stats = subject.get_stats()
+
+        self.assert_(stats['owner'] == '10.0.0.2:5000')
+        self.assert_(stats['sources']['10.0.0.1:5000']['dropped'] == 1)
+        self.assert_(stats['sources']['10.0.0.2:5000']['dropped'] == 1)
+
+    def test_priority(self):
+        subject = self.build(ARBITRATION_PRIORITY, priority_by_host={'10.0.0.2': 10})
+
+        self.assert_(self.send(subject, _DRIVER) is not None)
+        self.assert_(self.send(subject, _SPECTATOR) is not None)
+        self.assert_(self.send(subject, _DRIVER) is None)
+
+    def test_failsafe_on_conflict(self):
+        subject = self.build(ARBITRATION_FAILSAFE)
+
+        self.assert_(self.send(subject, _DRIVER) == _STATE)
+        self.assert_(self.send(subject, _SPECTATOR) == CONFLICT_STATE)
+        self.assert_(self.send(subject, _DRIVER) == CONFLICT_STATE)
+
+        self.clock.now += SOURCE_TIMEOUT + 0.1
+        self.assert_(self.send(subject, _DRIVER) == _STATE)
+
+        self.assert_(subject.get_stats()['conflicts'] == 2)
+
+    def test_rate(self):
+        subject = self.build(ARBITRATION_MOST_RECENT)
+
+        for _ in range(52):
+            self.send(subject, _DRIVER)
+            self.clock.now += 0.02
+
+        self.assert_(abs(subject.get_stats()['sources']['10.0.0.1:5000']['rate'] - 50.0) < 0.01)
+
+
+class ParsePriorityByHostTest(unittest.TestCase):
+    def test_parse(self):
+        args = ['vehicle.py', '--arbitration', 'priority', '--priority', '10.0.0.2=10', '--priority', '10.0.0.3=-1']
+
+        self.assert_(parse_priority_by_host(args) == {'10.0.0.2': 10, '10.0.0.3': -1})
+        self.assert_(parse_priority_by_host(['vehicle.py']) == {})
+
+    def test_parse_bad(self):
+        for value in ['10.0.0.2', '10.0.0.2=high', '=10']:
+            self.assertRaises(ValueError, parse_priority_by_host, ['--priority', value])
+
+        self.assertRaises(ValueError, parse_priority_by_host, ['--priority'])
+
+
+class SubscriberKeyframeTest(unittest.TestCase):
+    def setUp(self):
+        self.subject = Subscriber(port=0, timeout=0.1)
+        self.addCleanup(self.subject.socket.close)
+
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sender.bind(('127.0.0.1', 0))
+        self.sender.settimeout(1.0)
+        self.addCleanup(self.sender.close)
+
+    def test_missing_keyframe_is_requested(self):
+        encoder = DeltaEncoder()
+        encoder.encode(_STATE, 1)
+
+        state = self.subject.handle_datagram(encoder.encode(_STATE, 2), self.sender.getsockname())
+
+        self.assert_(state is None)
+        self.assert_(self.sender.recv(65536) == KEYFRAME_REQUEST)
+        self.assert_(self.subject.get_stats()['missing_keyframes'] == 1)
+
+    def test_delta_stream(self):
+        encoder = DeltaEncoder()
+
+        changed = _STATE.replace(steering=-0.5)
+
+        self.assert_(self.subject.handle_datagram(encoder.encode(_STATE, 1, 1.0)) == _STATE)
+        self.assert_(self.subject.handle_datagram(encoder.encode(changed, 2, 2.0)) == changed)
+
+
+class ActivatedSocketTest(unittest.TestCase):
+    def setUp(self):
+        self.bound = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.bound.bind(('127.0.0.1', 0))
+        self.addCleanup(self.bound.close)
+
+    def test_not_activated(self):
+        self.assert_(get_activated_socket({}) is None)
+        self.assert_(get_activated_socket({'LISTEN_PID': '1', 'LISTEN_FDS': '1'}) is None)
+
+    def test_activated(self):
+        fd = os.dup(self.bound.fileno())
+
+        environ = {'LISTEN_PID': str(os.getpid()), 'LISTEN_FDS': '1'}
+
+        sock = get_activated_socket(environ, fd)
+        self.addCleanup(sock.close)
+
+        self.assert_(sock.getsockname() == self.bound.getsockname())
+        self.assert_(environ == {})
+
+        # the descriptor systemd gave us has been handed over rather than left open
+        self.assertRaises(OSError, os.fstat, fd)
+
+    def test_subscriber_uses_the_given_socket(self):
+        subject = Subscriber(port=0, timeout=0.1, sock=self.bound)
+
+        self.assert_(subject.socket is self.bound)
+
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        sender.sendto(encode_state(_STATE, 1, 1.0), self.bound.getsockname())
+
+        data, addr = subject.socket.recvfrom(65536)
+
+        self.assert_(subject.handle_datagram(data, addr) == _STATE)
@@ -0,0 +1,81 @@
+import json
+import sys
+
+from stats import percentile
+from tracing import read_records, STAGES, STAGE_NAMES, EVENT_RECEIVED, PWM_WRITTEN
+
+PERCENTILES = (50, 90, 99)
+
+
+def load_traces(paths):
+    timestamp_by_stage_by_trace_id = {}
+
+    for path in paths:
+        for trace_id, stage, timestamp in read_records(path):
+            timestamp_by_stage = timestamp_by_stage_by_trace_id.setdefault(trace_id, {})
+
+            # a state is scheduled and sent many times; the first time is the one that matters
+            if stage not in timestamp_by_stage or timestamp < timestamp_by_stage[stage]:
+                timestamp_by_stage[stage] = timestamp
+
+    return timestamp_by_stage_by_trace_id
+
+
+def get_latencies(timestamp_by_stage_by_trace_id):
+    latencies_by_span = {}
+
+    for timestamp_by_stage in timestamp_by_stage_by_trace_id.values():
+        stages = [stage for stage in STAGES if stage in timestamp_by_stage]
+
+        for stage, next_stage in zip(stages, stages[1:]):
+            span = '{} -> {}'.format(STAGE_NAMES[stage], STAGE_NAMES[next_stage])
+            latencies_by_span.setdefault(span, []).append(
+                timestamp_by_stage[next_stage] - timestamp_by_stage[stage]
+            )
+
+        if EVENT_RECEIVED in timestamp_by_stage and PWM_WRITTEN in timestamp_by_stage:
+            span = '{} -> {}'.format(STAGE_NAMES[EVENT_RECEIVED], STAGE_NAMES[PWM_WRITTEN])
+            latencies_by_span.setdefault(span, []).append(
+                timestamp_by_stage[PWM_WRITTEN] - timestamp_by_stage[EVENT_RECEIVED]
+            )
+
+    return latencies_by_span
+
+
+def summarise(latencies_by_span):
+    summary = {}
+
+    for span, latencies in latencies_by_span.items():
+        summary[span] = {'count': len(latencies)}
+        for percent in PERCENTILES:
+            summary[span]['p{}'.format(percent)] = percentile(latencies, percent)
+
+    return summary
+
+
+def span_order(span):
+    names = [STAGE_NAMES[stage] for stage in STAGES]
+    first, last = [names.index(name) for name in span.split(' -> ')]
+
+    # pipeline order, with end to end last
+    return (first, last) == (0, len(names) - 1), first, last
+
+
+if __name__ == '__main__':
+    paths = [x for x in sys.argv[1:] if x != '--json']
+    if not paths:
+        print('usage: python trace_report.py [--json] (trace file) [(trace file) ...]')
+        sys.exit(1)
+
+    summary = summarise(get_latencies(load_traces(paths)))
+
+    if '--json' in sys.argv:
+        print(json.dumps(summary, indent=4, sort_keys=True))
+        sys.exit(0)
+
+    print('{:<32}{:>8}'.format('span', 'count') + ''.join('{:>12}'.format('p{} ms'.format(x)) for x in PERCENTILES))
+
+    for span in sorted(summary, key=span_order):
+        print('{:<32}{:>8}'.format(span, summary[span]['count']) + ''.join(
+            '{:>12.3f}'.format(summary[span]['p{}'.format(x)] * 1000) for x in PERCENTILES
+        ))
@@ -0,0 +1,103 @@
+import os
+import struct
+import time
+from threading import Lock
+
+TRACE_PATH_ENVIRONMENT_VARIABLE = 'PI_RC_CAR_TRACE_PATH'
+
+EVENT_RECEIVED = 1
+STATE_BUILT = 2
+SCHEDULED = 3
+SENT = 4
+RECEIVED = 5
+DEQUEUED = 6
+PWM_WRITTEN = 7
+
+STAGES = (EVENT_RECEIVED, STATE_BUILT, SCHEDULED, SENT, RECEIVED, DEQUEUED, PWM_WRITTEN)
+
+STAGE_NAMES = {
+    EVENT_RECEIVED: 'event_received',
+    STATE_BUILT: 'state_built',
+    SCHEDULED: 'scheduled',
+    SENT: 'sent',
+    RECEIVED: 'received',
+    DEQUEUED: 'dequeued',
+    PWM_WRITTEN: 'pwm_written',
+}
+
+# trace id, stage, timestamp (wall clock, so records from the controller and the vehicle line up)
+RECORD_FORMAT = struct.Struct('!IBd')
+
+TRACE_ID_MODULUS = 2 ** 32
+
+
+def get_trace_id(state):
+    if state is None:
+        return None
+
+    return state.get('trace_id')
+
+
+class Tracer(object):
+    def __init__(self, clock=time.time):
+        self.clock = clock
+
+        self.file = None
+        self.enabled = False
+
+        self.last_trace_id = 0
+
+        self.lock = Lock()
+
+    def enable(self, path):
+        with self.lock:
+            self.file = open(path, 'ab')
+            self.enabled = True
+
+    def disable(self):
+        with self.lock:
+            self.enabled = False
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def new_trace_id(self):
+        with self.lock:
+            # 0 means untraced on the wire
+            self.last_trace_id = (self.last_trace_id % (TRACE_ID_MODULUS - 1)) + 1
+
+            return self.last_trace_id
+
+    def mark(self, trace_id, stage, timestamp=None):
+        if not self.enabled or not trace_id:
+            return
+
+        if timestamp is None:
+            timestamp = self.clock()
+
+        with self.lock:
+            if self.file is not None:
+                self.file.write(RECORD_FORMAT.pack(trace_id, stage, timestamp))
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+
+TRACER = Tracer()
+
+
+def enable_from_environment():
+    path = os.environ.get(TRACE_PATH_ENVIRONMENT_VARIABLE)
+    if path:
+        TRACER.enable(path)
+
+
+def read_records(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # a partially written trailing record is ignored
+    for offset in range(0, len(data) - (len(data) % RECORD_FORMAT.size), RECORD_FORMAT.size):
+        yield RECORD_FORMAT.unpack_from(data, offset)
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock
+
+from trace_report import load_traces, get_latencies, summarise
+from tracing import Tracer, read_records, get_trace_id, EVENT_RECEIVED, STATE_BUILT, SENT, PWM_WRITTEN
+
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'trace')
+
+        self.clock = Mock()
+        self.clock.side_effect = [1.0, 1.5, 2.0, 2.5]
+
+        self.subject = Tracer(clock=self.clock)
+
+    def tearDown(self):
+        self.subject.disable()
+        shutil.rmtree(self.directory)
+
+    def test_get_trace_id(self):
+        self.assert_(get_trace_id(None) is None)
+        self.assert_(get_trace_id({'steering': 0.0}) is None)
+        self.assert_(get_trace_id({'steering': 0.0, 'trace_id': 1337}) == 1337)
+
+    def test_new_trace_id(self):
+        self.assert_([self.subject.new_trace_id() for _ in range(3)] == [1, 2, 3])
+
+    def test_mark_disabled(self):
+        self.subject.mark(1, EVENT_RECEIVED)
+
+        self.assert_(not os.path.exists(self.path))
+        self.assert_(self.clock.mock_calls == [])
+
+    def test_mark(self):
+        self.subject.enable(self.path)
+
+        self.subject.mark(1, EVENT_RECEIVED, 0.5)
+        self.subject.mark(1, STATE_BUILT)
+        self.subject.mark(None, SENT)
+        self.subject.mark(2, SENT)
+        self.subject.flush()
+
+        self.assert_(list(read_records(self.path)) == [
+            (1, EVENT_RECEIVED, 0.5),
+            (1, STATE_BUILT, 1.0),
+            (2, SENT, 1.5),
+        ])
+
+
+class TraceReportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_trace(self, name, records):
+        path = os.path.join(self.directory, name)
+
+        tracer = Tracer()
+        tracer.enable(path)
+        for trace_id, stage, timestamp in records:
+            tracer.mark(trace_id, stage, timestamp)
+        tracer.disable()
+
+        return path
+
+    def test_report(self):
+        controller_path = self.write_trace('controller', [
+            (1, EVENT_RECEIVED, 10.0),
+            (1, SENT, 10.25),
+            (1, SENT, 10.5),
+            (2, EVENT_RECEIVED, 11.0),
+            (2, SENT, 11.5),
+        ])
+
+        vehicle_path = self.write_trace('vehicle', [
+            (1, PWM_WRITTEN, 11.0),
+            (2, PWM_WRITTEN, 12.0),
+        ])
+
+        summary = summarise(get_latencies(load_traces([controller_path, vehicle_path])))
+
+        self.assert_(summary['event_received -> sent'] == {'count': 2, 'p50': 0.25, 'p90': 0.5, 'p99': 0.5})
+        self.assert_(summary['sent -> pwm_written']['p50'] == 0.5)
+        self.assert_(summary['event_received -> pwm_written']['p99'] == 1.0)
@@ -1,14 +1,15 @@
-import datetime
+import os
 import sys
-from Queue import Queue, Empty
+from Queue import Empty
 from threading import Thread, Event
 
-if sys.platform != 'linux2':
-    from mock import MagicMock
-
-    pigpio = MagicMock()
-else:
-    import pigpio
+from calibration import default_calibration
+from clock import monotonic
+from output import SoftwarePWMOutput
+from ring_buffer import RingBuffer
+from state import State, to_state
+from state_mailbox import Mailbox
+from tracing import TRACER, DEQUEUED, PWM_WRITTEN, get_trace_id
 
 STEERING_GPIO = 19
 THROTTLE_GPIO = 12
@@ -20,6 +21,27 @@ MAX_DUTY = 10.0
 
 TIMEOUT = (1.0 / FREQUENCY) * 10
 
+HISTORY_DURATION = 300.0
+
+# imported on first use (see get_pigpio) so that the socket can be bound before paying for it
+pigpio = None
+
+
+def get_pigpio():
+    global pigpio
+
+    if pigpio is None:
+        if sys.platform != 'linux2':
+            from mock import MagicMock
+
+            pigpio = MagicMock()
+        else:
+            import pigpio as pigpio_module
+
+            pigpio = pigpio_module
+
+    return pigpio
+
 
 def convert_ps4_value_to_duty_cycle_percent(value):
     return 10.0 - (((value - -1.0) * (MAX_DUTY - MIN_DUTY)) / (1.0 - -1.0))
@@ -37,8 +59,16 @@ def convert_duty_cycle_percent_to_8_bit(value):
     return (value / 100.0) * 255.0
 
 
+def silence_output():
+    # the vehicle prints every duty cycle change; that's not what a benchmark or simulation is after (anything meant
+    # to be seen is written to sys.__stdout__)
+    sys.stdout = open(os.devnull, 'w')
+
+
 class Vehicle(Thread):
-    def __init__(self, steering_gpio, throttle_gpio, frequency, min_duty, idle_duty, max_duty, timeout):
+    def __init__(self, steering_gpio, throttle_gpio, frequency, min_duty, idle_duty, max_duty, timeout,
+                 history_duration=HISTORY_DURATION, history_spill_path=None, clock=monotonic, calibration=None,
+                 output_class=SoftwarePWMOutput, watchdog_class=None, watchdog_timeout=None, pi=None):
         super(Vehicle, self).__init__()
 
         self.steering_gpio = steering_gpio
@@ -48,94 +78,184 @@ class Vehicle(Thread):
         self.idle_duty = idle_duty
         self.max_duty = max_duty
         self.timeout = timeout
+        self.clock = clock
+
+        if calibration is None:
+            # importing numpy costs far more at startup than it saves building two tables
+            calibration = default_calibration(self.min_duty, self.idle_duty, self.max_duty, use_numpy=False)
+
+        self.steering_calibration = calibration['steering']
+        self.throttle_calibration = calibration['throttle']
 
-        self.pi = pigpio.pi()
+        # anything with pigpio's interface can be handed over instead (e.g. a simulator.SimulatedPi)
+        self.pi = pi if pi is not None else get_pigpio().pi()
 
-        self.last_frequency_by_gpio = {}
-        self.last_duty_by_gpio = {}
+        self.output = output_class(self.pi)
 
         self.set_pwm(self.steering_gpio, self.frequency, self.idle_duty)
         self.set_pwm(self.throttle_gpio, self.frequency, self.idle_duty)
 
+        # idles the throttle if the control loop itself stops coming round (not just the commands); armed by the
+        # first state handled
+        self.watchdog = None
+        if watchdog_class is not None:
+            self.watchdog = watchdog_class(
+                self.output,
+                self.throttle_gpio,
+                self.frequency,
+                self.idle_duty,
+                watchdog_timeout if watchdog_timeout is not None else self.timeout * 2,
+            )
+
+        # idle PWM is set, so this is when the car is safe and ready for commands
+        self.armed_at = self.clock()
+        self.first_command_at = None
+
         self.stop_event = Event()
 
-        self.state_queue = Queue()
+        # only the newest state is kept; a burst after a stall collapses to the latest command
+        self.state_queue = Mailbox(clock=self.clock)
+        self.state_received_at = None
 
         self.record_state_history = False
         self.play_state_history = False
-        self.state_history = []
 
-    def set_pwm(self, gpio, frequency, duty):
-        duty = convert_duty_cycle_percent_to_8_bit(duty)
+        # (received time, state) pairs; states arrive at (up to) the PWM frequency, so that's what sizes the history
+        self.state_history = RingBuffer(
+            capacity=int(history_duration * frequency),
+            spill_path=history_spill_path,
+        )
+
+        self.playback = None
+        self.playback_started_at = None
+        self.playback_speed = 1.0
+        self.playback_offset = 0.0
 
-        last_frequency = self.last_frequency_by_gpio.get(gpio)
-        if last_frequency is None or last_frequency != frequency:
-            self.pi.set_PWM_frequency(gpio, frequency)
-            self.last_frequency_by_gpio[gpio] = frequency
+    def set_playback_speed(self, playback_speed):
+        if playback_speed <= 0:
+            raise ValueError('expected playback_speed to be positive but it was {}'.format(repr(playback_speed)))
 
-        last_duty = self.last_duty_by_gpio.get(gpio)
-        if last_duty is None or last_duty != duty:
-            self.pi.set_PWM_dutycycle(gpio, duty)
-            self.last_duty_by_gpio[gpio] = duty
+        self.playback_speed = playback_speed
+
+    def set_playback_offset(self, playback_offset):
+        if playback_offset < 0:
+            raise ValueError('expected playback_offset not to be negative but it was {}'.format(repr(playback_offset)))
+
+        self.playback_offset = playback_offset
+
+    def set_pwm(self, gpio, frequency, duty):
+        self.output.set(gpio, frequency, duty)
+
+    @staticmethod
+    def build_failsafe_state(last_state):
+        return State((
+            last_state.steering if last_state is not None else 0.0,
+            -1.0,
+            -1.0,
+            False,
+            False,
+            False,
+            0,
+        ))
+
+    def get_queue_timeout(self):
+        # playback has to keep stepping even if nothing is coming in
+        return min(self.timeout, 1.0 / self.frequency) if self.play_state_history else self.timeout
 
     def handle_queue(self, last_state):
         try:
-            return self.state_queue.get(timeout=self.timeout)
+            self.state_received_at, state = self.state_queue.get_with_put_time(timeout=self.get_queue_timeout())
+            if TRACER.enabled:
+                TRACER.mark(get_trace_id(state), DEQUEUED)
+
+            if self.first_command_at is None:
+                self.first_command_at = self.clock()
+                print '-- first command {:.3f}s after arming'.format(self.first_command_at - self.armed_at)
+
+            return state
         except Empty:
-            return {
-                'brake': -1.0,
-                'steering': last_state.get('steering') if last_state is not None else 0.0,
-                'accelerator': -1.0,
-                'stop': False,
-                'record': False,
-                'play': False,
-                'timestamp': datetime.datetime.now(),
-            }
+            return self.build_failsafe_state(last_state)
+
+    def start_playback(self):
+        from playback import Playback
+
+        self.playback = None
+
+        if len(self.state_history):
+            try:
+                # read from the history (and its spill file) as it plays, rather than copied out of it
+                self.playback = Playback(
+                    self.state_history,
+                    speed=self.playback_speed,
+                    offset=self.playback_offset,
+                )
+            except ValueError:
+                print '-- offset beyond end of recording'
+
+        self.playback_started_at = self.clock()
 
     def iterate(self, last_state):
-        state = self.handle_queue(last_state)
+        return self.handle_state(self.handle_queue(last_state), last_state)
+
+    def handle_state(self, state, last_state):
+        if self.watchdog is not None:
+            self.watchdog.feed()
+
+        received_at, self.state_received_at = self.state_received_at, None
+        if received_at is None:
+            received_at = self.clock()
+
+        state = to_state(state)
+
         if state is not None:
-            stop = state.get('stop', False)
-            record = state.get('record', False)
-            play = state.get('play', False)
+            stop = state.stop
+            record = state.record
+            play = state.play
 
             if stop and (self.record_state_history or self.play_state_history):
                 print '-- stopped'
                 self.record_state_history = False
+                self.state_queue.retain_superseded = False
                 self.play_state_history = False
             elif record and not self.record_state_history:
                 print '-- recording'
                 self.record_state_history = True
-                self.state_history = []
+                self.state_queue.retain_superseded = True
+                self.state_queue.take_superseded()
+                self.state_history.clear()
             elif play and not (self.record_state_history or self.play_state_history):
                 print '-- playing'
                 self.play_state_history = True
+                self.start_playback()
 
         if self.record_state_history:
-            self.state_history += [state]
+            # states the control loop skipped over still belong in the recording
+            for superseded in self.state_queue.take_superseded():
+                self.state_history.append(superseded)
+
+            self.state_history.append((received_at, state))
         elif self.play_state_history:
-            try:
-                state = self.state_history.pop(0)
-            except IndexError:
+            # driven by the recorded timestamps rather than by how often we get here
+            played_state = None
+            if self.playback is not None:
+                played_state = self.playback.state_at(self.clock() - self.playback_started_at)
+
+            if played_state is None:
                 print '-- finished'
                 self.play_state_history = False
+            else:
+                state = played_state
 
-        if state is None or None in state.values() or state == last_state:
+        if state is None or not state.is_complete() or state == last_state:
             return last_state
 
-        # invert the steering
-        steering = state['steering']
-        if steering < 0:
-            steering = 2 - (steering + 2)
-        elif steering > 0:
-            steering = -2 - (steering - 2)
+        # steering inversion, deadzone, expo and endpoints are all baked into the tables
+        steering_duty_cycle = self.steering_calibration.lookup(state.steering)
 
-        steering_duty_cycle = convert_ps4_value_to_duty_cycle_percent(steering)
-
-        throttle_duty_cycle = convert_ps4_value_to_duty_cycle_percent(
+        throttle_duty_cycle = self.throttle_calibration.lookup(
             combine_brake_and_accelerator(
-                state['brake'],
-                state['accelerator'],
+                state.brake,
+                state.accelerator,
             )
         )
 
@@ -149,8 +269,15 @@ class Vehicle(Thread):
         self.set_pwm(self.steering_gpio, self.frequency, steering_duty_cycle)
         self.set_pwm(self.throttle_gpio, self.frequency, throttle_duty_cycle)
 
+        if TRACER.enabled:
+            TRACER.mark(get_trace_id(state), PWM_WRITTEN)
+
         return state
 
+    def disarm_watchdog(self):
+        if self.watchdog is not None:
+            self.watchdog.disarm()
+
     def add_state_event(self, state):
         self.state_queue.put(state)
 
@@ -166,8 +293,57 @@ class Vehicle(Thread):
 
 
 if __name__ == '__main__':
+    from clock import process_age
+
+    # from when the process started, so interpreter startup and imports count too
+    started_at = monotonic() - (process_age() or 0.0)
+
+    from subscriber import Subscriber, bind_socket, get_activated_socket, join_multicast_group
+
+    multicast_group = sys.argv[sys.argv.index('--multicast') + 1] if '--multicast' in sys.argv else None
+
+    # a controller on this host started with "shm:(path)" writes states to path rather than sending them
+    shared_memory_path = sys.argv[sys.argv.index('--shm') + 1] if '--shm' in sys.argv else None
+
+    # bound before anything slow, so commands sent while we start up are queued rather than dropped
+    sock = None
+    socket_activated = False
+    if shared_memory_path is None:
+        sock = get_activated_socket()
+        socket_activated = sock is not None
+        if sock is None:
+            sock = bind_socket(13337, multicast_group)
+        elif multicast_group is not None:
+            join_multicast_group(sock, multicast_group)
+
+    bound_at = monotonic()
+
     import time
-    from subscriber import Subscriber
+    from tracing import enable_from_environment
+
+    enable_from_environment()
+
+    calibration = None
+    if '--calibration' in sys.argv:
+        from calibration import load_calibration
+
+        calibration = load_calibration(sys.argv[sys.argv.index('--calibration') + 1], use_numpy=False)
+
+    output_class = SoftwarePWMOutput
+    if '--hardware-pwm' in sys.argv:
+        from output import HardwarePWMOutput
+
+        output_class = HardwarePWMOutput
+
+    watchdog_class = None
+    if '--watchdog' in sys.argv:
+        import failsafe
+
+        # "script" runs the watchdog inside pigpiod, "thread" on a thread of our own
+        watchdog_class = {
+            'script': failsafe.ScriptWatchdog,
+            'thread': failsafe.ThreadWatchdog,
+        }[sys.argv[sys.argv.index('--watchdog') + 1]]
 
     vehicle = Vehicle(
         STEERING_GPIO,
@@ -176,28 +352,87 @@ if __name__ == '__main__':
         MIN_DUTY,
         IDLE_DUTY,
         MAX_DUTY,
-        TIMEOUT
+        TIMEOUT,
+        calibration=calibration,
+        output_class=output_class,
+        watchdog_class=watchdog_class,
     )
-    vehicle.start()
 
-    subscriber = Subscriber(
-        port=13337,
-        timeout=TIMEOUT * 2,
-    )
-    subscriber.start()
+    print '-- armed {:.3f}s after start'.format(vehicle.armed_at - started_at)
 
-    subscriber.set_receive_callback(vehicle.add_state_event)
+    if shared_memory_path is not None:
+        from subscriber import SharedMemorySubscriber
+
+        subscriber = SharedMemorySubscriber(path=shared_memory_path)
+    elif '--arbitration' in sys.argv:
+        from subscriber import MultiSourceSubscriber, parse_priority_by_host
+
+        subscriber = MultiSourceSubscriber(
+            port=13337,
+            timeout=TIMEOUT * 2,
+            policy=sys.argv[sys.argv.index('--arbitration') + 1],
+            priority_by_host=parse_priority_by_host(sys.argv),
+            multicast_group=multicast_group,
+            sock=sock,
+        )
+    else:
+        subscriber = Subscriber(
+            port=13337,
+            timeout=TIMEOUT * 2,
+            multicast_group=multicast_group,
+            sock=sock,
+        )
+
+    if '--priority' in sys.argv and ('--arbitration' not in sys.argv or shared_memory_path is not None):
+        print '-- priorities only apply with --arbitration, ignoring --priority'
+
+    if '--event-loop' in sys.argv and shared_memory_path is not None:
+        print '-- no socket to wait on with --shm, ignoring --event-loop'
+
+    if '--event-loop' in sys.argv and shared_memory_path is None:
+        from runtime import EventLoopRuntime
+
+        runtime = EventLoopRuntime(vehicle, subscriber)
 
-    while 1:
         try:
-            time.sleep(1)
+            runtime.run()
         except KeyboardInterrupt:
-            break
+            pass
+    else:
+        vehicle.start()
+
+        subscriber.start()
 
-    subscriber.stop()
-    subscriber.join()
+        subscriber.set_receive_callback(vehicle.add_state_event)
+
+        while 1:
+            try:
+                time.sleep(1)
+            except KeyboardInterrupt:
+                break
+
+        subscriber.stop()
+        subscriber.join()
+
+        vehicle.stop()
+        vehicle.join()
+
+    print(repr(subscriber.get_stats()))
 
     print(repr(vehicle))
+    print(repr(vehicle.state_queue.get_stats()))
+    print(repr(vehicle.output.get_stats()))
+
+    if vehicle.watchdog is not None:
+        print(repr(vehicle.watchdog.get_stats()))
+
+    print(repr({
+        'socket_activated': socket_activated,
+        'bound': bound_at - started_at,
+        'armed': vehicle.armed_at - started_at,
+        'first_command': (vehicle.first_command_at - started_at) if vehicle.first_command_at is not None else None,
+    }))
+
+    vehicle.disarm_watchdog()
 
-    vehicle.stop()
-    vehicle.join()
+    TRACER.flush()
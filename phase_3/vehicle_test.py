@@ -1,11 +1,13 @@
-import copy
 import unittest
 
 from mock import patch, call, Mock
 
+import fake_pigpio
+
 from vehicle import convert_ps4_value_to_duty_cycle_percent, combine_brake_and_accelerator, \
     convert_duty_cycle_percent_to_8_bit, Vehicle, STEERING_GPIO, THROTTLE_GPIO, FREQUENCY, MIN_DUTY, IDLE_DUTY, \
     MAX_DUTY, TIMEOUT
+from state import State
 
 
 class HelperFunctionTest(unittest.TestCase):
@@ -21,19 +23,23 @@ class HelperFunctionTest(unittest.TestCase):
         self.assert_(convert_duty_cycle_percent_to_8_bit(50) == 127.5)
 
 
-_TEST_STATE = {
+_TEST_STATE = State.from_dict({
     'brake': 0.0,
     'steering': 0.13,
     'accelerator': 1.0,
-    'handbrake': False
-}
+    'stop': False,
+    'record': False,
+    'play': False,
+})
 
-_TEST_SAFE_STATE = {
+_TEST_SAFE_STATE = State.from_dict({
     'brake': -1.0,
     'steering': 0.13,
     'accelerator': -1.0,
-    'handbrake': True,
-}
+    'stop': False,
+    'record': False,
+    'play': False,
+})
 
 
 class VehicleTest(unittest.TestCase):
@@ -51,32 +57,30 @@ class VehicleTest(unittest.TestCase):
 
         self.assert_(pigpio.mock_calls == [
             call.pi(),
-            call.pi().set_PWM_frequency(12, 50.0),
-            call.pi().set_PWM_dutycycle(12, convert_duty_cycle_percent_to_8_bit(7.5)),
             call.pi().set_PWM_frequency(19, 50.0),
-            call.pi().set_PWM_dutycycle(19, convert_duty_cycle_percent_to_8_bit(7.5)),
+            call.pi().set_PWM_dutycycle(19, 19),
+            call.pi().set_PWM_frequency(12, 50.0),
+            call.pi().set_PWM_dutycycle(12, 19),
         ])
 
         self.subject.pi.mock_calls = []
 
     def test_set_pwm(self):
-        self.subject.set_pwm(STEERING_GPIO, 49, 7.6)
-        self.subject.set_pwm(STEERING_GPIO, 49, 7.6)
+        self.subject.set_pwm(STEERING_GPIO, 49, 8.0)
+        self.subject.set_pwm(STEERING_GPIO, 49, 8.0)
 
         # note- two calls to set_pwm, only one call to the library
         self.assert_(
             self.subject.pi.mock_calls == [
-                call.set_PWM_frequency(12, 49),
-                call.set_PWM_dutycycle(12, 19.38)
+                call.set_PWM_frequency(19, 49),
+                call.set_PWM_dutycycle(19, 20)
             ]
         )
 
     def test_handle_queue(self):
         self.subject.state_queue.put(_TEST_STATE)
 
-        last_state = copy.deepcopy(_TEST_STATE)
-
-        state = self.subject.handle_queue(last_state)
+        state = self.subject.handle_queue(_TEST_STATE)
         self.assert_(state == _TEST_STATE)
 
         state = self.subject.handle_queue(state)
@@ -87,16 +91,15 @@ class VehicleTest(unittest.TestCase):
         self.subject.handle_queue.return_value = _TEST_STATE
         self.subject.set_pwm = Mock()
 
-        last_state = copy.deepcopy(_TEST_STATE)
-        last_state['handbrake'] = True
+        last_state = _TEST_STATE.replace(stop=True)
 
         state = self.subject.iterate(last_state)
 
         self.assert_(state == _TEST_STATE)
 
         self.assert_(self.subject.set_pwm.mock_calls == [
-            call(12, 50.0, 7.824999999999999),
-            call(19, 50.0, 6.25)
+            call(19, 50.0, 7.824999999999999),
+            call(12, 50.0, 6.25)
         ])
 
     def test_stop(self):
@@ -113,3 +116,48 @@ class VehicleTest(unittest.TestCase):
         self.subject.run(test_mode=True)
 
         self.assert_(self.subject.iterate.mock_calls == [call(None)])
+
+
+class VehicleStartupTest(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('vehicle.pigpio', fake_pigpio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        import vehicle
+
+        self.subject = vehicle.Vehicle(
+            vehicle.STEERING_GPIO,
+            vehicle.THROTTLE_GPIO,
+            vehicle.FREQUENCY,
+            vehicle.MIN_DUTY,
+            vehicle.IDLE_DUTY,
+            vehicle.MAX_DUTY,
+            vehicle.TIMEOUT,
+        )
+
+        self.vehicle = vehicle
+
+    def test_armed_with_idle_pwm(self):
+        idle = self.subject.output.quantize(self.vehicle.IDLE_DUTY)
+
+        self.assert_(self.subject.armed_at is not None)
+        self.assert_(self.subject.pi.duty_by_gpio[self.vehicle.THROTTLE_GPIO] == idle)
+        self.assert_(self.subject.pi.duty_by_gpio[self.vehicle.STEERING_GPIO] == idle)
+
+    def test_first_command(self):
+        self.subject.handle_queue(None)
+
+        # a failsafe timeout isn't a command
+        self.assert_(self.subject.first_command_at is None)
+
+        self.subject.add_state_event({'steering': 0.0})
+        self.subject.handle_queue(None)
+
+        first_command_at = self.subject.first_command_at
+        self.assert_(first_command_at >= self.subject.armed_at)
+
+        self.subject.add_state_event({'steering': 0.0})
+        self.subject.handle_queue(None)
+
+        self.assert_(self.subject.first_command_at == first_command_at)
@@ -0,0 +1 @@
+../phase_3/clock.py
\ No newline at end of file
@@ -0,0 +1,302 @@
+import heapq
+import itertools
+import select
+import socket
+import traceback
+from threading import Thread, Event, Lock
+
+from clock import monotonic
+
+# safety commands jump ahead of anything queued and cut off whatever is waiting for a response
+PRIORITY_EMERGENCY = 0
+PRIORITY_SAFETY = 1
+PRIORITY_NORMAL = 2
+
+PRIORITY_BY_COMMAND = {
+    'emergency': PRIORITY_EMERGENCY,
+    'land': PRIORITY_SAFETY,
+}
+
+COMMAND_TIMEOUT = 1.0
+COMMAND_RETRIES = 3
+
+# how long the channel sleeps when there's nothing in flight (a queued command wakes it sooner)
+IDLE_TIMEOUT = 0.1
+
+
+class Command(object):
+    def __init__(self, text, priority=PRIORITY_NORMAL, retries=COMMAND_RETRIES, callback=None):
+        self.text = text
+        self.priority = priority
+        self.retries = retries
+        self.callback = callback
+
+        self.attempts = 0
+        self.sent_at = None
+
+        self.response = None
+        self.ok = None
+        self.error = None
+
+        self.done_event = Event()
+
+    def __repr__(self):
+        return 'Command({}, ok={}, response={}, error={})'.format(
+            repr(self.text), repr(self.ok), repr(self.response), repr(self.error)
+        )
+
+    def finish(self, ok, response=None, error=None):
+        self.ok = ok
+        self.response = response
+        self.error = error
+
+        self.done_event.set()
+
+        if self.callback is not None:
+            try:
+                self.callback(self)
+            except Exception:
+                traceback.print_exc()
+
+    def wait(self, timeout=None):
+        return self.done_event.wait(timeout)
+
+
+class CommandChannel(Thread):
+    def __init__(self, host='192.168.10.1', port=8889, listen_port=9000, timeout=COMMAND_TIMEOUT,
+                 retries=COMMAND_RETRIES, clock=monotonic):
+        super(CommandChannel, self).__init__()
+
+        self.daemon = True
+
+        self.address = (host, port)
+        self.timeout = timeout
+        self.retries = retries
+        self.clock = clock
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('', listen_port))
+        self.socket.setblocking(False)
+
+        # written to when something is queued so the select wakes straight away
+        self.wake_receiver, self.wake_sender = socket.socketpair()
+        self.wake_receiver.setblocking(False)
+
+        # a heap of (priority, order, command), so equal priorities go in the order they were sent
+        self.queue_lock = Lock()
+        self.queue = []
+        self.order = itertools.count()
+
+        self.in_flight = None
+
+        # when each response still to come for an earlier command (preempted, timed out, or answered while a retry was
+        # out) stops being expected; they arrive ahead of the response to whatever's in flight now
+        self.owed_responses = []
+
+        # rc commands get no response and only the latest one matters
+        self.rc_lock = Lock()
+        self.pending_rc = None
+
+        self.stop_event = Event()
+
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.retried = 0
+        self.preempted = 0
+        self.discarded = 0
+        self.unmatched = 0
+        self.rc_sent = 0
+        self.rc_coalesced = 0
+
+    def wake(self):
+        try:
+            self.wake_sender.send(b'\x00')
+        except socket.error:
+            pass
+
+    def send_command(self, text, callback=None, retries=None):
+        command = Command(
+            text,
+            priority=PRIORITY_BY_COMMAND.get(text, PRIORITY_NORMAL),
+            retries=self.retries if retries is None else retries,
+            callback=callback,
+        )
+
+        with self.queue_lock:
+            heapq.heappush(self.queue, (command.priority, next(self.order), command))
+
+        self.wake()
+
+        return command
+
+    def send_rc(self, roll, pitch, throttle, yaw):
+        with self.rc_lock:
+            if self.pending_rc is not None:
+                self.rc_coalesced += 1
+
+            self.pending_rc = 'rc {} {} {} {}'.format(roll, pitch, throttle, yaw)
+
+        self.wake()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake()
+
+    def get_stats(self):
+        return {
+            'sent': self.sent,
+            'acked': self.acked,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'retried': self.retried,
+            'preempted': self.preempted,
+            'discarded': self.discarded,
+            'unmatched': self.unmatched,
+            'rc_sent': self.rc_sent,
+            'rc_coalesced': self.rc_coalesced,
+        }
+
+    def transmit(self, text):
+        try:
+            self.socket.sendto(text.encode('ascii'), self.address)
+        except socket.error:
+            traceback.print_exc()
+
+    def send_next(self):
+        in_flight = self.in_flight
+
+        with self.queue_lock:
+            if not self.queue:
+                return
+
+            # anything not urgent enough to cut in waits for the response
+            if in_flight is not None and self.queue[0][0] >= in_flight.priority:
+                return
+
+            _, _, command = heapq.heappop(self.queue)
+
+        if in_flight is not None:
+            # the drone answers in order with no ids, so a response now would be ambiguous
+            self.preempted += 1
+            self.owe_responses(in_flight.attempts)
+            in_flight.finish(False, error='preempted by {}'.format(repr(command.text)))
+
+        if command.priority < PRIORITY_NORMAL:
+            with self.rc_lock:
+                self.pending_rc = None
+
+        self.in_flight = command
+        self.send_in_flight()
+
+    def owe_responses(self, count):
+        expires_at = self.clock() + (self.timeout * (self.retries + 1))
+
+        self.owed_responses.extend([expires_at] * count)
+
+    def send_in_flight(self):
+        command = self.in_flight
+
+        command.attempts += 1
+        command.sent_at = self.clock()
+
+        self.transmit(command.text)
+        self.sent += 1
+
+    def handle_response(self, data):
+        response = data.decode('ascii', 'replace').strip()
+
+        now = self.clock()
+
+        # one that's taken longer than every retry put together isn't coming
+        self.owed_responses = [x for x in self.owed_responses if x > now]
+
+        if self.owed_responses:
+            self.owed_responses.pop(0)
+            self.discarded += 1
+            return
+
+        command = self.in_flight
+        if command is None:
+            self.unmatched += 1
+            return
+
+        self.in_flight = None
+
+        # the drone answers every attempt, so if this answers one of them the rest are still to come
+        self.owe_responses(command.attempts - 1)
+
+        if response.startswith('error'):
+            self.errors += 1
+            command.finish(False, response=response, error=response)
+        else:
+            self.acked += 1
+            command.finish(True, response=response)
+
+    def handle_timeout(self, now):
+        command = self.in_flight
+        if command is None or now - command.sent_at < self.timeout:
+            return
+
+        if command.attempts <= command.retries:
+            self.retried += 1
+            self.send_in_flight()
+            return
+
+        self.timeouts += 1
+        self.in_flight = None
+        self.owe_responses(command.attempts)
+        command.finish(False, error='no response after {} attempts'.format(command.attempts))
+
+    def send_pending_rc(self):
+        with self.rc_lock:
+            rc, self.pending_rc = self.pending_rc, None
+
+        if rc is None:
+            return
+
+        self.transmit(rc)
+        self.rc_sent += 1
+
+    def iterate(self):
+        if self.in_flight is not None:
+            timeout = max(0.0, self.in_flight.sent_at + self.timeout - self.clock())
+        else:
+            timeout = IDLE_TIMEOUT
+
+        readable, _, _ = select.select([self.socket, self.wake_receiver], [], [], timeout)
+
+        if self.wake_receiver in readable:
+            try:
+                while self.wake_receiver.recv(4096):
+                    pass
+            except socket.error:
+                pass
+
+        if self.socket in readable:
+            while 1:
+                try:
+                    data, _ = self.socket.recvfrom(4096)
+                except socket.error:
+                    break
+
+                self.handle_response(data)
+
+        self.handle_timeout(self.clock())
+
+        self.send_next()
+
+        self.send_pending_rc()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.iterate()
+            except Exception:
+                traceback.print_exc()
+
+    def close(self):
+        self.socket.close()
+        self.wake_receiver.close()
+        self.wake_sender.close()
@@ -0,0 +1,211 @@
+import time
+import unittest
+
+from command_channel import CommandChannel, Command, PRIORITY_EMERGENCY, PRIORITY_SAFETY, PRIORITY_NORMAL
+from emulator import TelloEmulator
+
+
+class CommandChannelTest(unittest.TestCase):
+    def build(self, timeout=0.1, **kwargs):
+        self.emulator = TelloEmulator(**kwargs)
+        self.emulator.start()
+
+        self.subject = CommandChannel(
+            host=self.emulator.address[0],
+            port=self.emulator.address[1],
+            listen_port=0,
+            timeout=timeout,
+            retries=2,
+        )
+
+        self.addCleanup(self.tear_down)
+
+    def tear_down(self):
+        if self.subject.is_alive():
+            self.subject.stop()
+            self.subject.join()
+
+        self.subject.close()
+
+        self.emulator.stop()
+        self.emulator.join()
+
+    def test_ack(self):
+        self.build()
+        self.subject.start()
+
+        command = self.subject.send_command('command')
+
+        self.assert_(command.wait(1.0))
+        self.assert_(command.ok)
+        self.assert_(command.response == 'ok')
+        self.assert_(self.subject.get_stats()['acked'] == 1)
+
+    def test_response_value(self):
+        self.build()
+        self.subject.start()
+
+        command = self.subject.send_command('battery?')
+
+        self.assert_(command.wait(1.0))
+        self.assert_(command.response == '87')
+
+    def test_error(self):
+        self.build()
+        self.subject.start()
+
+        command = self.subject.send_command('barrel roll')
+
+        self.assert_(command.wait(1.0))
+        self.assert_(not command.ok)
+        self.assert_(command.error == 'error')
+        self.assert_(self.subject.get_stats()['errors'] == 1)
+
+    def test_retry(self):
+        self.build(drop_responses=1)
+        self.subject.start()
+
+        command = self.subject.send_command('command')
+
+        self.assert_(command.wait(1.0))
+        self.assert_(command.ok)
+        self.assert_(command.attempts == 2)
+        self.assert_(self.emulator.get_commands() == ['command', 'command'])
+
+    def test_timeout(self):
+        self.build(drop_responses=10)
+        self.subject.start()
+
+        command = self.subject.send_command('command')
+
+        self.assert_(command.wait(1.0))
+        self.assert_(not command.ok)
+        self.assert_(command.attempts == 3)
+        self.assert_(self.subject.get_stats()['timeouts'] == 1)
+
+    def test_commands_are_sent_one_at_a_time_in_order(self):
+        self.build(response_delay=0.02)
+        self.subject.start()
+
+        commands = [self.subject.send_command(text) for text in ['command', 'streamon', 'takeoff']]
+
+        for command in commands:
+            self.assert_(command.wait(1.0))
+            self.assert_(command.ok)
+
+        self.assert_(self.emulator.get_commands() == ['command', 'streamon', 'takeoff'])
+
+    def test_priorities(self):
+        self.build()
+
+        self.assert_(self.subject.send_command('takeoff').priority == PRIORITY_NORMAL)
+        self.assert_(self.subject.send_command('land').priority == PRIORITY_SAFETY)
+        self.assert_(self.subject.send_command('emergency').priority == PRIORITY_EMERGENCY)
+
+    def test_safety_command_jumps_the_queue(self):
+        self.build()
+
+        # queued up before the channel gets a look in
+        normal = [self.subject.send_command(text) for text in ['command', 'streamon', 'takeoff']]
+        land = self.subject.send_command('land')
+
+        self.subject.start()
+
+        self.assert_(land.wait(1.0))
+        for command in normal:
+            self.assert_(command.wait(1.0))
+
+        self.assert_(self.emulator.get_commands() == ['land', 'command', 'streamon', 'takeoff'])
+
+    def test_safety_command_preempts_the_command_in_flight(self):
+        self.build(drop_responses=10)
+        self.subject.start()
+
+        takeoff = self.subject.send_command('takeoff')
+        time.sleep(0.02)
+
+        self.emulator.drop_responses = 0
+        land = self.subject.send_command('land')
+
+        self.assert_(takeoff.wait(1.0))
+        self.assert_(not takeoff.ok)
+        self.assert_(takeoff.error == "preempted by 'land'")
+
+        self.assert_(land.wait(1.0))
+        self.assert_(land.ok)
+
+    def test_late_response_to_a_preempted_command_is_discarded(self):
+        # long enough a timeout that nothing is retried, so the only responses are takeoff's and then land's
+        self.build(timeout=1.0, response_delay=0.2, response_by_command={'land': 'error'})
+        self.subject.start()
+
+        takeoff = self.subject.send_command('takeoff')
+        time.sleep(0.02)
+
+        land = self.subject.send_command('land')
+
+        self.assert_(land.wait(1.0))
+        self.assert_(not land.ok)
+        self.assert_(land.error == 'error')
+
+        self.assert_(takeoff.error == "preempted by 'land'")
+        self.assert_(self.emulator.get_commands() == ['takeoff', 'land'])
+
+        stats = self.subject.get_stats()
+        self.assert_(stats['discarded'] == 1)
+        self.assert_(stats['unmatched'] == 0)
+
+    def test_late_response_to_a_retried_command_is_discarded(self):
+        # the first response turns up after the retry has gone, so there's a second one on its way
+        self.build(response_delay=0.15, response_by_command={'streamon': 'error'})
+        self.subject.start()
+
+        command = self.subject.send_command('command')
+        streamon = self.subject.send_command('streamon', retries=10)
+
+        self.assert_(command.wait(1.0))
+        self.assert_(command.ok)
+        self.assert_(command.attempts == 2)
+
+        self.assert_(streamon.wait(1.0))
+        self.assert_(not streamon.ok)
+        self.assert_(streamon.error == 'error')
+
+        self.assert_(self.subject.get_stats()['discarded'] >= 1)
+
+    def test_rc_is_coalesced(self):
+        self.build()
+
+        for i in range(5):
+            self.subject.send_rc(i, 0, 0, 0)
+
+        self.subject.start()
+
+        deadline = time.time() + 1.0
+        while not self.emulator.get_rc_commands() and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assert_(self.emulator.get_rc_commands() == ['rc 4 0 0 0'])
+        self.assert_(self.subject.get_stats()['rc_coalesced'] == 4)
+
+    def test_safety_command_drops_pending_rc(self):
+        self.build()
+
+        self.subject.send_rc(1, 2, 3, 4)
+        land = self.subject.send_command('land')
+
+        self.subject.start()
+
+        self.assert_(land.wait(1.0))
+        self.assert_(self.emulator.get_rc_commands() == [])
+
+
+class CommandTest(unittest.TestCase):
+    def test_callback(self):
+        finished = []
+
+        command = Command('command', callback=finished.append)
+        command.finish(True, response='ok')
+
+        self.assert_(finished == [command])
+        self.assert_(command.wait(0))
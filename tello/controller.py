@@ -1,15 +1,29 @@
+import os
 import time
 import traceback
 
 import pygame
 
+from controller_profile import load_profile
 from tello import Tello
 
 DEBOUNCE_PERIOD = 1.0 / 20.0
 
+PROFILE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+# what a profile can drive, in the order Tello.send wants them
+PROFILE_OUTPUTS = ('combined_throttle', 'pitch', 'roll', 'yaw')
+
+
+def load_controller_profile(name_or_path='ps4'):
+    return load_profile(name_or_path, PROFILE_OUTPUTS, PROFILE_DIRECTORY)
+
+
+DEFAULT_PROFILE = load_controller_profile()
+
 
 class Controller(object):
-    def __init__(self, state_change_callback=None):
+    def __init__(self, state_change_callback=None, profile=DEFAULT_PROFILE):
         pygame.init()
         pygame.joystick.init()
 
@@ -21,6 +35,8 @@ class Controller(object):
         if state_change_callback is not None:
             self.set_state_change_callback(state_change_callback)
 
+        self.profile = profile
+
     def set_state_change_callback(self, state_change_callback):
         if not callable(state_change_callback):
             raise TypeError('expected {} to be callable but it was not'.format(repr(state_change_callback)))
@@ -54,47 +70,9 @@ class Controller(object):
         return axis_data, button_data, hat_data
 
     @staticmethod
-    def get_state(axis_data, button_data, hat_data):
-        if axis_data is not None:
-            for i in range(0, 4):
-                axis_value = axis_data.get(i)
-                if axis_value is None:
-                    continue
-
-                # handle stick deadzones
-                if -0.04 <= axis_value <= 0.04:
-                    axis_data[i] = 0
-
-        throttle = axis_data.get(5)
-        if throttle is not None:
-            throttle = ((throttle - 1) / 2) * 100
-
-        brake = axis_data.get(4)
-        if brake is not None:
-            brake = ((brake + 1) / 2) * 100
-
-        combined_throttle = None
-        if throttle is not None and brake is not None:
-            combined_throttle = -int(-100 - throttle + brake)
-
-        pitch = axis_data.get(1)
-        if pitch is not None:
-            pitch = int(pitch * -100)
-
-        roll = axis_data.get(2)
-        if roll is not None:
-            roll = int(roll * 100)
-
-        yaw = axis_data.get(0)
-        if yaw is not None:
-            yaw = int(yaw * 100)
-
-        return {
-            'combined_throttle': combined_throttle,
-            'pitch': pitch,
-            'roll': roll,
-            'yaw': yaw,
-        }
+    def get_state(axis_data, button_data, hat_data, profile=DEFAULT_PROFILE):
+        # stick deadzones, scaling to the rc range and the trigger mix all come from the profile's tables
+        return dict(zip(PROFILE_OUTPUTS, profile.build(axis_data, button_data)))
 
     def iterate(self, axis_data, button_data, hat_data, last_state):
         for event in pygame.event.get():
@@ -103,7 +81,7 @@ class Controller(object):
                 time.sleep(DEBOUNCE_PERIOD)
                 continue
 
-            state = self.get_state(axis_data, button_data, hat_data)
+            state = self.get_state(axis_data, button_data, hat_data, self.profile)
             if None in state:
                 time.sleep(DEBOUNCE_PERIOD)
                 continue
@@ -137,15 +115,47 @@ class Controller(object):
 
 
 if __name__ == '__main__':
-    from scheduler import Scheduler
+    from scheduler import Scheduler, ChangeDrivenScheduler
+
+    import sys
+
+    v = None
+    if '--video' in sys.argv:
+        from video import VideoReceiver
 
-    t = Tello()
+        # bound before streamon so the first frames aren't lost
+        v = VideoReceiver()
+        v.start()
+
+    t = Tello(host=sys.argv[sys.argv.index('--host') + 1] if '--host' in sys.argv else '192.168.10.1')
+    t.connect()
+
+    print 'ctrl + c to take off'
+
+    while 1:
+        try:
+            time.sleep(0.1)
+        except KeyboardInterrupt:
+            break
+
+    t.takeoff()
+
+    if '--heartbeat' in sys.argv:
+        # changes go out as they happen (but no faster than the API allows), otherwise every heartbeat
+        s = ChangeDrivenScheduler(
+            heartbeat_period=float(sys.argv[sys.argv.index('--heartbeat') + 1]),
+            min_interval=DEBOUNCE_PERIOD,
+        )
+    else:
+        s = Scheduler(period=DEBOUNCE_PERIOD)
 
-    s = Scheduler(period=DEBOUNCE_PERIOD)
     s.start()
     s.set_iteration_callback(t.send)
 
-    c = Controller()
+    c = Controller(
+        profile=load_controller_profile(sys.argv[sys.argv.index('--profile') + 1])
+        if '--profile' in sys.argv else DEFAULT_PROFILE
+    )
     c.set_state_change_callback(s.set_state)
 
     try:
@@ -153,7 +163,14 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         pass
 
-    t.shutdown()
-
     s.stop()
     s.join()
+
+    print repr(t.shutdown())
+    print repr(t.channel.get_stats())
+
+    if v is not None:
+        v.stop()
+        v.join()
+
+        print repr(v.get_stats())
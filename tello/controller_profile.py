@@ -0,0 +1 @@
+../phase_3/controller_profile.py
\ No newline at end of file
@@ -0,0 +1,109 @@
+import socket
+import time
+import traceback
+from threading import Thread, Event, Lock
+
+# what a Tello on firmware 1.3 says to the commands we use; anything else gets "error"
+RESPONSE_BY_COMMAND = {
+    'command': 'ok',
+    'streamon': 'ok',
+    'streamoff': 'ok',
+    'takeoff': 'ok',
+    'land': 'ok',
+    'emergency': 'ok',
+    'battery?': '87',
+}
+
+
+class TelloEmulator(Thread):
+    def __init__(self, host='127.0.0.1', port=0, response_delay=0.0, drop_responses=0, response_by_command=None):
+        super(TelloEmulator, self).__init__()
+
+        self.daemon = True
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.1)
+
+        self.address = self.socket.getsockname()
+
+        self.response_delay = response_delay
+
+        self.response_by_command = dict(RESPONSE_BY_COMMAND)
+        self.response_by_command.update(response_by_command or {})
+
+        # the next this many responses go missing, to exercise retries
+        self.drop_responses = drop_responses
+
+        self.commands = []
+        self.rc_commands = []
+
+        self.lock = Lock()
+
+        self.stop_event = Event()
+
+    def get_commands(self):
+        with self.lock:
+            return list(self.commands)
+
+    def get_rc_commands(self):
+        with self.lock:
+            return list(self.rc_commands)
+
+    def handle_datagram(self, data, addr):
+        text = data.decode('ascii', 'replace').strip()
+
+        # rc commands aren't answered
+        if text.startswith('rc '):
+            with self.lock:
+                self.rc_commands.append(text)
+
+            return
+
+        with self.lock:
+            self.commands.append(text)
+
+            if self.drop_responses > 0:
+                self.drop_responses -= 1
+                return
+
+        if self.response_delay:
+            time.sleep(self.response_delay)
+
+        self.socket.sendto(self.response_by_command.get(text, 'error').encode('ascii'), addr)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                data, addr = self.socket.recvfrom(4096)
+                self.handle_datagram(data, addr)
+            except socket.timeout:
+                pass
+            except Exception:
+                traceback.print_exc()
+
+        self.socket.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    # point the controller at this with "python controller.py --host 127.0.0.1"
+    e = TelloEmulator(host='0.0.0.0', port=int(sys.argv[1]) if len(sys.argv) > 1 else 8889)
+    e.start()
+
+    print 'emulating a Tello on {}:{}, ctrl + c to stop'.format(*e.address)
+
+    try:
+        while e.is_alive():
+            e.join(0.1)
+    except KeyboardInterrupt:
+        pass
+
+    e.stop()
+    e.join()
+
+    print '{} commands, {} rc commands'.format(len(e.commands), len(e.rc_commands))
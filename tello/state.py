@@ -0,0 +1 @@
+../phase_3/state.py
\ No newline at end of file
@@ -0,0 +1 @@
+../phase_3/stats.py
\ No newline at end of file
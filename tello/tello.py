@@ -1,5 +1,7 @@
-import socket
-import time
+from command_channel import CommandChannel, COMMAND_TIMEOUT, COMMAND_RETRIES
+
+# long enough for every retry of a command to have had its chance
+CONNECT_TIMEOUT = COMMAND_TIMEOUT * (COMMAND_RETRIES + 1) + 1.0
 
 
 class Tello(object):
@@ -8,22 +10,23 @@ class Tello(object):
         self.port = port
         self.listen_port = listen_port
 
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind(('', 9000))
+        self.channel = CommandChannel(self.host, self.port, self.listen_port)
+        self.channel.start()
 
-        self.socket.sendto('command', (self.host, self.port))
-        time.sleep(1)
-        self.socket.sendto('streamon', (self.host, self.port))
+    def run_command(self, text, timeout=CONNECT_TIMEOUT):
+        command = self.channel.send_command(text)
+        if not command.wait(timeout) or not command.ok:
+            raise ValueError('expected {} to be accepted but got {}'.format(repr(text), repr(command)))
 
-        print 'ctrl + c to take off'
+        return command
 
-        while 1:
-            try:
-                time.sleep(0.1)
-            except KeyboardInterrupt:
-                break
+    def connect(self, timeout=CONNECT_TIMEOUT):
+        # as long as the drone takes to say ok, rather than a fixed sleep
+        self.run_command('command', timeout)
+        self.run_command('streamon', timeout)
 
-        self.socket.sendto('takeoff', (self.host, self.port))
+    def takeoff(self, timeout=CONNECT_TIMEOUT):
+        return self.run_command('takeoff', timeout)
 
     def send(self, state):
         print state
@@ -38,18 +41,17 @@ class Tello(object):
         if None in [combined_throttle, pitch, roll, yaw]:
             return
 
-        try:
-            self.socket.sendto(
-                'rc {} {} {} {}'.format(
-                    roll,
-                    pitch,
-                    combined_throttle,
-                    yaw,
-                ),
-                (self.host, self.port)
-            )
-        except socket.error:
-            pass
-
-    def shutdown(self):
-        self.socket.sendto('land', (self.host, self.port))
+        self.channel.send_rc(roll, pitch, combined_throttle, yaw)
+
+    def emergency(self):
+        return self.channel.send_command('emergency')
+
+    def shutdown(self, timeout=CONNECT_TIMEOUT):
+        command = self.channel.send_command('land')
+        command.wait(timeout)
+
+        self.channel.stop()
+        self.channel.join()
+        self.channel.close()
+
+        return command
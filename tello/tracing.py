@@ -0,0 +1 @@
+../phase_3/tracing.py
\ No newline at end of file
@@ -0,0 +1,437 @@
+import socket
+import struct
+import time
+import traceback
+from threading import Thread, Event, Lock
+
+from clock import monotonic
+from stats import Histogram
+
+VIDEO_PORT = 11111
+
+# the Tello splits each frame into datagrams this big; a shorter one ends the frame (unless all that's come so far is
+# parameter sets), as does a datagram that starts the next access unit (for a frame that's an exact multiple of this)
+MAX_PACKET_SIZE = 1460
+
+# comfortably more than a 720p I-frame from a Tello
+MAX_FRAME_SIZE = 512 * 1024
+
+# one being written, the latest, and one spare for a reader still holding the one before
+SLOT_COUNT = 3
+
+# a frame that took longer than this to arrive is dropped rather than shown late
+LATE_FRAME_AGE = 0.1
+
+START_CODE = b'\x00\x00\x01'
+
+NAL_TYPE_MASK = 0x1f
+
+# coded slices (IDR or not) and slice data partitions, i.e. the picture itself
+VCL_NAL_TYPES = (1, 2, 3, 4, 5)
+
+# SEI, SPS, PPS, access unit delimiter and 14 to 18; after a picture's slices, any of these starts the next access unit
+# (H.264 7.4.1.2.3), as does a slice that starts a new picture
+ACCESS_UNIT_NAL_TYPES = (6, 7, 8, 9, 14, 15, 16, 17, 18)
+
+# received time, length; followed by the datagram
+CAPTURE_RECORD_FORMAT = struct.Struct('!dH')
+
+
+def starts_with_start_code(buffer, offset):
+    # a three or four byte start code, i.e. a datagram that starts with a NAL unit
+    return buffer[offset:offset + 3] == START_CODE or buffer[offset:offset + 4] == b'\x00' + START_CODE
+
+
+def starts_access_unit(buffer, offset, end):
+    # whether the datagram at offset starts with a NAL unit that begins an access unit, given the last one has slices
+    if not starts_with_start_code(buffer, offset):
+        return False
+
+    header = buffer.find(START_CODE, offset, offset + 4) + len(START_CODE)
+    if header >= end:
+        return False
+
+    nal_type = buffer[header] & NAL_TYPE_MASK
+    if nal_type in ACCESS_UNIT_NAL_TYPES:
+        return True
+
+    # first_mb_in_slice is the first field of the slice header, and an exp-Golomb zero is a single set bit
+    return nal_type in VCL_NAL_TYPES and header + 1 < end and bool(buffer[header + 1] & 0x80)
+
+
+def get_nal_unit_types(buffer, start, end):
+    # of every NAL unit whose header is between start and end
+    nal_types = []
+
+    index = buffer.find(START_CODE, start, end)
+    while index != -1:
+        header = index + len(START_CODE)
+        if header < end:
+            nal_types.append(buffer[header] & NAL_TYPE_MASK)
+
+        index = buffer.find(START_CODE, header, end)
+
+    return nal_types
+
+
+class Frame(object):
+    def __init__(self, frame_id, slot, view, first_packet_at, completed_at):
+        self.frame_id = frame_id
+        self.slot = slot
+        self.view = view
+        self.first_packet_at = first_packet_at
+        self.completed_at = completed_at
+
+    def __len__(self):
+        return len(self.view)
+
+
+class VideoReceiver(Thread):
+    def __init__(self, port=VIDEO_PORT, slot_count=SLOT_COUNT, max_frame_size=MAX_FRAME_SIZE,
+                 late_frame_age=LATE_FRAME_AGE, timeout=0.1, clock=monotonic):
+        super(VideoReceiver, self).__init__()
+
+        if slot_count < 3:
+            raise ValueError('expected slot_count to be at least 3 but it was {}'.format(repr(slot_count)))
+
+        self.daemon = True
+
+        self.slot_count = slot_count
+        self.max_frame_size = max_frame_size
+        self.late_frame_age = late_frame_age
+        self.clock = clock
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('', port))
+        self.socket.settimeout(timeout)
+
+        self.address = self.socket.getsockname()
+
+        # every datagram is received straight into its place in a slot; nothing is copied to reassemble
+        self.buffer = bytearray(slot_count * max_frame_size)
+        self.view = memoryview(self.buffer)
+
+        self.frame_id_by_slot = [None] * slot_count
+
+        self.writing_slot = 0
+        self.writing_offset = 0
+        self.writing_started_at = None
+        self.writing_has_nal_units = False
+        self.writing_has_slices = False
+
+        # set on an oversized frame, or at startup until the first frame boundary
+        self.discarding = True
+
+        self.last_frame_id = 0
+        self.latest = None
+        self.latest_read = True
+
+        self.lock = Lock()
+
+        self.stop_event = Event()
+
+        self.started_at = None
+
+        self.packets = 0
+        self.bytes = 0
+        self.frames = 0
+        self.late = 0
+        self.skipped = 0
+        self.incomplete = 0
+        self.oversized = 0
+        self.bytes_copied = 0
+
+        self.reassembly_latency = Histogram(0.001, 1000)
+
+    def slot_offset(self, slot):
+        return slot * self.max_frame_size
+
+    def next_slot(self):
+        latest_slot = self.latest.slot if self.latest is not None else None
+
+        slot = (self.writing_slot + 1) % self.slot_count
+        if slot == latest_slot:
+            slot = (slot + 1) % self.slot_count
+
+        return slot
+
+    def start_frame(self, slot):
+        with self.lock:
+            # anyone still holding the frame that was here can tell it's gone
+            self.frame_id_by_slot[slot] = None
+
+        self.writing_slot = slot
+        self.writing_offset = 0
+        self.writing_started_at = None
+        self.writing_has_nal_units = False
+        self.writing_has_slices = False
+
+    def is_intact(self, frame):
+        with self.lock:
+            return self.frame_id_by_slot[frame.slot] == frame.frame_id
+
+    def get_latest_frame(self):
+        # a view straight onto the slot; good until the frame after next arrives (check with is_intact)
+        with self.lock:
+            frame = self.latest
+            self.latest_read = True
+
+        return frame
+
+    def copy_latest_frame(self):
+        frame = self.get_latest_frame()
+        if frame is None:
+            return None
+
+        data = frame.view.tobytes()
+        self.bytes_copied += len(data)
+
+        if not self.is_intact(frame):
+            return None
+
+        return data
+
+    def complete_frame(self, now):
+        slot = self.writing_slot
+        start = self.slot_offset(slot)
+        length = self.writing_offset
+
+        if self.buffer.find(START_CODE, start, start + 4) == -1:
+            self.incomplete += 1
+            self.start_frame(slot)
+            return
+
+        if now - self.writing_started_at > self.late_frame_age:
+            self.late += 1
+            self.start_frame(slot)
+            return
+
+        self.reassembly_latency.record(now - self.writing_started_at)
+
+        self.last_frame_id += 1
+
+        frame = Frame(self.last_frame_id, slot, self.view[start:start + length], self.writing_started_at, now)
+
+        with self.lock:
+            if not self.latest_read:
+                self.skipped += 1
+
+            self.frame_id_by_slot[slot] = frame.frame_id
+            self.latest = frame
+            self.latest_read = False
+
+        self.frames += 1
+
+        self.start_frame(self.next_slot())
+
+    def receive(self):
+        offset = self.slot_offset(self.writing_slot) + self.writing_offset
+
+        if self.discarding or self.writing_offset + MAX_PACKET_SIZE > self.max_frame_size:
+            if not self.discarding:
+                self.oversized += 1
+                self.discarding = True
+
+            # keep reading into the start of the slot until this frame is over
+            offset = self.slot_offset(self.writing_slot)
+
+        size = self.socket.recv_into(self.view[offset:offset + MAX_PACKET_SIZE], MAX_PACKET_SIZE)
+
+        now = self.clock()
+
+        if self.started_at is None:
+            self.started_at = now
+
+        self.packets += 1
+        self.bytes += size
+
+        end = offset + size
+
+        starts_frame = starts_access_unit(self.buffer, offset, end)
+
+        if self.discarding:
+            if not starts_frame:
+                if size < MAX_PACKET_SIZE:
+                    self.discarding = False
+                    self.start_frame(self.writing_slot)
+
+                return
+
+            # it's already at the start of the slot, so it's just the first datagram of the next frame
+            self.discarding = False
+            self.start_frame(self.writing_slot)
+        elif starts_frame and self.writing_has_slices:
+            # nothing short ended the last frame, so it ends here; this datagram moves to the start of the next slot
+            self.complete_frame(now)
+
+            start = self.slot_offset(self.writing_slot)
+            self.buffer[start:start + size] = self.buffer[offset:offset + size]
+            self.bytes_copied += size
+
+            offset, end = start, start + size
+
+        if self.writing_started_at is None:
+            self.writing_started_at = now
+
+        # from a few bytes back, for a start code split across datagrams
+        nal_types = get_nal_unit_types(
+            self.buffer,
+            max(self.slot_offset(self.writing_slot), offset - len(START_CODE)),
+            end,
+        )
+
+        if nal_types:
+            self.writing_has_nal_units = True
+
+        if any(nal_type in VCL_NAL_TYPES for nal_type in nal_types):
+            self.writing_has_slices = True
+
+        self.writing_offset += size
+
+        # parameter sets often come in datagrams of their own ahead of the slices they belong with
+        if size < MAX_PACKET_SIZE and (self.writing_has_slices or not self.writing_has_nal_units):
+            self.complete_frame(now)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats(self):
+        elapsed = (self.clock() - self.started_at) if self.started_at is not None else 0.0
+
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'frames': self.frames,
+            'frame_rate': self.frames / elapsed if elapsed > 0 else 0.0,
+            'late': self.late,
+            'skipped': self.skipped,
+            'incomplete': self.incomplete,
+            'oversized': self.oversized,
+            'bytes_copied': self.bytes_copied,
+            'bytes_copied_per_frame': float(self.bytes_copied) / self.frames if self.frames else 0.0,
+            'reassembly_latency': self.reassembly_latency.summary(),
+        }
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.receive()
+            except socket.timeout:
+                pass
+            except Exception:
+                traceback.print_exc()
+
+    def close(self):
+        self.socket.close()
+
+
+def capture(path, port=VIDEO_PORT, duration=None):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(('', port))
+    s.settimeout(0.1)
+
+    started = monotonic()
+
+    with open(path, 'wb') as f:
+        try:
+            while duration is None or monotonic() - started < duration:
+                try:
+                    data = s.recv(65536)
+                except socket.timeout:
+                    continue
+
+                f.write(CAPTURE_RECORD_FORMAT.pack(monotonic() - started, len(data)))
+                f.write(data)
+        finally:
+            s.close()
+
+
+def read_capture(path):
+    with open(path, 'rb') as f:
+        while 1:
+            header = f.read(CAPTURE_RECORD_FORMAT.size)
+            if len(header) < CAPTURE_RECORD_FORMAT.size:
+                return
+
+            received_at, length = CAPTURE_RECORD_FORMAT.unpack(header)
+
+            data = f.read(length)
+            if len(data) < length:
+                return
+
+            yield received_at, data
+
+
+class VideoReplayer(Thread):
+    def __init__(self, records, host='127.0.0.1', port=VIDEO_PORT, speed=1.0, clock=monotonic, sleep=time.sleep):
+        super(VideoReplayer, self).__init__()
+
+        self.daemon = True
+
+        self.records = records
+        self.address = (host, port)
+        self.speed = speed
+        self.clock = clock
+        self.sleep = sleep
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        self.stop_event = Event()
+
+        self.sent = 0
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        started = self.clock()
+
+        for received_at, data in self.records:
+            if self.stop_event.is_set():
+                break
+
+            # speed=None sends as fast as possible
+            if self.speed:
+                delay = started + (received_at / self.speed) - self.clock()
+                if delay > 0:
+                    self.sleep(delay)
+
+            self.socket.sendto(data, self.address)
+            self.sent += 1
+
+        self.socket.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    args = sys.argv[1:]
+
+    if '--capture' in args:
+        path = args[args.index('--capture') + 1]
+
+        print 'capturing to {}, ctrl + c to stop'.format(path)
+
+        try:
+            capture(path)
+        except KeyboardInterrupt:
+            pass
+
+        sys.exit(0)
+
+    if '--replay' in args:
+        r = VideoReplayer(read_capture(args[args.index('--replay') + 1]))
+        r.start()
+
+    v = VideoReceiver()
+    v.start()
+
+    try:
+        while 1:
+            time.sleep(1.0)
+            print repr(v.get_stats())
+    except KeyboardInterrupt:
+        pass
+
+    v.stop()
+    v.join()
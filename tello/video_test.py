@@ -0,0 +1,278 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from video import VideoReceiver, VideoReplayer, starts_with_start_code, starts_access_unit, get_nal_unit_types, \
+    read_capture, CAPTURE_RECORD_FORMAT, \
+    MAX_PACKET_SIZE
+
+
+class FakeClock(object):
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def build_frame(number, size=4000):
+    # an SPS-ish unit then a slice; 0x55 padding never looks like a start code
+    return b'\x00\x00\x00\x01\x67' + b'\x55' * 10 + b'\x00\x00\x01\x65' + chr(number % 256) * size
+
+
+# the way a Tello sends a keyframe: parameter sets in datagrams of their own, then the slice
+_SPS = b'\x00\x00\x00\x01\x67' + b'\x55' * 10
+_PPS = b'\x00\x00\x00\x01\x68' + b'\x55' * 4
+_IDR = b'\x00\x00\x00\x01\x65\x88' + b'\x55' * 3000
+
+# first_mb_in_slice of 0, so a new picture
+_P_SLICE = b'\x00\x00\x00\x01\x41\x9a' + b'\x55' * 500
+
+
+def packetize(frame):
+    return [frame[i:i + MAX_PACKET_SIZE] for i in range(0, len(frame), MAX_PACKET_SIZE)]
+
+
+class StartCodeTest(unittest.TestCase):
+    def test_starts_with_start_code(self):
+        buffer = bytearray(b'\x55' + build_frame(1, size=3) + b'\x00\x00\x01\x65')
+
+        self.assert_(starts_with_start_code(buffer, 1))
+        self.assert_(starts_with_start_code(buffer, 23))
+        self.assert_(not starts_with_start_code(buffer, 0))
+        self.assert_(not starts_with_start_code(buffer, 2 + 19 + 3))
+
+
+    def test_starts_access_unit(self):
+        for data, expected in [
+            (_SPS, True),
+            (_PPS, True),
+            (b'\x00\x00\x01\x09\xf0', True),
+            (_IDR, True),
+            (_P_SLICE, True),
+            # a second slice of the same picture (first_mb_in_slice isn't 0)
+            (b'\x00\x00\x00\x01\x41\x40\x55', False),
+            (b'\x55' * 8, False),
+            (b'\x00\x00\x00\x01', False),
+        ]:
+            buffer = bytearray(data)
+            self.assert_(starts_access_unit(buffer, 0, len(buffer)) == expected)
+
+    def test_get_nal_unit_types(self):
+        buffer = bytearray(_SPS + _PPS + _IDR)
+
+        self.assert_(get_nal_unit_types(buffer, 0, len(buffer)) == [7, 8, 5])
+        self.assert_(get_nal_unit_types(buffer, len(_SPS), len(buffer)) == [8, 5])
+
+
+class VideoReceiverTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(100.0)
+
+        self.subject = VideoReceiver(port=0, max_frame_size=16 * 1024, clock=self.clock)
+        self.addCleanup(self.subject.close)
+
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(self.sender.close)
+
+        self.address = ('127.0.0.1', self.subject.address[1])
+
+    def feed(self, data, step=0.001):
+        for packet in packetize(data):
+            self.sender.sendto(packet, self.address)
+            self.subject.receive()
+            self.clock.now += step
+
+    def test_discards_until_the_first_frame_boundary(self):
+        self.feed(build_frame(1)[MAX_PACKET_SIZE:])
+
+        self.assert_(self.subject.get_latest_frame() is None)
+
+        self.feed(build_frame(2))
+
+        frame = self.subject.get_latest_frame()
+
+        self.assert_(frame.view.tobytes() == build_frame(2))
+        self.assert_(frame.frame_id == 1)
+        self.assert_(self.subject.frames == 1)
+
+    def test_latest_frame_is_a_view_onto_the_buffer(self):
+        self.feed(b'\x00')
+        self.feed(build_frame(1))
+
+        frame = self.subject.get_latest_frame()
+
+        self.assert_(isinstance(frame.view, memoryview))
+        self.assert_(self.subject.get_stats()['bytes_copied'] == 0)
+
+    def test_frames_are_reassembled_in_order(self):
+        self.feed(b'\x00')
+
+        for number in range(1, 6):
+            self.feed(build_frame(number))
+
+            frame = self.subject.get_latest_frame()
+            self.assert_(frame.view.tobytes() == build_frame(number))
+
+        self.assert_(self.subject.frames == 5)
+        self.assert_(self.subject.skipped == 0)
+
+    def test_held_frame_stays_intact_for_one_more_frame(self):
+        self.feed(b'\x00')
+        self.feed(build_frame(1))
+
+        held = self.subject.get_latest_frame()
+
+        self.feed(build_frame(2))
+        self.subject.get_latest_frame()
+
+        self.assert_(self.subject.is_intact(held))
+        self.assert_(held.view.tobytes() == build_frame(1))
+
+        self.feed(build_frame(3))
+
+        self.assert_(not self.subject.is_intact(held))
+
+    def test_unread_frames_are_skipped(self):
+        self.feed(b'\x00')
+
+        for number in range(1, 4):
+            self.feed(build_frame(number))
+
+        self.assert_(self.subject.skipped == 2)
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == build_frame(3))
+
+    def test_frame_that_is_an_exact_multiple_of_the_packet_size(self):
+        self.feed(b'\x00')
+
+        exact = build_frame(1, size=(MAX_PACKET_SIZE * 2) - len(build_frame(1, size=0)))
+        self.assert_(len(exact) % MAX_PACKET_SIZE == 0)
+
+        self.feed(exact)
+        self.assert_(self.subject.get_latest_frame() is None)
+
+        # the next frame's first datagram ends it
+        self.feed(build_frame(2)[:MAX_PACKET_SIZE])
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == exact)
+
+        self.feed(build_frame(2)[MAX_PACKET_SIZE:])
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == build_frame(2))
+        self.assert_(self.subject.frames == 2)
+
+    def test_start_code_ends_discarding(self):
+        self.feed(build_frame(1)[MAX_PACKET_SIZE:MAX_PACKET_SIZE * 2])
+        self.feed(build_frame(2))
+
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == build_frame(2))
+
+    def test_parameter_sets_in_their_own_datagrams(self):
+        self.feed(b'\x00')
+
+        self.feed(_SPS)
+        self.feed(_PPS)
+        self.assert_(self.subject.get_latest_frame() is None)
+
+        self.feed(_IDR)
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == _SPS + _PPS + _IDR)
+
+        self.feed(_P_SLICE)
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == _P_SLICE)
+
+        self.assert_(self.subject.frames == 2)
+        self.assert_(self.subject.incomplete == 0)
+
+    def test_parameter_sets_end_a_frame_with_no_short_datagram(self):
+        self.feed(b'\x00')
+
+        exact = _IDR[:MAX_PACKET_SIZE * 2]
+        self.feed(exact)
+        self.assert_(self.subject.get_latest_frame() is None)
+
+        self.feed(_SPS)
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == exact)
+
+        self.feed(_PPS)
+        self.feed(_IDR)
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == _SPS + _PPS + _IDR)
+
+    def test_late_frame_is_dropped(self):
+        self.feed(b'\x00')
+        self.feed(build_frame(1), step=0.1)
+
+        self.assert_(self.subject.get_latest_frame() is None)
+        self.assert_(self.subject.late == 1)
+
+    def test_frame_without_a_start_code_is_incomplete(self):
+        self.feed(b'\x00')
+        self.feed(b'\x55' * 100)
+
+        self.assert_(self.subject.get_latest_frame() is None)
+        self.assert_(self.subject.incomplete == 1)
+
+    def test_oversized_frame_is_dropped(self):
+        self.feed(b'\x00')
+        self.feed(build_frame(1, size=20 * 1024))
+        self.feed(build_frame(2))
+
+        self.assert_(self.subject.oversized == 1)
+        self.assert_(self.subject.get_latest_frame().view.tobytes() == build_frame(2))
+
+    def test_copy_latest_frame(self):
+        self.feed(b'\x00')
+        self.feed(build_frame(1))
+
+        self.assert_(self.subject.copy_latest_frame() == build_frame(1))
+        self.assert_(self.subject.get_stats()['bytes_copied_per_frame'] == len(build_frame(1)))
+
+    def test_stats(self):
+        self.feed(b'\x00')
+        self.feed(build_frame(1))
+
+        stats = self.subject.get_stats()
+
+        self.assert_(stats['frames'] == 1)
+        self.assert_(stats['packets'] == 1 + len(packetize(build_frame(1))))
+        self.assert_(stats['reassembly_latency']['count'] == 1)
+
+
+class VideoReplayerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_capture_round_trip_through_a_receiver(self):
+        path = os.path.join(self.directory, 'capture')
+
+        frames = [build_frame(number) for number in range(10)]
+
+        with open(path, 'wb') as f:
+            f.write(CAPTURE_RECORD_FORMAT.pack(0.0, 1))
+            f.write(b'\x00')
+
+            for i, frame in enumerate(frames):
+                for packet in packetize(frame):
+                    f.write(CAPTURE_RECORD_FORMAT.pack(i * 0.001, len(packet)))
+                    f.write(packet)
+
+        self.assert_(len(list(read_capture(path))) == 1 + sum(len(packetize(frame)) for frame in frames))
+
+        receiver = VideoReceiver(port=0)
+        receiver.start()
+
+        replayer = VideoReplayer(read_capture(path), port=receiver.address[1])
+        replayer.start()
+        replayer.join()
+
+        deadline = time.time() + 1.0
+        while receiver.frames < len(frames) and time.time() < deadline:
+            time.sleep(0.01)
+
+        receiver.stop()
+        receiver.join()
+        receiver.close()
+
+        self.assert_(receiver.frames == len(frames))
+        self.assert_(receiver.get_latest_frame().view.tobytes() == frames[-1])